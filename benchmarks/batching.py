@@ -0,0 +1,67 @@
+import argparse
+import asyncio
+import time
+import typing as tp
+
+import numpy as np
+
+from benchmarks.scoring import make_model
+from service.api.batching import MicroBatcher
+from service.api.metrics import Metrics
+from service.reco.inference import Recos, recommend_known
+from service.reco.models import RecoModel
+
+
+async def run_clients(
+    recommend: tp.Callable[[int, int], tp.Awaitable[np.ndarray]],
+    user_ids: np.ndarray,
+    concurrency: int,
+    k: int,
+) -> float:
+    """Throughput, rps, of ``concurrency`` clients sending ``user_ids``."""
+    positions = iter(user_ids.tolist())
+
+    async def client() -> None:
+        for user_id in positions:
+            await recommend(user_id, k)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return len(user_ids) / (time.perf_counter() - started_at)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Throughput of single user requests with and without micro-batching")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--items", type=int, default=15_000)
+    parser.add_argument("--factors", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--window", type=float, default=0.002, help="batching window, seconds")
+    parser.add_argument("--max-size", type=int, default=64)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    model: RecoModel = make_model(args.users, args.items, args.factors, n_seen=20)
+    user_ids = np.random.default_rng(1).integers(0, args.users, size=args.requests)
+
+    async def single(user_id: int, k: int) -> np.ndarray:
+        return model.recommend(user_id, k)
+
+    async def score(user_ids: np.ndarray, k: int) -> Recos:
+        return await asyncio.get_running_loop().run_in_executor(None, recommend_known, model, user_ids, k)
+
+    metrics = Metrics([], ["factors"])
+    batcher = MicroBatcher("factors", score, args.window, args.max_size, metrics)
+
+    single_rps = asyncio.run(run_clients(single, user_ids, args.concurrency, args.k))
+    batched_rps = asyncio.run(run_clients(batcher.recommend, user_ids, args.concurrency, args.k))
+    print(f"one call per request: {single_rps:.0f} rps")
+    print(f"micro-batched ({args.window * 1e3:g} ms, up to {args.max_size}): {batched_rps:.0f} rps")
+    for line in metrics.render().splitlines():
+        if line.startswith(("reco_batch_size_sum", "reco_batch_size_count", "reco_batch_queue_seconds_sum")):
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
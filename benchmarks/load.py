@@ -0,0 +1,294 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+
+from service.api.app import create_app
+from service.api.asgi import call
+from service.settings import get_config
+
+PERCENTILES = {"p50": 50, "p95": 95, "p99": 99, "p999": 99.9}
+
+
+class Request(tp.NamedTuple):
+    method: str
+    path: str
+    body: bytes = b""
+
+
+Send = tp.Callable[[Request], tp.Awaitable[int]]
+
+
+def read_log(path: Path) -> tp.List[Request]:
+    """
+    Request log, one JSON object per line:
+    ``{"method": "GET", "path": "/reco/top/1"}``, ``body`` is optional.
+    """
+    requests = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            body = json.dumps(record["body"]).encode() if "body" in record else b""
+            requests.append(Request(record.get("method", "GET"), record["path"], body))
+    return requests
+
+
+def zipf_requests(model: str, n_users: int, n_requests: int, exponent: float, seed: int = 0) -> tp.List[Request]:
+    """Single user requests, user popularity follows Zipf's law."""
+    rng = np.random.default_rng(seed)
+    weights = 1 / np.arange(1, n_users + 1) ** exponent
+    ranks = rng.choice(n_users, n_requests, p=weights / weights.sum())
+    user_ids = rng.permutation(n_users)[ranks]
+    return [Request("GET", f"/reco/{model}/{user_id}") for user_id in user_ids.tolist()]
+
+
+class HTTPConnection:
+    """Minimal HTTP/1.1 keep-alive client, cheaper than a full one."""
+
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+        self.reader: tp.Optional[asyncio.StreamReader] = None
+        self.writer: tp.Optional[asyncio.StreamWriter] = None
+
+    async def send(self, request: Request) -> int:
+        try:
+            return await self._send(request)
+        except BaseException:
+            # e.g. reset by a worker restarted after max_requests
+            self.close()
+            raise
+
+    async def _send(self, request: Request) -> int:
+        if self.reader is None or self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = f"{request.method} {request.path} HTTP/1.1\r\nHost: {self.host}\r\n"
+        if request.body:
+            head += f"Content-Type: application/json\r\nContent-Length: {len(request.body)}\r\n"
+        self.writer.write(head.encode() + b"\r\n" + request.body)
+
+        lines = (await self.reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        status_code = int(lines[0].split()[1])
+        headers = dict(line.lower().split(": ", 1) for line in lines[1:] if line)
+        if "content-length" in headers:
+            await self.reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding") == "chunked":
+            while True:
+                size = int(await self.reader.readuntil(b"\r\n"), 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        if headers.get("connection") == "close":
+            self.close()
+        return status_code
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def replay(
+    sends: tp.Sequence[Send],
+    requests: tp.Sequence[Request],
+) -> tp.Tuple[np.ndarray, np.ndarray, float]:
+    """
+    Send ``requests`` in order from ``len(sends)`` concurrent clients,
+    return latencies in seconds, status codes (0 if the request failed)
+    and the wall time.
+    """
+    latencies = np.zeros(len(requests))
+    statuses = np.zeros(len(requests), dtype=np.int64)
+    positions = iter(range(len(requests)))
+
+    async def client(send: Send) -> None:
+        for position in positions:
+            started_at = time.perf_counter()
+            try:
+                statuses[position] = await send(requests[position])
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                statuses[position] = 0
+            latencies[position] = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(client(send) for send in sends))
+    return latencies, statuses, time.perf_counter() - started_at
+
+
+def memory_mb(pid: int) -> tp.Dict[str, float]:
+    """RSS and PSS, mmap-ed model pages shared by workers count in PSS once."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", encoding="utf-8") as file:
+        for line in file:
+            key, value = line.split(":", 1)
+            if key in ("Rss", "Pss"):
+                values[key.lower()] = int(value.split()[0]) / 1024
+    return values
+
+
+def child_pids(pid: int) -> tp.List[int]:
+    with open(f"/proc/{pid}/task/{pid}/children", encoding="utf-8") as file:
+        return [int(child) for child in file.read().split()]
+
+
+def wait_ready(host: str, port: int, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+
+    async def ready() -> int:
+        connection = HTTPConnection(host, port)
+        try:
+            return await connection.send(Request("GET", "/ready"))
+        finally:
+            connection.close()
+
+    while time.monotonic() < deadline:
+        try:
+            if asyncio.run(ready()) == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"Service on {host}:{port} is not ready in {timeout} s")
+
+
+def summarize(latencies: np.ndarray, statuses: np.ndarray, duration: float) -> tp.Dict[str, tp.Any]:
+    codes, counts = np.unique(statuses, return_counts=True)
+    latencies_ms = latencies * 1e3
+    return {
+        "requests": len(latencies),
+        "errors": int(((statuses == 0) | (statuses >= 500)).sum()),
+        "statuses": {str(code): int(count) for code, count in zip(codes.tolist(), counts.tolist())},
+        "duration_s": duration,
+        "throughput_rps": len(latencies) / duration,
+        "latency_ms": {
+            "mean": float(latencies_ms.mean()),
+            **{name: float(np.percentile(latencies_ms, q)) for name, q in PERCENTILES.items()},
+            "max": float(latencies_ms.max()),
+        },
+    }
+
+
+def run_asgi(requests: tp.Sequence[Request], warmup: int, concurrency: int) -> tp.Dict[str, tp.Any]:
+    app = create_app(get_config())
+
+    async def send(request: Request) -> int:
+        return await call(app, request.method, request.path, request.body)
+
+    async def run() -> tp.Tuple[np.ndarray, np.ndarray, float]:
+        await replay([send] * concurrency, requests[:warmup])
+        return await replay([send] * concurrency, requests[warmup:])
+
+    result = summarize(*asyncio.run(run()))
+    result["memory_mb"] = {str(os.getpid()): memory_mb(os.getpid())}
+    return result
+
+
+def run_gunicorn(
+    requests: tp.Sequence[Request],
+    warmup: int,
+    concurrency: int,
+    workers: int,
+    port: int,
+) -> tp.Dict[str, tp.Any]:
+    host = "127.0.0.1"
+    env = {"LOG_LEVEL": "WARNING", **os.environ, "HOST": host, "PORT": str(port), "GUNICORN_WORKERS": str(workers)}
+    server = subprocess.Popen(  # pylint: disable=consider-using-with
+        [sys.executable, "-m", "gunicorn", "main:app", "-c", "gunicorn.config.py"],
+        env=env,
+    )
+    try:
+        wait_ready(host, port, timeout=120)
+
+        async def run() -> tp.Tuple[np.ndarray, np.ndarray, float]:
+            connections = [HTTPConnection(host, port) for _ in range(concurrency)]
+            try:
+                await replay([c.send for c in connections], requests[:warmup])
+                return await replay([c.send for c in connections], requests[warmup:])
+            finally:
+                for connection in connections:
+                    connection.close()
+
+        result = summarize(*asyncio.run(run()))
+        result["memory_mb"] = {str(pid): memory_mb(pid) for pid in child_pids(server.pid)}
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return result
+
+
+def compare(result: tp.Dict[str, tp.Any], baseline: tp.Dict[str, tp.Any], tolerance: float) -> tp.List[str]:
+    """Changes for the worse by more than ``tolerance`` of the baseline."""
+    regressions = []
+    if result["throughput_rps"] < baseline["throughput_rps"] * (1 - tolerance):
+        regressions.append(f"throughput {baseline['throughput_rps']:.0f} -> {result['throughput_rps']:.0f} rps")
+    for name in PERCENTILES:
+        before, after = baseline["latency_ms"][name], result["latency_ms"][name]
+        if after > before * (1 + tolerance):
+            regressions.append(f"{name} latency {before:.2f} -> {after:.2f} ms")
+    before, after = (sum(m["pss"] for m in r["memory_mb"].values()) for r in (baseline, result))
+    if after > before * (1 + tolerance):
+        regressions.append(f"memory {before:.0f} -> {after:.0f} MB PSS")
+    if result["errors"] > baseline["errors"]:
+        regressions.append(f"errors {baseline['errors']} -> {result['errors']}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay a request log or Zipf traffic against the service")
+    parser.add_argument("--log", type=Path, help="JSON lines request log, synthetic traffic if not set")
+    parser.add_argument("--model", default="random", help="model of synthetic requests")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--zipf", type=float, default=1.1, help="exponent of user popularity")
+    parser.add_argument("--requests", type=int, default=20_000, help="number of synthetic requests")
+    parser.add_argument("--warmup", type=int, default=500, help="first requests not measured")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--gunicorn", action="store_true", help="run gunicorn with gunicorn.config.py")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--output", type=Path, help="save the result as JSON")
+    parser.add_argument("--compare", type=Path, help="result JSON to check for regressions against")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.log is not None:
+        requests = read_log(args.log)
+    else:
+        requests = zipf_requests(args.model, args.users, args.requests + args.warmup, args.zipf)
+    if args.gunicorn:
+        result = run_gunicorn(requests, args.warmup, args.concurrency, args.workers, args.port)
+    else:
+        result = run_asgi(requests, args.warmup, args.concurrency)
+    result.update(
+        mode="gunicorn" if args.gunicorn else "asgi",
+        source=str(args.log) if args.log else f"zipf({args.zipf}) over {args.users} users of {args.model}",
+        concurrency=args.concurrency,
+        workers=args.workers if args.gunicorn else 1,
+    )
+
+    latency = "  ".join(f"{name} {result['latency_ms'][name]:.2f}" for name in PERCENTILES)
+    print(f"{result['requests']} requests, {result['errors']} errors, {result['throughput_rps']:.0f} rps")
+    print(f"latency, ms: {latency}")
+    for pid, memory in result["memory_mb"].items():
+        print(f"pid {pid}: rss {memory['rss']:.0f} MB, pss {memory['pss']:.0f} MB")
+    if args.output is not None:
+        args.output.write_text(json.dumps(result, indent=2))
+
+    if args.compare is not None:
+        regressions = compare(result, json.loads(args.compare.read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
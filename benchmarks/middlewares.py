@@ -0,0 +1,118 @@
+import argparse
+import asyncio
+import time
+import typing as tp
+
+from fastapi import FastAPI, Request
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.responses import Response
+
+from service.api import middlewares
+from service.api.app import create_app
+from service.api.asgi import call
+from service.log import access_logger, app_logger
+from service.models import Error
+from service.response import server_error
+from service.settings import (
+    AdmissionConfig,
+    CacheConfig,
+    LogConfig,
+    MetricsConfig,
+    ModelConfig,
+    SeenConfig,
+    ServiceConfig,
+    TimingConfig,
+    WarmupConfig,
+)
+
+
+class AccessMiddleware(BaseHTTPMiddleware):
+    """``AccessMiddleware`` as it was before the pure ASGI rewrite."""
+
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        started_at = time.perf_counter()
+        response = await call_next(request)
+        request_time = time.perf_counter() - started_at
+        access_logger.info(
+            msg="",
+            extra={
+                "request_time": round(request_time, 4),
+                "status_code": response.status_code,
+                "requested_url": request.url,
+                "method": request.method,
+            },
+        )
+        return response
+
+
+class ExceptionHandlerMiddleware(BaseHTTPMiddleware):
+    """``ExceptionHandlerMiddleware`` as it was before the rewrite."""
+
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        try:
+            return await call_next(request)
+        except Exception as e:  # pylint: disable=W0703,W1203
+            app_logger.exception(msg=f"Caught unhandled {e.__class__} exception: {e}")
+            error = Error(error_key="server_error", error_message="Internal Server Error")
+            return server_error([error])
+
+
+# the middlewares rewritten as pure ASGI, the rest of the stack is shared
+LEGACY_MIDDLEWARES: tp.Dict[type, type] = {
+    middlewares.AccessMiddleware: AccessMiddleware,
+    middlewares.ExceptionHandlerMiddleware: ExceptionHandlerMiddleware,
+}
+
+
+def use_legacy_middlewares(app: FastAPI) -> None:
+    """Put the old versions in place of the rewritten middlewares."""
+    app.user_middleware = [
+        Middleware(LEGACY_MIDDLEWARES.get(middleware.cls, middleware.cls), **middleware.options)
+        for middleware in app.user_middleware
+    ]
+
+
+def make_app(legacy: bool) -> FastAPI:
+    config = ServiceConfig(
+        models={"random": ModelConfig(kind="random", cache=False)},
+        # keep the access log calls, but do not write them
+        log_config=LogConfig(level="WARNING"),
+        cache_config=CacheConfig(),
+        metrics_config=MetricsConfig(),
+        warmup_config=WarmupConfig(),
+        seen_config=SeenConfig(),
+        timing_config=TimingConfig(),
+        admission_config=AdmissionConfig(),
+    )
+    app = create_app(config)
+    if legacy:
+        use_legacy_middlewares(app)
+    return app
+
+
+async def run(app: FastAPI, path: str, n_requests: int) -> float:
+    """Requests per second of sequential in-process calls."""
+    for _ in range(100):
+        await call(app, "GET", path)
+    started_at = time.perf_counter()
+    for _ in range(n_requests):
+        await call(app, "GET", path)
+    return n_requests / (time.perf_counter() - started_at)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Throughput with BaseHTTPMiddleware and pure ASGI middlewares")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--paths", nargs="+", default=["/health", "/reco/random/1"])
+    args = parser.parse_args()
+
+    apps: tp.Dict[str, FastAPI] = {"before": make_app(legacy=True), "after": make_app(legacy=False)}
+    print(f"{'path':>16} {'before, rps':>12} {'after, rps':>12} {'speedup':>8}")
+    for path in args.paths:
+        before, after = (asyncio.run(run(app, path, args.requests)) for app in apps.values())
+        print(f"{path:>16} {before:>12.0f} {after:>12.0f} {after / before:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
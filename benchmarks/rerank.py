@@ -0,0 +1,83 @@
+import argparse
+import timeit
+import typing as tp
+from functools import partial
+
+import numpy as np
+
+from service.reco.mapping import IdMap
+from service.reco.rerank import ItemFeatures, Reranker
+from service.settings import RerankConfig
+
+
+def make_features(n_items: int, n_genres: int, max_genres: int, seed: int = 0) -> ItemFeatures:
+    rng = np.random.default_rng(seed)
+    genres = np.zeros((n_items, n_genres), dtype=np.uint8)
+    n_item_genres = rng.integers(1, max_genres + 1, size=n_items)
+    rows = np.repeat(np.arange(n_items), n_item_genres)
+    # skewed, like real catalogs: a few genres cover most items
+    genres[rows, np.minimum(rng.zipf(1.5, size=len(rows)) - 1, n_genres - 1)] = 1
+    return ItemFeatures(genres, IdMap.from_ids(np.arange(n_items) * 3 + 1))
+
+
+def python_mmr(items: tp.List[int], genres: tp.Dict[int, tp.Set[int]], k: int, diversity: float) -> tp.List[int]:
+    """The straightforward re-ranker: lists, sets and Python loops."""
+    n = len(items)
+    picked: tp.List[int] = []
+    left = list(range(n))
+    while left and len(picked) < k:
+        best, best_score = left[0], -np.inf
+        for position in left:
+            item_genres = genres.get(items[position], set())
+            similarity = max(
+                (
+                    len(item_genres & genres.get(items[other], set()))
+                    / (np.sqrt(len(item_genres) * len(genres.get(items[other], set()))) or 1)
+                    for other in picked
+                ),
+                default=0.0,
+            )
+            score = (1 - diversity) * (1 - position / n) - diversity * similarity
+            if score > best_score:
+                best, best_score = position, score
+        picked.append(best)
+        left.remove(best)
+    return [items[position] for position in picked]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-request cost of genre diversity reranking")
+    parser.add_argument("--items", type=int, default=15_000)
+    parser.add_argument("--genres", type=int, default=100)
+    parser.add_argument("--max-item-genres", type=int, default=4)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[50, 100, 200])
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--diversity", type=float, default=0.3)
+    parser.add_argument("--max-per-genre", type=int, default=3)
+    args = parser.parse_args()
+
+    features = make_features(args.items, args.genres, args.max_item_genres)
+    genre_sets = {
+        int(item_id): set(np.flatnonzero(row).tolist()) for item_id, row in zip(features.items.ids, features.genres)
+    }
+    rng = np.random.default_rng(1)
+    number = 200
+    print(f"{'candidates':>10} {'mmr, us':>8} {'genre_cap, us':>14} {'python mmr, us':>15}")
+    for n_candidates in args.candidates:
+        items = features.items.ids[rng.choice(args.items, n_candidates, replace=False)]
+        timings = []
+        for method in ("mmr", "genre_cap"):
+            config = RerankConfig(
+                method=method, candidates=n_candidates, diversity=args.diversity, max_per_genre=args.max_per_genre,
+            )
+            reranker = Reranker(config, features)
+            rerank = partial(reranker.rerank, items, args.k)
+            timings.append(min(timeit.repeat(rerank, number=number, repeat=5)))
+        reference = partial(python_mmr, items.tolist(), genre_sets, args.k, args.diversity)
+        timings.append(min(timeit.repeat(reference, number=number // 10, repeat=3)) * 10)
+        mmr_us, cap_us, python_us = (seconds / number * 1e6 for seconds in timings)
+        print(f"{n_candidates:>10} {mmr_us:>8.1f} {cap_us:>14.1f} {python_us:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
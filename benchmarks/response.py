@@ -0,0 +1,78 @@
+import argparse
+import json
+import timeit
+import typing as tp
+
+import numpy as np
+import orjson
+from pydantic import BaseModel
+
+from service.api.views import RecoResponse
+from service.models import Error
+from service.response import render_json, render_reco
+
+
+class EnhancedJSONEncoder(json.JSONEncoder):
+    """Encoder ``DataclassJSONResponse`` used before orjson rendering."""
+
+    def default(self, o: tp.Any) -> tp.Any:
+        if isinstance(o, BaseModel):
+            return o.model_dump()
+        try:
+            orjson.dumps(o)
+        except TypeError:
+            return str(o)
+        return super().default(o)
+
+
+def render_stdlib(content: tp.Any) -> bytes:
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+        cls=EnhancedJSONEncoder,
+    ).encode("utf-8")
+
+
+def measure(func: tp.Callable[[], tp.Any], number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rendering time of recommendation and error responses")
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    items = rng.integers(0, 15_000, size=args.k)
+    batch = [(user_id, rng.integers(0, 15_000, size=args.k)) for user_id in range(args.batch)]
+    errors = [Error(error_key="user_not_found", error_message="User 1 not found", error_loc=["body", "user_ids", 1])]
+
+    cases = {
+        "reco": (
+            lambda: RecoResponse(user_id=1, items=items.tolist()).model_dump_json().encode(),
+            lambda: render_json(render_reco(1, items)),
+            1,
+        ),
+        f"batch of {args.batch}": (
+            lambda: render_stdlib(
+                {"recos": [RecoResponse(user_id=u, items=i.tolist()) for u, i in batch], "errors": errors}
+            ),
+            lambda: render_json({"recos": [render_reco(u, i) for u, i in batch], "errors": errors}),
+            args.batch,
+        ),
+        "error": (lambda: render_stdlib({"errors": errors}), lambda: render_json({"errors": errors}), 1),
+    }
+    print(f"{'response':>16} {'before, us':>12} {'after, us':>12} {'speedup':>8}")
+    for name, (before, after, size) in cases.items():
+        number = max(args.number // size, 10)
+        before_us, after_us = measure(before, number), measure(after, number)
+        print(f"{name:>16} {before_us:>12.1f} {after_us:>12.1f} {before_us / after_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import argparse
+import timeit
+
+import numpy as np
+
+from service.reco.csr import CSRArray
+from service.reco.scoring import FactorModel
+
+
+def make_model(n_users: int, n_items: int, n_factors: int, n_seen: int, seed: int = 0) -> FactorModel:
+    rng = np.random.default_rng(seed)
+    seen = CSRArray(
+        np.arange(0, (n_users + 1) * n_seen, n_seen, dtype=np.int64),
+        rng.integers(0, n_items, size=n_users * n_seen),
+    )
+    return FactorModel(
+        rng.standard_normal((n_users, n_factors), dtype=np.float32),
+        rng.standard_normal((n_items, n_factors), dtype=np.float32),
+        seen=seen,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Latency of FactorModel scoring")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--items", type=int, default=15_000)
+    parser.add_argument("--factors", type=int, default=64)
+    parser.add_argument("--seen", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    model = make_model(args.users, args.items, args.factors, args.seen)
+    rng = np.random.default_rng(1)
+    user_ids = rng.integers(0, args.users, size=args.batch)
+
+    number = 200
+    single = min(timeit.repeat(lambda: model.recommend(int(user_ids[0]), args.k), number=number, repeat=5))
+    batch = min(timeit.repeat(lambda: model.recommend_batch(user_ids, args.k), number=10, repeat=5))
+    print(f"single user: {single / number * 1e3:.3f} ms")
+    print(f"batch of {args.batch}: {batch / 10 * 1e3:.3f} ms ({batch / 10 / args.batch * 1e6:.1f} us per user)")
+
+
+if __name__ == "__main__":
+    main()
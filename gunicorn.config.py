@@ -1,7 +1,11 @@
+import os
+import tempfile
 from multiprocessing import cpu_count
 from os import getenv as env
+from pathlib import Path
 
 from service import log, settings
+from service.api import metrics
 
 # The socket to bind.
 host = env("HOST", "0.0.0.0")
@@ -103,3 +107,17 @@ tmp_upload_dir = env("GUNICORN_TMP_UPLOAD_DIR", None)
 
 # Front-end’s IPs from which allowed to handle set secure headers.
 forwarded_allow_ips = env("GUNICORN_FORWARDER_ALLOW_IPS", "127.0.0.1")
+
+# Directory for metrics files of the workers, so /metrics of any worker
+# returns numbers of all of them. Workers get it through the environment.
+metrics_dir = env("METRICS_DIR") or tempfile.mkdtemp(prefix="reco_metrics_")
+os.environ["METRICS_DIR"] = metrics_dir
+
+
+def on_starting(server):
+    metrics.clear_dir(Path(metrics_dir))
+
+
+def child_exit(server, worker):
+    metrics.remove_gauges(Path(metrics_dir), worker.pid)
+    metrics.archive_counters(Path(metrics_dir), worker.pid)
@@ -4,13 +4,13 @@ import uvicorn
 from service.api.app import create_app
 from service.settings import get_config
 
-config = get_config()
-app = create_app(config)
-
-
 if __name__ == "__main__":
 
     host = os.getenv("HOST", "127.0.0.1")
     port = int(os.getenv("PORT", "8080"))
 
-    uvicorn.run(app, host=host, port=port)
+    uvicorn.run(create_app(get_config()), host=host, port=port)
+elif __name__ != "__mp_main__":
+    # served as main:app; spawned inference processes import this file
+    # as __mp_main__ and must not build their own app
+    app = create_app(get_config())
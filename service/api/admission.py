@@ -0,0 +1,105 @@
+import asyncio
+import math
+import random
+import time
+
+from service.log import app_logger
+from service.settings import AdmissionConfig
+
+# rejections are logged as one summary per interval, not one per request
+LOG_INTERVAL = 1.0
+
+
+class AdaptiveLimit:
+    """
+    AIMD admission of requests of a worker, by two signals.
+
+    Concurrency: latencies are compared with a baseline, the minimum seen
+    over the current and the previous ``baseline_window``, so slow models
+    don't look overloaded. A request answered within ``tolerance`` times
+    the baseline (or ``target_latency`` if it is higher) while at least
+    half the limit is in use adds ``1 / limit``, so a fully used limit
+    grows by one per ``limit`` requests; a slower one multiplies the limit
+    by ``backoff``, at most once per that threshold. This bounds requests
+    which wait for executors, batches or the process pool.
+
+    Queueing: requests which never yield are never concurrent, they queue
+    in the event loop instead, before the app sees them. Their queueing
+    delay is the loop lag, so every lag sample above ``max_loop_lag``
+    multiplies the share of admitted requests by ``backoff`` and every
+    sample below adds ``admit_step`` to it.
+
+    All calls come from the event loop thread, so there is no locking.
+    """
+
+    def __init__(self, config: AdmissionConfig) -> None:
+        self.config = config
+        self.limit = float(config.initial_limit)
+        self.in_flight = 0
+        self.loop_lag = 0.0
+        self.admit_ratio = 1.0
+        self.rejected = 0
+        self._decreased_at = 0.0
+        self._logged_at = 0.0
+        self._window_started_at = time.monotonic()
+        self._window_min = math.inf
+        self._previous_min = math.inf
+
+    def _admit(self) -> bool:
+        if self.in_flight >= int(self.limit):
+            return False
+        return self.admit_ratio >= 1 or random.random() < self.admit_ratio
+
+    def acquire(self) -> bool:
+        if not self._admit():
+            self.rejected += 1
+            self._log_rejected()
+            return False
+        self.in_flight += 1
+        return True
+
+    @property
+    def baseline(self) -> float:
+        return min(self._window_min, self._previous_min)
+
+    def release(self, latency: float) -> None:
+        config = self.config
+        self.in_flight -= 1
+        now = time.monotonic()
+        if now - self._window_started_at >= config.baseline_window:
+            self._previous_min, self._window_min = self._window_min, math.inf
+            self._window_started_at = now
+        self._window_min = min(self._window_min, latency)
+
+        threshold = max(config.target_latency, self.baseline * config.tolerance)
+        if latency > threshold:
+            if now - self._decreased_at >= threshold:
+                self.limit = max(config.min_limit, self.limit * config.backoff)
+                self._decreased_at = now
+        elif self.in_flight >= self.limit / 2:
+            self.limit = min(config.max_limit, self.limit + 1 / self.limit)
+
+    def _log_rejected(self) -> None:
+        now = time.monotonic()
+        if now - self._logged_at < LOG_INTERVAL:
+            return
+        self._logged_at = now
+        app_logger.warning(
+            "Shedding load: %s requests rejected so far, limit %s, in flight %s, admitted %.0f%%, loop lag %.3f s",
+            self.rejected, int(self.limit), self.in_flight, self.admit_ratio * 100, self.loop_lag,
+        )
+
+    def observe_loop_lag(self, lag: float) -> None:
+        config = self.config
+        self.loop_lag = lag
+        if lag > config.max_loop_lag:
+            self.admit_ratio = max(config.min_admit_ratio, self.admit_ratio * config.backoff)
+        else:
+            self.admit_ratio = min(1.0, self.admit_ratio + config.admit_step)
+
+    async def watch_loop_lag(self, interval: float) -> None:
+        """Measure how late the event loop wakes up a sleeping task."""
+        while True:
+            started_at = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.observe_loop_lag(max(time.perf_counter() - started_at - interval, 0.0))
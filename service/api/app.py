@@ -1,20 +1,34 @@
 import asyncio
+import time
 from concurrent.futures.thread import ThreadPoolExecutor
+from pathlib import Path
 from typing import Any, Dict
 
 import uvloop
 from fastapi import FastAPI
+from fastapi.routing import APIRoute
 
 from ..log import app_logger, setup_logging
-from ..settings import ServiceConfig
+from ..reco.inference import InferencePool, make_blocking_scorer, make_scorer
+from ..reco.interactions import InteractionsTail
+from ..reco.registry import ModelRegistry
+from ..reco.rerank import Reranker
+from ..reco.seen import SeenIndex
+from ..settings import AdmissionConfig, CacheConfig, MetricsConfig, SeenConfig, ServiceConfig
+from .admission import AdaptiveLimit
+from .batching import MicroBatcher
+from .cache import ResponseCache
 from .exception_handlers import add_exception_handlers
+from .metrics import Metrics
 from .middlewares import add_middlewares
+from .shadow import ShadowEvaluator
 from .views import add_views
+from .warmup import add_warmup
 
 __all__ = ("create_app",)
 
 
-def setup_asyncio(thread_name_prefix: str) -> None:
+def setup_asyncio(thread_name_prefix: str) -> ThreadPoolExecutor:
     uvloop.install()
 
     loop = asyncio.get_event_loop()
@@ -27,17 +41,150 @@ def setup_asyncio(thread_name_prefix: str) -> None:
         app_logger.warning(message)
 
     loop.set_exception_handler(handler)
+    return executor
+
+
+def add_models_watcher(app: FastAPI, interval: float) -> None:
+    if interval <= 0:
+        return
+
+    async def start() -> None:
+        app.state.models_watcher = asyncio.create_task(app.state.models.watch(interval, app.state.executor))
+
+    async def stop() -> None:
+        app.state.models_watcher.cancel()
+
+    app.add_event_handler("startup", start)
+    app.add_event_handler("shutdown", stop)
+
+
+def add_response_cache(app: FastAPI, config: CacheConfig) -> None:
+    if not config.enabled:
+        app.state.response_cache = None
+        return
+    cache = ResponseCache(config.max_bytes, config.ttl)
+    app.state.models.on_swap(cache.invalidate)
+    app.state.response_cache = cache
+
+
+def add_rerankers(app: FastAPI, config: ServiceConfig) -> None:
+    app.state.rerankers = {
+        name: Reranker.from_config(model_config.rerank)
+        for name, model_config in config.models.items()
+        if model_config.rerank.method is not None
+    }
+
+
+def add_seen_index(app: FastAPI, config: SeenConfig) -> None:
+    app.state.seen_config = config
+    if config.path is None and config.interactions_path is None:
+        app.state.seen_index = None
+        return
+    if config.backfill is not None and config.backfill not in app.state.models.model_names:
+        raise ValueError(f"Unknown backfill model {config.backfill}")
+    index = SeenIndex.load(Path(config.path) if config.path else None)
+    app.state.seen_index = index
+    if config.interactions_path is None:
+        return
+    tail = InteractionsTail(config.interactions_path)
+
+    async def start() -> None:
+        app.state.seen_watcher = asyncio.create_task(
+            index.watch(tail, config.ingest_interval, config.compact_size, app.state.executor)
+        )
+
+    async def stop() -> None:
+        app.state.seen_watcher.cancel()
+
+    app.add_event_handler("startup", start)
+    app.add_event_handler("shutdown", stop)
+
+
+def add_shadows(app: FastAPI, config: ServiceConfig) -> None:
+    app.state.shadows = {}
+    for name, model_config in config.models.items():
+        shadow = model_config.shadow
+        if shadow.model is None:
+            continue
+        if shadow.model not in config.models:
+            raise ValueError(f"Unknown shadow model {shadow.model} of model {name}")
+        score = make_blocking_scorer(shadow.model, app.state.models, app.state.inference_pool)
+        evaluator = ShadowEvaluator(name, score, shadow, app.state.metrics)
+        app.state.shadows[name] = evaluator
+        app.add_event_handler("startup", evaluator.start)
+        app.add_event_handler("shutdown", evaluator.stop)
+
+
+def add_admission(app: FastAPI, config: AdmissionConfig) -> None:
+    if not config.enabled:
+        app.state.admission = None
+        return
+    limiter = AdaptiveLimit(config)
+    app.state.admission = limiter
+
+    async def start() -> None:
+        app.state.metrics.set_concurrency_limit(int(limiter.limit))
+        app.state.loop_lag_watcher = asyncio.create_task(limiter.watch_loop_lag(config.loop_lag_interval))
+
+    async def stop() -> None:
+        app.state.loop_lag_watcher.cancel()
+
+    app.add_event_handler("startup", start)
+    app.add_event_handler("shutdown", stop)
+
+
+def add_metrics(app: FastAPI, config: MetricsConfig) -> None:
+    routes = [route.path for route in app.routes if isinstance(route, APIRoute)]
+    app.state.metrics = Metrics(
+        routes,
+        app.state.models.model_names,
+        Path(config.dir) if config.dir else None,
+    )
+
+
+def add_inference(app: FastAPI, config: ServiceConfig) -> None:
+    models = app.state.models
+    pool = InferencePool(config.models, config.inference_processes)
+    app.state.inference_pool = pool
+    app.state.scorers = {name: make_scorer(name, models, app.state.executor, pool) for name in config.models}
+    app.state.batchers = {
+        name: MicroBatcher(
+            name,
+            app.state.scorers[name],
+            model_config.batch.window,
+            model_config.batch.max_size,
+            app.state.metrics,
+        )
+        for name, model_config in config.models.items()
+        if model_config.batch.window > 0
+    }
+    app.add_event_handler("shutdown", pool.shutdown)
 
 
 def create_app(config: ServiceConfig) -> FastAPI:
+    created_at = time.perf_counter()
     setup_logging(config)
-    setup_asyncio(thread_name_prefix=config.service_name)
+    executor = setup_asyncio(thread_name_prefix=config.service_name)
 
     app = FastAPI(debug=False)
+    # the server may run another event loop than the one configured above
+    app.state.executor = executor
+    app.state.created_at = created_at
     app.state.k_recs = config.k_recs
+    app.state.max_batch_size = config.max_batch_size
+    app.state.models = ModelRegistry.from_config(config.models)
+    add_response_cache(app, config.cache_config)
+    add_seen_index(app, config.seen_config)
+    add_rerankers(app, config)
 
     add_views(app)
-    add_middlewares(app)
+    add_metrics(app, config.metrics_config)
+    add_inference(app, config)
+    add_shadows(app, config)
+    add_admission(app, config.admission_config)
+    add_middlewares(app, config.timing_config)
     add_exception_handlers(app)
+    add_models_watcher(app, config.models_refresh_interval)
+    add_warmup(app, config.warmup_config)
 
     return app
@@ -0,0 +1,47 @@
+import asyncio
+import typing as tp
+
+from starlette.types import ASGIApp, Message, Scope
+
+Headers = tp.Sequence[tp.Tuple[bytes, bytes]]
+
+
+def make_scope(method: str, path: str, body: bytes = b"", headers: Headers = ()) -> Scope:
+    scope_headers = [(b"host", b"localhost"), *headers]
+    if body:
+        scope_headers += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": scope_headers,
+        "client": ("127.0.0.1", 12345),
+        "server": ("localhost", 80),
+    }
+
+
+async def call(app: ASGIApp, method: str, path: str, body: bytes = b"", headers: Headers = ()) -> int:
+    """Send one request to ``app`` in-process, return the status code."""
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status_code = 0
+
+    async def receive() -> Message:
+        if messages:
+            return messages.pop()
+        # a client which keeps the connection open
+        await asyncio.Event().wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: Message) -> None:
+        nonlocal status_code
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+
+    await app(make_scope(method, path, body, headers), receive, send)
+    return status_code
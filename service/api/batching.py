@@ -0,0 +1,87 @@
+import asyncio
+import time
+import typing as tp
+
+import numpy as np
+
+from service.api.exceptions import UserNotFoundError
+from service.reco.inference import Scorer
+
+from .metrics import Metrics
+
+
+class Pending(tp.NamedTuple):
+    user_id: int
+    k: int
+    future: "asyncio.Future[np.ndarray]"
+    queued_at: float
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single user requests to one model.
+
+    Requests are queued until ``window`` seconds pass since the first of
+    them or ``max_size`` of them are waiting, then all of them are scored
+    by one ``score`` call, so e.g. a factor model does one matrix-matrix
+    product instead of many matrix-vector ones.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        score: Scorer,
+        window: float,
+        max_size: int,
+        metrics: Metrics,
+    ) -> None:
+        self.name = name
+        self.score = score
+        self.window = window
+        self.max_size = max_size
+        self.metrics = metrics
+        self._pending: tp.List[Pending] = []
+        self._timer: tp.Optional[asyncio.TimerHandle] = None
+        # keep references, the loop holds tasks weakly
+        self._tasks: tp.Set["asyncio.Task[None]"] = set()
+
+    async def recommend(self, user_id: int, k: int) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        future: "asyncio.Future[np.ndarray]" = loop.create_future()
+        self._pending.append(Pending(user_id, k, future, time.perf_counter()))
+        if len(self._pending) >= self.max_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self.flush)
+        return await future
+
+    def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._score(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _score(self, batch: tp.List[Pending]) -> None:
+        # every failure must reach the futures, or their callers hang
+        try:
+            started_at = time.perf_counter()
+            self.metrics.observe_batch(self.name, [started_at - pending.queued_at for pending in batch])
+            user_ids = np.array([pending.user_id for pending in batch], dtype=np.int64)
+            recos = await self.score(user_ids, max(pending.k for pending in batch))
+            self.metrics.observe_model(self.name, time.perf_counter() - started_at)
+            for pending, reco in zip(batch, recos):
+                # the caller may have been cancelled, e.g. by its budget
+                if pending.future.done():
+                    continue
+                if reco is None:
+                    pending.future.set_exception(UserNotFoundError(error_message=f"User {pending.user_id} not found"))
+                else:
+                    pending.future.set_result(reco[:pending.k])
+        except Exception as e:  # pylint: disable=broad-except
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
@@ -0,0 +1,85 @@
+import threading
+import time
+import typing as tp
+from collections import OrderedDict
+
+CacheKey = tp.Tuple[str, str, int, int]
+
+# rough size of the key tuple, dict slot and bookkeeping of one entry
+ENTRY_OVERHEAD = 256
+
+
+class ResponseCache:
+    """
+    LRU cache of encoded response bodies with TTL and a memory bound.
+
+    Keys are ``(model_name, model_version, user_id, k)``, so a swapped
+    model never hits entries of the previous version; ``invalidate`` drops
+    them eagerly instead of waiting for LRU to push them out.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl: float,
+        clock: tp.Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[CacheKey, tp.Tuple[float, bytes]]" = OrderedDict()
+        # the models watcher invalidates from an executor thread
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: CacheKey) -> tp.Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, body = entry
+            if expires_at < self.clock():
+                self._remove(key)
+                self.misses += 1
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key: CacheKey, body: bytes) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (self.clock() + self.ttl, body)
+            self.size += len(body) + ENTRY_OVERHEAD
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, model_name: str) -> int:
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == model_name]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def _remove(self, key: CacheKey) -> None:
+        _, body = self._entries.pop(key)
+        self.size -= len(body) + ENTRY_OVERHEAD
+
+    def stats(self) -> tp.Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.size,
+        }
@@ -28,6 +28,17 @@ class UserNotFoundError(AppException):
         super().__init__(status_code, error_key, error_message, error_loc)
 
 
+class ItemNotFoundError(AppException):
+    def __init__(
+        self,
+        status_code: int = HTTPStatus.NOT_FOUND,
+        error_key: str = "item_not_found",
+        error_message: str = "Item is unknown",
+        error_loc: tp.Optional[tp.Sequence[str]] = None,
+    ):
+        super().__init__(status_code, error_key, error_message, error_loc)
+
+
 class ModelNotFoundError(AppException):
     def __init__(
         self,
@@ -37,3 +48,58 @@ class ModelNotFoundError(AppException):
         error_loc: tp.Optional[tp.Sequence[str]] = None,
     ):
         super().__init__(status_code, error_key, error_message, error_loc)
+
+
+class ModelNotPublishedError(AppException):
+    def __init__(
+        self,
+        status_code: int = HTTPStatus.SERVICE_UNAVAILABLE,
+        error_key: str = "model_not_published",
+        error_message: str = "Model artifacts are not published yet",
+        error_loc: tp.Optional[tp.Sequence[str]] = None,
+    ):
+        super().__init__(status_code, error_key, error_message, error_loc)
+
+
+class BatchTooLargeError(AppException):
+    def __init__(
+        self,
+        status_code: int = HTTPStatus.UNPROCESSABLE_ENTITY,
+        error_key: str = "batch_too_large",
+        error_message: str = "Too many users in batch",
+        error_loc: tp.Optional[tp.Sequence[str]] = None,
+    ):
+        super().__init__(status_code, error_key, error_message, error_loc)
+
+
+class ModelTimeoutError(AppException):
+    def __init__(
+        self,
+        status_code: int = HTTPStatus.GATEWAY_TIMEOUT,
+        error_key: str = "model_timeout",
+        error_message: str = "Model did not answer in time",
+        error_loc: tp.Optional[tp.Sequence[str]] = None,
+    ):
+        super().__init__(status_code, error_key, error_message, error_loc)
+
+
+class NotReadyError(AppException):
+    def __init__(
+        self,
+        status_code: int = HTTPStatus.SERVICE_UNAVAILABLE,
+        error_key: str = "not_ready",
+        error_message: str = "Service is warming up",
+        error_loc: tp.Optional[tp.Sequence[str]] = None,
+    ):
+        super().__init__(status_code, error_key, error_message, error_loc)
+
+
+class OverloadedError(AppException):
+    def __init__(
+        self,
+        status_code: int = HTTPStatus.SERVICE_UNAVAILABLE,
+        error_key: str = "overloaded",
+        error_message: str = "Service is overloaded, retry later",
+        error_loc: tp.Optional[tp.Sequence[str]] = None,
+    ):
+        super().__init__(status_code, error_key, error_message, error_loc)
@@ -0,0 +1,309 @@
+import fcntl
+import mmap
+import os
+import typing as tp
+import weakref
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+OVERLAP_BUCKETS = (0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+OTHER_ROUTE = "other"
+
+COUNTERS_PREFIX = "counters_"
+GAUGES_PREFIX = "gauges_"
+FILE_SUFFIX = ".bin"
+# counters of exited workers summed up, read along with the live ones
+ARCHIVE_FILE = f"{COUNTERS_PREFIX}archive{FILE_SUFFIX}"
+# archiving holds it exclusively, so readers never count a worker twice
+LOCK_FILE = "metrics.lock"
+
+# request counter, error counter and latency histogram of a route
+ROUTE_REQUESTS, ROUTE_ERRORS, ROUTE_LATENCY = 0, 1, 2
+# request counter, cache hits and misses, missed latency budgets and
+# latency histogram of a model, followed by histograms of micro-batch
+# queueing delay and size, of shadow model latency and top-k overlap and
+# by the counter of dropped shadow requests
+MODEL_REQUESTS, MODEL_CACHE_HITS, MODEL_CACHE_MISSES, MODEL_TIMEOUTS, MODEL_LATENCY = 0, 1, 2, 3, 4
+
+IN_FLIGHT, CONCURRENCY_LIMIT = 0, 1
+N_GAUGES = 2
+
+
+def _open_values(path: tp.Optional[Path], size: int) -> np.ndarray:
+    """Zeroed float64 values, in a file mapped to memory if path is set."""
+    if path is None:
+        return np.zeros(size, dtype=np.float64)
+    with open(path, "wb+") as file:
+        file.truncate(size * 8)
+        return np.frombuffer(mmap.mmap(file.fileno(), size * 8), dtype=np.float64)
+
+
+def _read_values(path: tp.Optional[Path], prefix: str, size: int, own: np.ndarray) -> np.ndarray:
+    if path is None:
+        return own.copy()
+    total = np.zeros(size, dtype=np.float64)
+    with _locked(path, fcntl.LOCK_SH):
+        for file in path.glob(f"{prefix}*{FILE_SUFFIX}"):
+            try:
+                values = np.fromfile(file, dtype=np.float64)
+            except FileNotFoundError:
+                # worker exited while we were listing the directory
+                continue
+            # files of another layout are left from a previous deploy
+            if len(values) == size:
+                total += values
+    return total
+
+
+@contextmanager
+def _locked(path: Path, operation: int) -> tp.Iterator[None]:
+    with open(path / LOCK_FILE, "a", encoding="utf-8") as file:
+        fcntl.flock(file, operation)
+        yield
+
+
+def clear_dir(path: Path) -> None:
+    """Remove files of previous runs, call before workers start."""
+    path.mkdir(parents=True, exist_ok=True)
+    for file in path.glob(f"*{FILE_SUFFIX}"):
+        file.unlink()
+    (path / LOCK_FILE).unlink(missing_ok=True)
+
+
+def remove_gauges(path: Path, pid: int) -> None:
+    """Drop gauges of an exited worker, its counters are kept."""
+    (path / f"{GAUGES_PREFIX}{pid}{FILE_SUFFIX}").unlink(missing_ok=True)
+
+
+def archive_counters(path: Path, pid: int) -> None:
+    """
+    Add counters of an exited worker to the archive file and remove its
+    own file, so restarted workers don't pile up files read on scrapes.
+    """
+    own, archive = path / f"{COUNTERS_PREFIX}{pid}{FILE_SUFFIX}", path / ARCHIVE_FILE
+    with _locked(path, fcntl.LOCK_EX):
+        if not own.exists():
+            return
+        values = np.fromfile(own, dtype=np.float64)
+        if archive.exists():
+            archived = np.fromfile(archive, dtype=np.float64)
+            # an archive of another layout is left from a previous deploy
+            if len(archived) == len(values):
+                values += archived
+        tmp_path = archive.with_suffix(".tmp")
+        values.tofile(tmp_path)
+        os.replace(tmp_path, archive)
+        own.unlink()
+
+
+def _reopen_all() -> None:
+    for metrics in list(_instances):
+        metrics.open()
+
+
+class Metrics:  # pylint: disable=too-many-instance-attributes
+    """
+    Request and model counters and latency histograms of a service.
+
+    All values are float64 slots at offsets fixed by the route and model
+    names, so recording is a few ``+=`` on a numpy array without locks:
+    each process only writes its own values, from the event loop thread,
+    except the shadow latency and overlap slots, which only the shadow
+    evaluator threads write, under their own lock.
+
+    With ``path`` every process maps its values to a file in that directory
+    and ``collect`` sums the files of all processes, e.g. of all gunicorn
+    workers. Counters of exited workers are moved to one archive file by
+    ``archive_counters`` and stay in the sum, their gauges are removed by
+    ``remove_gauges``.
+    """
+
+    def __init__(
+        self,
+        routes: tp.Sequence[str],
+        models: tp.Sequence[str],
+        path: tp.Optional[Path] = None,
+        buckets: tp.Sequence[float] = LATENCY_BUCKETS,
+        batch_buckets: tp.Sequence[float] = BATCH_SIZE_BUCKETS,
+    ) -> None:
+        self.path = path
+        self.buckets = tuple(buckets)
+        self.batch_buckets = tuple(batch_buckets)
+        # non-cumulative bucket counts with +Inf last, then sum and count
+        self.histogram_size = len(self.buckets) + 3
+        self.queue_delay_slot = MODEL_LATENCY + self.histogram_size
+        self.batch_size_slot = self.queue_delay_slot + self.histogram_size
+        self.shadow_latency_slot = self.batch_size_slot + len(self.batch_buckets) + 3
+        self.shadow_overlap_slot = self.shadow_latency_slot + self.histogram_size
+        self.shadow_dropped_slot = self.shadow_overlap_slot + len(OVERLAP_BUCKETS) + 3
+
+        self.routes: tp.Dict[str, int] = {}
+        size = 0
+        for route in [*routes, OTHER_ROUTE]:
+            self.routes[route] = size
+            size += ROUTE_LATENCY + self.histogram_size
+        self.models: tp.Dict[str, int] = {}
+        for model in models:
+            self.models[model] = size
+            size += self.shadow_dropped_slot + 1
+        # requests shed by admission control
+        self.rejected_slot = size
+        self.size = size + 1
+
+        if path is not None:
+            path.mkdir(parents=True, exist_ok=True)
+        self.open()
+        _instances.add(self)
+
+    def open(self) -> None:
+        pid = os.getpid()
+        path = self.path
+        self.counters = _open_values(path and path / f"{COUNTERS_PREFIX}{pid}{FILE_SUFFIX}", self.size)
+        self.gauges = _open_values(path and path / f"{GAUGES_PREFIX}{pid}{FILE_SUFFIX}", N_GAUGES)
+
+    def _observe(self, offset: int, value: float, buckets: tp.Optional[tp.Tuple[float, ...]] = None) -> None:
+        counters = self.counters
+        buckets = buckets or self.buckets
+        counters[offset + bisect_left(buckets, value)] += 1
+        counters[offset + len(buckets) + 1] += value
+        counters[offset + len(buckets) + 2] += 1
+
+    def request_started(self) -> None:
+        self.gauges[IN_FLIGHT] += 1
+
+    def request_finished(self, route: str, status_code: int, seconds: float) -> None:
+        self.gauges[IN_FLIGHT] -= 1
+        offset = self.routes.get(route)
+        if offset is None:
+            offset = self.routes[OTHER_ROUTE]
+        self.counters[offset + ROUTE_REQUESTS] += 1
+        if status_code >= 500:
+            self.counters[offset + ROUTE_ERRORS] += 1
+        self._observe(offset + ROUTE_LATENCY, seconds)
+
+    def observe_rejected(self) -> None:
+        self.counters[self.rejected_slot] += 1
+
+    def set_concurrency_limit(self, limit: int) -> None:
+        self.gauges[CONCURRENCY_LIMIT] = limit
+
+    def observe_model(self, model: str, seconds: float) -> None:
+        offset = self.models[model]
+        self.counters[offset + MODEL_REQUESTS] += 1
+        self._observe(offset + MODEL_LATENCY, seconds)
+
+    def observe_cache(self, model: str, hit: bool) -> None:
+        self.counters[self.models[model] + (MODEL_CACHE_HITS if hit else MODEL_CACHE_MISSES)] += 1
+
+    def observe_timeout(self, model: str) -> None:
+        self.counters[self.models[model] + MODEL_TIMEOUTS] += 1
+
+    def observe_batch(self, model: str, queue_delays: tp.Sequence[float]) -> None:
+        """A micro-batch of ``len(queue_delays)`` requests was scored."""
+        offset = self.models[model]
+        for seconds in queue_delays:
+            self._observe(offset + self.queue_delay_slot, seconds)
+        self._observe(offset + self.batch_size_slot, len(queue_delays), self.batch_buckets)
+
+    def observe_shadow(self, model: str, seconds: float, overlap: tp.Optional[float]) -> None:
+        """The shadow of ``model`` answered, ``overlap`` is None on failure."""
+        offset = self.models[model]
+        self._observe(offset + self.shadow_latency_slot, seconds)
+        if overlap is not None:
+            self._observe(offset + self.shadow_overlap_slot, overlap, OVERLAP_BUCKETS)
+
+    def observe_shadow_dropped(self, model: str) -> None:
+        self.counters[self.models[model] + self.shadow_dropped_slot] += 1
+
+    def collect(self) -> tp.Tuple[np.ndarray, np.ndarray]:
+        """Counters and gauges summed over all processes."""
+        return (
+            _read_values(self.path, COUNTERS_PREFIX, self.size, self.counters),
+            _read_values(self.path, GAUGES_PREFIX, N_GAUGES, self.gauges),
+        )
+
+    @staticmethod
+    def _render_counter(
+        name: str,
+        label: str,
+        offsets: tp.Dict[str, int],
+        counters: np.ndarray,
+        slot: int,
+    ) -> tp.List[str]:
+        lines = [f"# TYPE {name} counter"]
+        lines += (f'{name}{{{label}="{key}"}} {counters[offset + slot]:g}' for key, offset in offsets.items())
+        return lines
+
+    def _render_histogram(
+        self,
+        name: str,
+        label: str,
+        offsets: tp.Dict[str, int],
+        counters: np.ndarray,
+        slot: int,
+        buckets: tp.Optional[tp.Tuple[float, ...]] = None,
+    ) -> tp.List[str]:
+        buckets = buckets or self.buckets
+        n_buckets = len(buckets)
+        bounds = [*map(repr, buckets), "+Inf"]
+        lines = [f"# TYPE {name} histogram"]
+        for key, offset in offsets.items():
+            values = counters[offset + slot:][:n_buckets + 3]
+            labels = f'{label}="{key}"'
+            cumulative = np.cumsum(values[:n_buckets + 1])
+            lines += (f'{name}_bucket{{{labels},le="{le}"}} {count:g}' for le, count in zip(bounds, cumulative))
+            lines.append(f"{name}_sum{{{labels}}} {float(values[n_buckets + 1])!r}")
+            lines.append(f"{name}_count{{{labels}}} {values[n_buckets + 2]:g}")
+        return lines
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        counters, gauges = self.collect()
+        routes, models = self.routes, self.models
+        lines = [
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {gauges[IN_FLIGHT]:g}",
+            "# TYPE http_concurrency_limit gauge",
+            f"http_concurrency_limit {gauges[CONCURRENCY_LIMIT]:g}",
+            "# TYPE http_requests_rejected_total counter",
+            f"http_requests_rejected_total {counters[self.rejected_slot]:g}",
+            *self._render_counter("http_requests_total", "route", routes, counters, ROUTE_REQUESTS),
+            *self._render_counter("http_errors_total", "route", routes, counters, ROUTE_ERRORS),
+            *self._render_histogram("http_request_duration_seconds", "route", routes, counters, ROUTE_LATENCY),
+            *self._render_counter("reco_model_requests_total", "model", models, counters, MODEL_REQUESTS),
+            *self._render_histogram("reco_model_duration_seconds", "model", models, counters, MODEL_LATENCY),
+            *self._render_counter("reco_model_timeouts_total", "model", models, counters, MODEL_TIMEOUTS),
+            *self._render_histogram(
+                "reco_batch_queue_seconds", "model", models, counters, self.queue_delay_slot,
+            ),
+            *self._render_histogram(
+                "reco_batch_size", "model", models, counters, self.batch_size_slot, self.batch_buckets,
+            ),
+            *self._render_histogram(
+                "reco_shadow_duration_seconds", "model", models, counters, self.shadow_latency_slot,
+            ),
+            *self._render_histogram(
+                "reco_shadow_overlap", "model", models, counters, self.shadow_overlap_slot, OVERLAP_BUCKETS,
+            ),
+            *self._render_counter(
+                "reco_shadow_dropped_total", "model", models, counters, self.shadow_dropped_slot,
+            ),
+            *self._render_counter("reco_cache_hits_total", "model", models, counters, MODEL_CACHE_HITS),
+            *self._render_counter("reco_cache_misses_total", "model", models, counters, MODEL_CACHE_MISSES),
+            "# TYPE reco_cache_hit_ratio gauge",
+        ]
+        for model, offset in models.items():
+            hits, misses = counters[offset + MODEL_CACHE_HITS], counters[offset + MODEL_CACHE_MISSES]
+            lines.append(f'reco_cache_hit_ratio{{model="{model}"}} {hits / max(hits + misses, 1):g}')
+        return "\n".join(lines) + "\n"
+
+
+# with gunicorn preload_app the app is created before fork, fork hooks
+# can't be removed, so one hook reopens files of all live instances
+_instances: "weakref.WeakSet[Metrics]" = weakref.WeakSet()
+os.register_at_fork(after_in_child=_reopen_all)
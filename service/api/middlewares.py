@@ -1,57 +1,245 @@
+import cProfile
+import random
 import time
+import typing as tp
+from pathlib import Path
 
-from fastapi import FastAPI, Request
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from fastapi import FastAPI
+from starlette.datastructures import URL
 from starlette.middleware.cors import CORSMiddleware
-from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from service.log import access_logger, app_logger
 from service.models import Error
-from service.response import server_error
+from service.response import create_response, server_error
+from service.settings import TimingConfig
 
+from .admission import AdaptiveLimit
+from .exceptions import OverloadedError
+from .metrics import OTHER_ROUTE, Metrics
+from .timing import TIMINGS_KEY, Timings
+
+PROFILE_HEADER = b"x-profile"
+
+
+class AccessMiddleware:
+    """Logs method, url, status and time of every http request."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started_at = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_time = time.perf_counter() - started_at
+            access_logger.info(
+                msg="",
+                extra={
+                    "request_time": round(request_time, 4),
+                    "status_code": status_code,
+                    "requested_url": URL(scope=scope),
+                    "method": scope["method"],
+                },
+            )
+
+
+class MetricsMiddleware:
+    """Records in-flight requests and count, errors and latency by route."""
+
+    def __init__(self, app: ASGIApp, metrics: Metrics) -> None:
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started_at = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        self.metrics.request_started()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # the router puts the matched route to the same scope
+            route = scope.get("route")
+            self.metrics.request_finished(
+                route.path if route is not None else OTHER_ROUTE,
+                status_code,
+                time.perf_counter() - started_at,
+            )
+
+
+class AdmissionMiddleware:
+    """
+    Sheds requests above the adaptive concurrency limit with a prepared
+    503 ``overloaded`` response before any routing or parsing. Only paths
+    starting with ``path_prefixes`` are limited, so health checks and
+    metrics are never shed, and batches of ``bypass_suffixes`` neither
+    are shed nor move the limit with their latency.
+    """
+
+    def __init__(self, app: ASGIApp, limiter: AdaptiveLimit, metrics: Metrics) -> None:
+        self.app = app
+        self.limiter = limiter
+        self.metrics = metrics
+        self.path_prefixes = tuple(limiter.config.path_prefixes)
+        self.bypass_suffixes = tuple(limiter.config.bypass_suffixes)
+        exc = OverloadedError()
+        error = Error(error_key=exc.error_key, error_message=exc.error_message)
+        self.rejection = create_response(exc.status_code, errors=[error])
+        self.rejection.headers["Retry-After"] = "1"
+
+    def _limited(self, path: str) -> bool:
+        return path.startswith(self.path_prefixes) and not path.endswith(self.bypass_suffixes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._limited(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiter
+        if not limiter.acquire():
+            self.metrics.observe_rejected()
+            await self.rejection(scope, receive, send)
+            return
 
-class AccessMiddleware(BaseHTTPMiddleware):
-    async def dispatch(
-        self,
-        request: Request,
-        call_next: RequestResponseEndpoint,
-    ) -> Response:
         started_at = time.perf_counter()
-        response = await call_next(request)
-        request_time = time.perf_counter() - started_at
-
-        status_code = response.status_code
-
-        access_logger.info(
-            msg="",
-            extra={
-                "request_time": round(request_time, 4),
-                "status_code": status_code,
-                "requested_url": request.url,
-                "method": request.method,
-            },
-        )
-        return response
-
-
-class ExceptionHandlerMiddleware(BaseHTTPMiddleware):
-    async def dispatch(
-        self,
-        request: Request,
-        call_next: RequestResponseEndpoint,
-    ) -> Response:
         try:
-            return await call_next(request)
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.perf_counter() - started_at)
+            self.metrics.set_concurrency_limit(int(limiter.limit))
+
+
+class ExceptionHandlerMiddleware:
+    """Turns unhandled exceptions into ``server_error`` responses."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
         except Exception as e:  # pylint: disable=W0703,W1203
             app_logger.exception(msg=f"Caught unhandled {e.__class__} exception: {e}")
+            if response_started:
+                # too late to replace the response, let the server drop it
+                raise
             error = Error(error_key="server_error", error_message="Internal Server Error")
-            return server_error([error])
+            await server_error([error])(scope, receive, send)
+
+
+class TimingMiddleware:
+    """
+    Adds the ``Server-Timing`` header with request stages marked by views
+    and saves cProfile stats of sampled requests and of requests with the
+    admin ``X-Profile`` token to ``profile_dir``.
+
+    One request per process is profiled at a time. The profiler sees the
+    whole event loop thread, so the stats include requests interleaved
+    with the profiled one.
+    """
+
+    def __init__(self, app: ASGIApp, config: TimingConfig) -> None:
+        self.app = app
+        self.server_timing = config.server_timing
+        self.profile_dir = Path(config.profile_dir) if config.profile_dir else None
+        self.sample_rate = config.profile_sample_rate
+        self.token = config.profile_token.encode() if config.profile_token else None
+        self._profiling = False
+
+    def _should_profile(self, scope: Scope) -> bool:
+        if self.profile_dir is None or self._profiling:
+            return False
+        if self.token is not None and (PROFILE_HEADER, self.token) in scope["headers"]:
+            return True
+        return random.random() < self.sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: tp.Optional[Timings] = None
+        if self.server_timing:
+            timings = scope[TIMINGS_KEY] = Timings()
+
+        async def send_wrapper(message: Message) -> None:
+            if timings is not None and message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", timings.header())]}
+            await send(message)
+
+        if not self._should_profile(scope):
+            await self.app(scope, receive, send_wrapper)
+            return
+
+        self._profiling = True
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.disable()
+            self._profiling = False
+            self._dump(profile, scope)
+
+    def _dump(self, profile: cProfile.Profile, scope: Scope) -> None:
+        profile_dir = tp.cast(Path, self.profile_dir)
+        name = scope["path"].strip("/").replace("/", "_") or "root"
+        path = profile_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{time.perf_counter_ns()}-{name}.prof"
+        try:
+            profile_dir.mkdir(parents=True, exist_ok=True)
+            profile.dump_stats(path)
+        except OSError:
+            app_logger.exception("Failed to save profile to %s", path)
+            return
+        app_logger.info("Profile of %s %s saved to %s", scope["method"], scope["path"], path)
 
 
-def add_middlewares(app: FastAPI) -> None:
+def add_middlewares(app: FastAPI, config: TimingConfig) -> None:
     # do not change order
     app.add_middleware(ExceptionHandlerMiddleware)
+    if app.state.admission is not None:
+        app.add_middleware(AdmissionMiddleware, limiter=app.state.admission, metrics=app.state.metrics)
+    app.add_middleware(MetricsMiddleware, metrics=app.state.metrics)
     app.add_middleware(AccessMiddleware)
+    # no per-request work at all unless timing or profiling is on
+    if config.server_timing or config.profile_dir is not None:
+        app.add_middleware(TimingMiddleware, config=config)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
@@ -0,0 +1,93 @@
+import queue
+import random
+import threading
+import time
+import typing as tp
+
+import numpy as np
+
+from service.log import app_logger
+from service.reco.inference import BlockingScorer
+from service.settings import ShadowConfig
+
+from .metrics import Metrics
+
+
+def top_k_overlap(primary: np.ndarray, candidate: np.ndarray) -> float:
+    """Share of the primary items which the candidate recommends too."""
+    if len(primary) == 0:
+        return float(len(candidate) == 0)
+    return len(np.intersect1d(primary, candidate)) / len(primary)
+
+
+class ShadowEvaluator:
+    """
+    Replays requests answered by a primary model against a candidate.
+
+    ``submit`` only puts the request to a bounded queue and drops it when
+    the queue is full. Worker threads score the candidate, in the thread
+    or in the inference process pool, and record its latency and its
+    top-k overlap with the items the primary model scored under the
+    primary's name. Both lists are raw model output, before seen items
+    are dropped and the reranker runs.
+
+    The event loop never waits for or is woken up by the candidate, so
+    the primary path costs one ``put_nowait``. But a candidate scored in
+    the threads competes with the event loop for the GIL of the serving
+    process, so a heavy one should have ``"process": true``.
+    """
+
+    def __init__(self, primary: str, score: BlockingScorer, config: ShadowConfig, metrics: Metrics) -> None:
+        self.primary = primary
+        self.candidate = config.model
+        self.score = score
+        self.config = config
+        self.metrics = metrics
+        self._queue: "queue.Queue[tp.Tuple[int, np.ndarray]]" = queue.Queue(config.queue_size)
+        self._threads: tp.List[threading.Thread] = []
+        self._stopped = threading.Event()
+        # workers share the shadow slots, the event loop never writes them
+        self._metrics_lock = threading.Lock()
+
+    def submit(self, user_id: int, primary_items: np.ndarray) -> None:
+        if not self._threads or random.random() >= self.config.sample_rate:
+            return
+        try:
+            self._queue.put_nowait((user_id, primary_items))
+        except queue.Full:
+            self.metrics.observe_shadow_dropped(self.primary)
+
+    def _evaluate(self, user_id: int, primary_items: np.ndarray) -> None:
+        started_at = time.perf_counter()
+        overlap = None
+        try:
+            reco = self.score(np.array([user_id], dtype=np.int64), len(primary_items))[0]
+        except Exception:  # pylint: disable=broad-except
+            app_logger.exception("Shadow model %s of %s failed", self.candidate, self.primary)
+        else:
+            if reco is not None:
+                overlap = top_k_overlap(primary_items, reco)
+        with self._metrics_lock:
+            self.metrics.observe_shadow(self.primary, time.perf_counter() - started_at, overlap)
+
+    def _work(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                request = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            self._evaluate(*request)
+
+    def start(self) -> None:
+        self._stopped.clear()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"shadow-{self.primary}", daemon=True)
+            for _ in range(self.config.concurrency)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """Stop workers after their current request, without waiting."""
+        self._threads = []
+        self._stopped.set()
@@ -0,0 +1,49 @@
+import time
+import typing as tp
+
+from starlette.requests import Request
+
+# scope key of the request timings, set by ``TimingMiddleware``
+TIMINGS_KEY = "timings"
+MIDDLEWARE_STAGE = "middleware"
+
+
+class Timings:
+    """
+    Durations of request stages for the ``Server-Timing`` header.
+
+    ``mark(stage)`` adds the time since the previous mark to ``stage``,
+    the first mark of a handler is the middleware stage, so the stages sum
+    up to the total.
+    """
+
+    def __init__(self) -> None:
+        self.started_at = self._last = time.perf_counter()
+        self.stages: tp.Dict[str, float] = {}
+
+    def mark(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self._last
+        self._last = now
+
+    def header(self) -> bytes:
+        self.mark(MIDDLEWARE_STAGE)
+        stages = [*self.stages.items(), ("total", self._last - self.started_at)]
+        return ", ".join(f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in stages).encode()
+
+
+class NullTimings(Timings):
+    """Timings of a request when ``Server-Timing`` is off, marks are no-ops."""
+
+    def __init__(self) -> None:  # pylint: disable=super-init-not-called
+        pass
+
+    def mark(self, stage: str) -> None:
+        pass
+
+
+NULL_TIMINGS = NullTimings()
+
+
+def get_timings(request: Request) -> Timings:
+    return request.scope.get(TIMINGS_KEY, NULL_TIMINGS)
@@ -1,12 +1,34 @@
-import random
-from typing import List
+import asyncio
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
 
-from fastapi import APIRouter, FastAPI, Request
+import numpy as np
+from fastapi import APIRouter, FastAPI, Request, Response
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 
-from service.api.exceptions import ModelNotFoundError, UserNotFoundError
+from service.api.exceptions import (
+    BatchTooLargeError,
+    ItemNotFoundError,
+    ModelNotFoundError,
+    ModelTimeoutError,
+    NotReadyError,
+    UserNotFoundError,
+)
 from service.log import app_logger
 from service.models import Error
+from service.reco.inference import Recos, Scorer, recommend_known
+from service.reco.models import RecoModel
+from service.response import JSON_MEDIA_TYPE, DataclassJSONResponse, render_json, render_reco
+
+from .timing import MIDDLEWARE_STAGE, get_timings
+
+MAX_USER_ID = 10**9
+MAX_ITEM_ID = 10**9
+# response header naming the model which served the recommendations
+MODEL_HEADER = "X-Reco-Model"
+
+T = TypeVar("T")
 
 
 class RecoResponse(BaseModel):
@@ -14,9 +36,186 @@ class RecoResponse(BaseModel):
     items: List[int]
 
 
+class SimilarResponse(BaseModel):
+    item_id: int
+    items: List[int]
+
+
+class BatchRecoRequest(BaseModel):
+    user_ids: List[int]
+
+
+class BatchRecoResponse(BaseModel):
+    recos: List[RecoResponse]
+    errors: List[Error]
+
+
 router = APIRouter()
 
 
+def is_valid_user_id(user_id: int) -> bool:
+    """Ids out of this range are unknown, and may not even fit int64."""
+    return 0 <= user_id <= MAX_USER_ID
+
+
+def is_valid_item_id(item_id: int) -> bool:
+    """Ids out of this range are unknown, and may not even fit int64."""
+    return 0 <= item_id <= MAX_ITEM_ID
+
+
+async def score_one(score: Scorer, user_id: int, k_recs: int) -> np.ndarray:
+    reco = (await score(np.array([user_id], dtype=np.int64), k_recs))[0]
+    if reco is None:
+        raise UserNotFoundError(error_message=f"User {user_id} not found")
+    return reco
+
+
+async def within_budget(
+    request: Request,
+    model_name: str,
+    call: Awaitable[T],
+    fallback: Callable[[RecoModel], T],
+) -> Tuple[T, str]:
+    """
+    Result of ``call`` and the name of the model, or, if the model misses
+    its latency budget, ``fallback`` called with the fallback model and
+    its name. The late call keeps its executor thread until it returns,
+    it can't be cancelled.
+    """
+    models = request.app.state.models
+    service_metrics = request.app.state.metrics
+    config = models.get_config(model_name)
+    if config.timeout is None:
+        return await call, model_name
+    try:
+        return await asyncio.wait_for(call, config.timeout), model_name
+    except asyncio.TimeoutError:
+        service_metrics.observe_timeout(model_name)
+        if config.fallback is None:
+            raise ModelTimeoutError(
+                error_message=f"Model {model_name} did not answer in {config.timeout} s",
+            ) from None
+        app_logger.warning("Model %s did not answer in %s s, fall back to %s", model_name, config.timeout,
+                           config.fallback)
+        started_at = time.perf_counter()
+        result = fallback(models.get(config.fallback))
+        service_metrics.observe_model(config.fallback, time.perf_counter() - started_at)
+        return result, config.fallback
+
+
+async def recommend(request: Request, model_name: str, user_id: int, k_recs: int) -> Tuple[np.ndarray, str]:
+    """
+    Recommendations and the name of the model which made them.
+
+    With a latency budget, or with ``"process": true``, the model is
+    scored off the event loop, in the app executor or the inference
+    process pool. If it misses the budget, the fallback model answers. A
+    model with micro-batching is called through its batcher, which
+    records the model metrics per batch.
+    """
+    models = request.app.state.models
+    service_metrics = request.app.state.metrics
+    config = models.get_config(model_name)
+    batcher = request.app.state.batchers.get(model_name)
+
+    started_at = time.perf_counter()
+    call: Awaitable[np.ndarray]
+    if batcher is not None:
+        call = batcher.recommend(user_id, k_recs)
+    elif config.timeout is not None or config.process:
+        call = score_one(request.app.state.scorers[model_name], user_id, k_recs)
+    else:
+        reco = models.get(model_name).recommend(user_id, k_recs)
+        service_metrics.observe_model(model_name, time.perf_counter() - started_at)
+        return reco, model_name
+
+    reco, served_by = await within_budget(
+        request, model_name, call, lambda fallback: fallback.recommend(user_id, k_recs),
+    )
+    if batcher is None and served_by == model_name:
+        service_metrics.observe_model(model_name, time.perf_counter() - started_at)
+    return reco, served_by
+
+
+async def recommend_users(request: Request, model_name: str, user_ids: np.ndarray, k_recs: int) -> Tuple[Recos, str]:
+    """
+    ``recommend`` for a batch of users, None for users the model does not
+    know. The batch is already one model call, so it skips micro-batching.
+    """
+    models = request.app.state.models
+    service_metrics = request.app.state.metrics
+    config = models.get_config(model_name)
+
+    started_at = time.perf_counter()
+    if config.timeout is None and not config.process:
+        recos = recommend_known(models.get(model_name), user_ids, k_recs)
+        service_metrics.observe_model(model_name, time.perf_counter() - started_at)
+        return recos, model_name
+
+    recos, served_by = await within_budget(
+        request,
+        model_name,
+        request.app.state.scorers[model_name](user_ids, k_recs),
+        lambda fallback: recommend_known(fallback, user_ids, k_recs),
+    )
+    if served_by == model_name:
+        service_metrics.observe_model(model_name, time.perf_counter() - started_at)
+    return recos, served_by
+
+
+def n_candidates(request: Request, model_name: str, k_recs: int) -> int:
+    """Number of items the model's reranker picks ``k_recs`` of."""
+    reranker = request.app.state.rerankers.get(model_name)
+    return k_recs if reranker is None else reranker.candidates(k_recs)
+
+
+def n_overfetch(request: Request, seen: Optional[np.ndarray]) -> int:
+    """Extra items to ask for to make up for the seen ones dropped."""
+    return 0 if seen is None else min(len(seen), request.app.state.seen_config.max_overfetch)
+
+
+def drop_seen(request: Request, user_id: int, reco: np.ndarray, seen: np.ndarray, n_items: int) -> np.ndarray:
+    """
+    ``reco`` without the ``seen`` items, cut to ``n_items``; if fewer are
+    left, the backfill model tops them up.
+    """
+    backfill = request.app.state.seen_config.backfill
+    reco = reco[~np.isin(reco, seen)][:n_items]
+    if len(reco) == n_items or backfill is None:
+        return reco
+    try:
+        extra = request.app.state.models.get(backfill).recommend(user_id, n_items + len(seen))
+    except UserNotFoundError:
+        return reco
+    extra = extra[~np.isin(extra, seen) & ~np.isin(extra, reco)]
+    return np.concatenate([reco, extra[:n_items - len(reco)]])
+
+
+def finish_reco(
+    request: Request,
+    model_name: str,
+    user_id: int,
+    reco: np.ndarray,
+    seen: Optional[np.ndarray],
+    k_recs: int,
+) -> np.ndarray:
+    """
+    Post-processing of the items the model scored, the same for single
+    and batch requests: items the user has seen are dropped, then the
+    reranker picks ``k_recs`` of the rest.
+    """
+    timings = get_timings(request)
+    n_items = n_candidates(request, model_name, k_recs)
+    if seen is not None:
+        reco = drop_seen(request, user_id, reco, seen, n_items)
+        timings.mark("filter")
+    reranker = request.app.state.rerankers.get(model_name)
+    if reranker is not None:
+        reco = reranker.rerank(reco, k_recs)
+        timings.mark("rerank")
+    return reco
+
+
 @router.get(
     path="/health",
     tags=["Health"],
@@ -25,12 +224,39 @@ async def health() -> str:
     return "I am alive"
 
 
+@router.get(
+    path="/ready",
+    tags=["Health"],
+    responses={
+        "503": {"model": Error, "description": "Models are not loaded or warmed up yet"},
+    },
+)
+async def ready(request: Request) -> Response:
+    if not request.app.state.ready:
+        raise NotReadyError()
+    return DataclassJSONResponse({"ready": True, "startup_seconds": request.app.state.startup_seconds})
+
+
+@router.get(
+    path="/metrics",
+    tags=["Health"],
+    response_class=PlainTextResponse,
+)
+async def metrics(request: Request) -> PlainTextResponse:
+    return PlainTextResponse(
+        request.app.state.metrics.render(),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
 @router.get(
     path="/reco/{model_name}/{user_id}",
     tags=["Recommendations"],
     response_model=RecoResponse,
     responses={
         "404": {"model": Error, "description": "Model or user not found"},
+        "503": {"model": Error, "description": "Model artifacts are not published yet"},
+        "504": {"model": Error, "description": "Model missed its latency budget and has no fallback"},
         "200": {"description": "Successful Response"}
     }
 )
@@ -38,22 +264,149 @@ async def get_reco(
     request: Request,
     model_name: str,
     user_id: int,
-) -> RecoResponse:
-    app_logger.info(f"Request for model: {model_name}, user_id: {user_id}")
+) -> Response:
+    timings = get_timings(request)
+    timings.mark(MIDDLEWARE_STAGE)
+    app_logger.debug("Request for model: %s, user_id: %s", model_name, user_id)
 
-    # Write your code here
-
-    if user_id > 10**9:
+    if not is_valid_user_id(user_id):
         raise UserNotFoundError(error_message=f"User {user_id} not found")
 
-    if model_name == "top":
-        reco = list(range(10))
-    elif model_name == "random":
-        reco = [random.randint(10, 1000) for _ in range(10)]
-    else:
-        raise ModelNotFoundError(error_message=f"Model {model_name} not found")
+    models = request.app.state.models
+    k_recs = request.app.state.k_recs
+
+    config = models.get_config(model_name)
+    seen_index = request.app.state.seen_index if config.filter_seen else None
+    # seen items change all the time, so their filtering is never cached
+    cache = request.app.state.response_cache if config.cache and seen_index is None else None
+    cache_key = (model_name, models.version(model_name), user_id, k_recs)
+    timings.mark("lookup")
+    if cache is not None:
+        body = cache.get(cache_key)
+        request.app.state.metrics.observe_cache(model_name, body is not None)
+        timings.mark("cache")
+        if body is not None:
+            return Response(body, media_type=JSON_MEDIA_TYPE, headers={MODEL_HEADER: model_name})
+
+    seen = seen_index.items(user_id) if seen_index is not None else None
+    n_items = n_candidates(request, model_name, k_recs) + n_overfetch(request, seen)
+    reco, served_by = await recommend(request, model_name, user_id, n_items)
+    timings.mark("score")
+    items = finish_reco(request, model_name, user_id, reco, seen, k_recs)
+    body = render_json(render_reco(user_id, items))
+    timings.mark("serialize")
+    # fallback answers are not cached, the model may be fast again soon
+    if cache is not None and served_by == model_name:
+        cache.put(cache_key, body)
+    shadow = request.app.state.shadows.get(model_name)
+    # the shadow only queues the request, it is scored once we return;
+    # it gets the raw scored items, as the candidate is not post-processed
+    if shadow is not None and served_by == model_name:
+        shadow.submit(user_id, reco)
+    return Response(body, media_type=JSON_MEDIA_TYPE, headers={MODEL_HEADER: served_by})
+
+
+@router.post(
+    path="/reco/{model_name}/batch",
+    tags=["Recommendations"],
+    response_model=BatchRecoResponse,
+    responses={
+        "404": {"model": Error, "description": "Model not found"},
+        "503": {"model": Error, "description": "Model artifacts are not published yet"},
+        "422": {"model": Error, "description": "Too many users in batch"},
+        "200": {"description": "Successful Response, unknown users are listed in errors"},
+    },
+)
+async def get_reco_batch(
+    request: Request,
+    model_name: str,
+    body: BatchRecoRequest,
+) -> Response:
+    timings = get_timings(request)
+    timings.mark(MIDDLEWARE_STAGE)
+    app_logger.debug("Batch request for model: %s, users: %s", model_name, len(body.user_ids))
+
+    max_batch_size = request.app.state.max_batch_size
+    if len(body.user_ids) > max_batch_size:
+        raise BatchTooLargeError(
+            error_message=f"Batch size {len(body.user_ids)} exceeds {max_batch_size}",
+            error_loc=["body", "user_ids"],
+        )
+
+    k_recs = request.app.state.k_recs
+    config = request.app.state.models.get_config(model_name)
+    seen_index = request.app.state.seen_index if config.filter_seen else None
+    # ids out of range are checked before they become an int64 array
+    positions = [position for position, user_id in enumerate(body.user_ids) if is_valid_user_id(user_id)]
+    user_ids = [body.user_ids[position] for position in positions]
+    seen = [seen_index.items(user_id) if seen_index is not None else None for user_id in user_ids]
+    # one model call for all users, so with the largest overfetch
+    n_extra = max((n_overfetch(request, items) for items in seen), default=0)
+    n_items = n_candidates(request, model_name, k_recs) + n_extra
+    timings.mark("lookup")
+    recos, served_by = await recommend_users(request, model_name, np.array(user_ids, dtype=np.int64), n_items)
+    timings.mark("score")
+
+    # the users the model does not know are reported below
+    scored = {
+        position: finish_reco(request, model_name, user_id, reco, user_seen, k_recs)
+        for position, user_id, reco, user_seen in zip(positions, user_ids, recos, seen)
+        if reco is not None
+    }
+    errors = [
+        Error(
+            error_key="user_not_found",
+            error_message=f"User {user_id} not found",
+            error_loc=["body", "user_ids", position],
+        )
+        for position, user_id in enumerate(body.user_ids)
+        if position not in scored
+    ]
+    response = DataclassJSONResponse(
+        {
+            "recos": [render_reco(body.user_ids[position], items) for position, items in scored.items()],
+            "errors": errors,
+        },
+        headers={MODEL_HEADER: served_by},
+    )
+    timings.mark("serialize")
+    return response
+
+
+@router.get(
+    path="/similar/{model_name}/{item_id}",
+    tags=["Recommendations"],
+    response_model=SimilarResponse,
+    responses={
+        "404": {"model": Error, "description": "Model or item not found, or model has no similar items"},
+        "503": {"model": Error, "description": "Model artifacts are not published yet"},
+        "200": {"description": "Successful Response"},
+    },
+)
+async def get_similar(
+    request: Request,
+    model_name: str,
+    item_id: int,
+) -> Response:
+    timings = get_timings(request)
+    timings.mark(MIDDLEWARE_STAGE)
+    app_logger.debug("Similar items request for model: %s, item_id: %s", model_name, item_id)
+
+    if not is_valid_item_id(item_id):
+        raise ItemNotFoundError(error_message=f"Item {item_id} not found")
 
-    return RecoResponse(user_id=user_id, items=reco)
+    model = request.app.state.models.get(model_name)
+    timings.mark("lookup")
+    started_at = time.perf_counter()
+    try:
+        items = model.similar_items(item_id, request.app.state.k_recs)
+    except NotImplementedError:
+        raise ModelNotFoundError(error_message=f"Model {model_name} has no similar items") from None
+    request.app.state.metrics.observe_model(model_name, time.perf_counter() - started_at)
+    timings.mark("score")
+    body = render_json({"item_id": item_id, "items": items})
+    timings.mark("serialize")
+    return Response(body, media_type=JSON_MEDIA_TYPE)
 
 
 def add_views(app: FastAPI) -> None:
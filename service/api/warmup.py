@@ -0,0 +1,102 @@
+import asyncio
+import mmap
+import time
+import typing as tp
+
+import numpy as np
+from fastapi import FastAPI
+
+from service.api.exceptions import ModelNotPublishedError
+from service.log import app_logger
+from service.settings import WarmupConfig
+
+from .asgi import call
+
+WARMUP_HEADERS = [(b"user-agent", b"warmup")]
+
+
+def iter_arrays(obj: tp.Any, depth: int = 3) -> tp.Iterator[np.ndarray]:
+    """Numpy arrays in attributes of ``obj`` and of objects it holds."""
+    seen: tp.Set[int] = set()
+    stack = [(obj, depth)]
+    while stack:
+        obj, depth = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, np.ndarray):
+            yield obj
+        elif depth > 0 and hasattr(obj, "__dict__"):
+            stack.extend((value, depth - 1) for value in vars(obj).values())
+
+
+def touch_pages(array: np.ndarray) -> int:
+    """
+    Read a byte of every page, so mapped files are in memory, and return
+    the number of pages read.
+    """
+    if not array.flags.c_contiguous or array.size == 0:
+        return 0
+    pages = array.reshape(-1).view(np.uint8)[::mmap.PAGESIZE]
+    pages.sum()
+    return len(pages)
+
+
+def load_models(app: FastAPI, touch: bool) -> None:
+    models = app.state.models
+    for name in models.model_names:
+        if models.get_config(name).process:
+            # loaded by the inference pool only
+            continue
+        try:
+            model = models.get(name)
+        except ModelNotPublishedError:
+            # artifacts are not published yet, the model answers 503
+            continue
+        if touch:
+            for array in iter_arrays(model):
+                touch_pages(array)
+
+
+async def warm_up(app: FastAPI, config: WarmupConfig) -> None:
+    """
+    Load lazy models, read their mapped pages and send warm-up requests,
+    then mark the app ready. Requests go through the whole app, the same
+    path as real ones, so they also fill the response cache and count in
+    metrics. If models fail to load, the app never gets ready; models
+    without artifacts are skipped.
+    """
+    started_at = time.perf_counter()
+    if config.enabled:
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(app.state.executor, load_models, app, config.touch_pages)
+        except Exception:  # pylint: disable=broad-except
+            app_logger.exception("Failed to load models, the service stays not ready")
+            return
+        names = app.state.models.model_names if config.models is None else config.models
+        for name in names:
+            for user_id in config.user_ids:
+                status_code = await call(app, "GET", f"/reco/{name}/{user_id}", headers=WARMUP_HEADERS)
+                if status_code >= 500:
+                    app_logger.warning("Warm-up request to model %s failed with %s", name, status_code)
+    app.state.ready = True
+    app.state.startup_seconds = time.perf_counter() - app.state.created_at
+    app_logger.info(
+        "Ready in %.2f s, warm-up took %.2f s",
+        app.state.startup_seconds,
+        time.perf_counter() - started_at,
+    )
+
+
+def add_warmup(app: FastAPI, config: WarmupConfig) -> None:
+    app.state.ready = False
+
+    async def start() -> None:
+        app.state.warmup_task = asyncio.create_task(warm_up(app, config))
+
+    async def stop() -> None:
+        app.state.warmup_task.cancel()
+
+    app.add_event_handler("startup", start)
+    app.add_event_handler("shutdown", stop)
@@ -1,4 +1,9 @@
+import atexit
 import logging.config
+import logging.handlers
+import os
+import queue
+import random
 import typing as tp
 
 from .settings import ServiceConfig
@@ -19,9 +24,76 @@ class ServiceNameFilter(logging.Filter):
         return super().filter(record)
 
 
+class AccessSampleFilter(logging.Filter):
+    """
+    Passes a ``sample_rate`` share of successful access records, but every
+    error and every request slower than ``slow_request_time`` seconds.
+    """
+
+    def __init__(self, name: str = "", sample_rate: float = 1.0, slow_request_time: float = 0.5) -> None:
+        self.sample_rate = sample_rate
+        self.slow_request_time = slow_request_time
+
+        super().__init__(name)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.sample_rate >= 1:
+            return True
+        if getattr(record, "status_code", 500) >= 400:
+            return True
+        if getattr(record, "request_time", 0) >= self.slow_request_time:
+            return True
+        return random.random() < self.sample_rate
+
+
+class QueueLogging:
+    """
+    Moves handlers of loggers behind queues, so logging a record costs the
+    caller a ``put`` and the handlers write it from a listener thread.
+    """
+
+    def __init__(self) -> None:
+        self._handlers: tp.List[tp.Tuple[logging.handlers.QueueHandler, logging.Handler]] = []
+        self._listeners: tp.List[logging.handlers.QueueListener] = []
+
+    def install(self, loggers: tp.Iterable[logging.Logger]) -> None:
+        self.stop()
+        queue_handlers: tp.Dict[logging.Handler, logging.handlers.QueueHandler] = {}
+        for logger in loggers:
+            for i, handler in enumerate(logger.handlers):
+                if handler not in queue_handlers:
+                    queue_handlers[handler] = logging.handlers.QueueHandler(queue.SimpleQueue())
+                logger.handlers[i] = queue_handlers[handler]
+        self._handlers = [(queue_handler, handler) for handler, queue_handler in queue_handlers.items()]
+        self.start()
+
+    def start(self) -> None:
+        self._listeners = []
+        for queue_handler, handler in self._handlers:
+            # a fresh queue, the old one may be locked by a thread lost in fork
+            queue_handler.queue = queue.SimpleQueue()
+            listener = logging.handlers.QueueListener(queue_handler.queue, handler, respect_handler_level=True)
+            listener.start()
+            self._listeners.append(listener)
+
+    def stop(self) -> None:
+        """Stop listeners after they wrote all queued records."""
+        for listener in self._listeners:
+            listener.stop()
+        self._listeners = []
+
+
+queue_logging = QueueLogging()
+atexit.register(queue_logging.stop)
+# listener threads do not survive fork, e.g. gunicorn with preload_app
+os.register_at_fork(after_in_child=queue_logging.start)
+
+
 def get_config(service_config: ServiceConfig) -> tp.Dict[str, tp.Any]:
     level = service_config.log_config.level
     datetime_format = service_config.log_config.datetime_format
+    access_sample_rate = service_config.log_config.access_sample_rate
+    slow_request_time = service_config.log_config.slow_request_time
 
     config = {
         "version": 1,
@@ -40,6 +112,7 @@ def get_config(service_config: ServiceConfig) -> tp.Dict[str, tp.Any]:
             access_logger.name: {
                 "level": level,
                 "handlers": ["access"],
+                "filters": ["access_sample"],
                 "propagate": False,
             },
             "gunicorn.error": {
@@ -133,6 +206,11 @@ def get_config(service_config: ServiceConfig) -> tp.Dict[str, tp.Any]:
                 "()": "service.log.ServiceNameFilter",
                 "service_name": service_config.service_name,
             },
+            "access_sample": {
+                "()": "service.log.AccessSampleFilter",
+                "sample_rate": access_sample_rate,
+                "slow_request_time": slow_request_time,
+            },
         },
     }
 
@@ -141,4 +219,8 @@ def get_config(service_config: ServiceConfig) -> tp.Dict[str, tp.Any]:
 
 def setup_logging(service_config: ServiceConfig) -> None:
     config = get_config(service_config)
+    # dictConfig closes the handlers the listeners write to
+    queue_logging.stop()
     logging.config.dictConfig(config)
+    if service_config.log_config.queue:
+        queue_logging.install(logging.getLogger(name) for name in config["loggers"])
@@ -0,0 +1,252 @@
+import argparse
+import time
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+
+from service.api.exceptions import UserNotFoundError
+
+from .csr import load_array
+from .models import RecoModel
+from .scoring import FactorModel, top_k
+
+ANN_DIR = "ann"
+CENTROIDS_FILE = "centroids.npy"
+CODEBOOKS_FILE = "codebooks.npy"
+CODES_FILE = "codes.npy"
+LIST_INDPTR_FILE = "list_indptr.npy"
+LIST_ITEMS_FILE = "list_items.npy"
+
+KMEANS_MAX_TRAIN = 65536
+
+
+def assign(x: np.ndarray, centroids: np.ndarray, chunk_size: int = 8192) -> np.ndarray:
+    """Index of the nearest (L2) centroid of every row of ``x``."""
+    half_norms = (centroids**2).sum(axis=1) / 2
+    labels = np.empty(len(x), dtype=np.int64)
+    for start in range(0, len(x), chunk_size):
+        chunk = x[start:][:chunk_size]
+        labels[start:][:chunk_size] = np.argmax(chunk @ centroids.T - half_norms, axis=1)
+    return labels
+
+
+def kmeans(x: np.ndarray, n_clusters: int, n_iter: int = 20, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    if len(x) > KMEANS_MAX_TRAIN:
+        x = x[rng.choice(len(x), KMEANS_MAX_TRAIN, replace=False)]
+    centroids = x[rng.choice(len(x), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        labels = assign(x, centroids)
+        counts = np.bincount(labels, minlength=n_clusters)
+        sums = np.stack([np.bincount(labels, weights=x[:, j], minlength=n_clusters) for j in range(x.shape[1])], 1)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        # restart empty clusters from random points
+        centroids[empty] = x[rng.choice(len(x), int(empty.sum()), replace=False)]
+    return centroids
+
+
+class IVFPQIndex:
+    """
+    Inverted file index with product quantization for maximum inner
+    product search.
+
+    Items are clustered into ``n_lists`` lists by a coarse quantizer and the
+    residual to the list centroid is compressed into ``n_subspaces`` one
+    byte codes. Since ``q.x = q.c + sum_j q_j.r_j``, a query computes one
+    ``(n_subspaces, 256)`` lookup table and scores every item of the
+    ``nprobe`` best lists with table lookups only. ``nprobe`` trades recall
+    for latency.
+    """
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        codebooks: np.ndarray,
+        codes: np.ndarray,
+        list_indptr: np.ndarray,
+        list_items: np.ndarray,
+    ) -> None:
+        self.centroids = centroids
+        self.codebooks = codebooks
+        self.codes = codes
+        self.list_indptr = list_indptr
+        self.list_items = list_items
+        # codes shifted by subspace, so the lookup is one gather in a flat LUT
+        self._code_offsets = np.arange(codebooks.shape[0]) * codebooks.shape[1]
+
+    @property
+    def n_subspaces(self) -> int:
+        return self.codebooks.shape[0]
+
+    @property
+    def padded_dim(self) -> int:
+        return self.codebooks.shape[0] * self.codebooks.shape[2]
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        n_lists: int = 256,
+        n_subspaces: int = 16,
+        n_iter: int = 20,
+        seed: int = 0,
+    ) -> "IVFPQIndex":
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n_lists = min(n_lists, len(vectors))
+        centroids = kmeans(vectors, n_lists, n_iter, seed)
+        labels = assign(vectors, centroids)
+
+        dim = vectors.shape[1]
+        sub_dim = -(-dim // n_subspaces)
+        residuals = np.zeros((len(vectors), n_subspaces * sub_dim), dtype=np.float32)
+        residuals[:, :dim] = vectors - centroids[labels]
+
+        n_codes = min(256, len(vectors))
+        codebooks = np.zeros((n_subspaces, n_codes, sub_dim), dtype=np.float32)
+        codes = np.empty((len(vectors), n_subspaces), dtype=np.uint8)
+        for j in range(n_subspaces):
+            sub = residuals[:, j * sub_dim:(j + 1) * sub_dim]
+            codebooks[j] = kmeans(sub, n_codes, n_iter, seed + j + 1)
+            codes[:, j] = assign(sub, codebooks[j])
+
+        order = np.argsort(labels, kind="stable")
+        list_indptr = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=n_lists), out=list_indptr[1:])
+        return cls(centroids, codebooks, codes[order], list_indptr, order)
+
+    @classmethod
+    def load(cls, path: Path) -> "IVFPQIndex":
+        return cls(
+            load_array(path / CENTROIDS_FILE),
+            load_array(path / CODEBOOKS_FILE),
+            load_array(path / CODES_FILE),
+            load_array(path / LIST_INDPTR_FILE),
+            load_array(path / LIST_ITEMS_FILE),
+        )
+
+    def save(self, path: Path) -> None:
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / CENTROIDS_FILE, self.centroids)
+        np.save(path / CODEBOOKS_FILE, self.codebooks)
+        np.save(path / CODES_FILE, self.codes)
+        np.save(path / LIST_INDPTR_FILE, self.list_indptr)
+        np.save(path / LIST_ITEMS_FILE, self.list_items)
+
+    def search(self, query: np.ndarray, n_candidates: int, nprobe: int) -> np.ndarray:
+        """Items with the largest approximate inner product, best first."""
+        coarse = self.centroids @ query
+        lists = top_k(coarse, nprobe)
+        starts = self.list_indptr[lists]
+        lengths = self.list_indptr[lists + 1] - starts
+        offsets = np.cumsum(lengths)
+        positions = np.arange(offsets[-1]) + np.repeat(starts - offsets + lengths, lengths)
+
+        padded = np.zeros(self.padded_dim, dtype=np.float32)
+        padded[:len(query)] = query
+        lut = (self.codebooks @ padded.reshape((self.n_subspaces, -1, 1))).ravel()
+        scores = lut[self.codes[positions] + self._code_offsets].sum(axis=1)
+        scores += np.repeat(coarse[lists], lengths)
+        return self.list_items[positions[top_k(scores, n_candidates)]]
+
+
+class ANNModel(RecoModel):
+    """
+    ``FactorModel`` which scores only candidates found by ``IVFPQIndex``.
+
+    The best ``rerank`` candidates by approximate score are rescored
+    exactly, seen items are dropped from them. Item biases are folded into
+    the index as an extra dimension with the query extended by 1.
+    """
+
+    def __init__(self, factors: FactorModel, index: IVFPQIndex, nprobe: int = 16, rerank: int = 200) -> None:
+        self.factors = factors
+        self.index = index
+        self.nprobe = nprobe
+        self.rerank = rerank
+
+    @staticmethod
+    def index_vectors(factors: FactorModel) -> np.ndarray:
+        if factors.item_biases is None:
+            return factors.item_factors
+        return np.hstack([factors.item_factors, factors.item_biases[:, None]])
+
+    @classmethod
+    def load(cls, path: tp.Optional[Path], nprobe: int = 16, rerank: int = 200) -> "ANNModel":
+        factors = FactorModel.load(path)
+        return cls(factors, IVFPQIndex.load(path / ANN_DIR), nprobe, rerank)
+
+    def known_users(self, user_ids: np.ndarray) -> np.ndarray:
+        return self.factors.known_users(user_ids)
+
+    def recommend(self, user_id: int, k: int) -> np.ndarray:
+        factors = self.factors
+        if not 0 <= user_id < len(factors.user_factors):
+            raise UserNotFoundError(error_message=f"User {user_id} not found")
+        query = factors.user_factors[user_id]
+        if factors.item_biases is not None:
+            query = np.append(query, np.float32(1))
+
+        seen = factors.seen.row(user_id) if factors.seen is not None else np.empty(0, dtype=np.int64)
+        candidates = self.index.search(query, max(self.rerank, k + len(seen)), self.nprobe)
+        if len(seen):
+            candidates = candidates[~np.isin(candidates, seen)]
+        scores = factors.item_factors[candidates] @ factors.user_factors[user_id]
+        if factors.item_biases is not None:
+            scores += factors.item_biases[candidates]
+        return candidates[top_k(scores, k)]
+
+
+def recall_at_k(exact: tp.Sequence[np.ndarray], approx: tp.Sequence[np.ndarray], k: int) -> float:
+    hits = [len(np.intersect1d(e[:k], a[:k])) / max(min(k, len(e)), 1) for e, a in zip(exact, approx)]
+    return float(np.mean(hits))
+
+
+def evaluate(
+    model: ANNModel,
+    user_ids: np.ndarray,
+    k: int,
+    nprobes: tp.Sequence[int],
+) -> tp.List[tp.Dict[str, float]]:
+    """Recall@k against brute force and mean latency for every nprobe."""
+    exact = model.factors.recommend_batch(user_ids, k)
+    report = []
+    for nprobe in nprobes:
+        model.nprobe = nprobe
+        started_at = time.perf_counter()
+        approx = [model.recommend(user_id, k) for user_id in user_ids.tolist()]
+        latency = (time.perf_counter() - started_at) / len(user_ids)
+        report.append({"nprobe": nprobe, "recall": recall_at_k(exact, approx, k), "latency_ms": latency * 1e3})
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build IVF-PQ index for a factor model and report recall@k")
+    parser.add_argument("path", type=Path, help="factor model directory, the index is saved to its ann/")
+    parser.add_argument("--lists", type=int, default=256)
+    parser.add_argument("--subspaces", type=int, default=16)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--rerank", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--users", type=int, default=1000, help="users sampled to measure recall")
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    factors = FactorModel.load(args.path)
+    started_at = time.perf_counter()
+    index = IVFPQIndex.build(ANNModel.index_vectors(factors), args.lists, args.subspaces, args.iterations)
+    index.save(args.path / ANN_DIR)
+    print(f"built in {time.perf_counter() - started_at:.1f} s: {args.path / ANN_DIR}")
+
+    rng = np.random.default_rng(0)
+    n_users = len(factors.user_factors)
+    user_ids = rng.choice(n_users, min(args.users, n_users), replace=False)
+    model = ANNModel(factors, index, rerank=args.rerank)
+    print(f"{'nprobe':>8} {f'recall@{args.k}':>10} {'latency, ms':>12}")
+    for row in evaluate(model, user_ids, args.k, args.nprobe):
+        print(f"{row['nprobe']:>8} {row['recall']:>10.4f} {row['latency_ms']:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import tempfile
+import time
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+
+from .csr import CSRArray
+from .interactions import ITEM_COLUMN, USER_COLUMN, read_interactions
+from .mapping import ITEM_IDS_DIR, USER_IDS_DIR, IdMap, extend_map
+from .seen import SeenIndex, merge_pairs
+
+# A bundle version is a directory of a precomputed model with id maps:
+# indptr.npy and indices.npy of recommendations (rows and items are
+# internal indices), user_ids/, item_ids/, seen/ (the SeenIndex base for
+# SEEN_PATH: rows are the same internal user indices, items are external
+# ids, with a copy of user_ids/) and manifest.json with the size and
+# checksums of every file. Versions live next to CURRENT, like all
+# versioned artifacts, see ``service.reco.registry``.
+MANIFEST_FILE = "manifest.json"
+SEEN_DIR = "seen"
+VERSION_FILE = "CURRENT"
+RANK_COLUMN = "rank"
+
+HASH_BLOCK = 2**20
+SAMPLE_BLOCK = 2**12
+N_SAMPLES = 8
+
+
+class BundleError(ValueError):
+    pass
+
+
+def file_checksum(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def sample_checksum(path: Path) -> str:
+    """Checksum of a few blocks spread over the file, reads ~36 KiB."""
+    size = path.stat().st_size
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, "rb") as file:
+        for offset in np.linspace(0, max(size - SAMPLE_BLOCK, 0), N_SAMPLES + 1).astype(np.int64).tolist():
+            file.seek(offset)
+            digest.update(file.read(SAMPLE_BLOCK))
+    return digest.hexdigest()
+
+
+def write_manifest(path: Path, **fields: tp.Any) -> tp.Dict[str, tp.Any]:
+    files = {}
+    for file in sorted(path.rglob("*")):
+        if file.is_file() and file.name != MANIFEST_FILE:
+            files[file.relative_to(path).as_posix()] = {
+                "size": file.stat().st_size,
+                "sha256": file_checksum(file),
+                "sample_sha256": sample_checksum(file),
+            }
+    manifest = {**fields, "files": files}
+    (path / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def verify_bundle(path: Path, full: bool = False) -> tp.Dict[str, tp.Any]:
+    """
+    Check the files of a bundle version against its manifest. By default
+    only sizes and sampled blocks are compared, so a truncated or
+    half-copied bundle is caught without reading it all; ``full`` hashes
+    every byte.
+    """
+    manifest = json.loads((path / MANIFEST_FILE).read_text())
+    for name, expected in manifest["files"].items():
+        file = path / name
+        if not file.is_file() or file.stat().st_size != expected["size"]:
+            raise BundleError(f"Bundle {path}: {name} is missing or has a wrong size")
+        checksum, key = (file_checksum(file), "sha256") if full else (sample_checksum(file), "sample_sha256")
+        if checksum != expected[key]:
+            raise BundleError(f"Bundle {path}: {name} checksum mismatch")
+    return manifest
+
+
+def read_recos(path: tp.Union[str, Path]) -> tp.Tuple[np.ndarray, np.ndarray]:
+    """
+    User and item ids of a model output with ``user_id``, ``item_id`` and
+    optional ``rank`` columns (``model.recommend`` of rectools), sorted by
+    user and rank.
+    """
+    with open(path, newline="", encoding="utf-8") as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        columns = list(zip(*reader)) or [()] * len(header)
+    user_ids = np.array(columns[header.index(USER_COLUMN)], dtype=np.int64)
+    item_ids = np.array(columns[header.index(ITEM_COLUMN)], dtype=np.int64)
+    if RANK_COLUMN in header:
+        order = np.lexsort((np.array(columns[header.index(RANK_COLUMN)], dtype=np.float64), user_ids))
+    else:
+        order = np.argsort(user_ids, kind="stable")
+    return user_ids[order], item_ids[order]
+
+
+def read_pairs(path: Path) -> tp.Tuple[np.ndarray, np.ndarray]:
+    """User and item ids of all interactions in ``path``."""
+    chunks = list(read_interactions(path))
+    empty = np.empty(0, dtype=np.int64)
+    return (
+        np.concatenate([empty] + [chunk.user_ids for chunk in chunks]),
+        np.concatenate([empty] + [chunk.item_ids for chunk in chunks]),
+    )
+
+
+def replace_rows(base: CSRArray, rows: np.ndarray, values: np.ndarray, lengths: np.ndarray, n_rows: int) -> CSRArray:
+    """
+    ``base`` grown to ``n_rows`` with ``rows`` replaced by consecutive
+    pieces of ``values`` of ``lengths``.
+    """
+    old_lengths = np.zeros(n_rows, dtype=np.int64)
+    old_lengths[:len(base)] = np.diff(base.indptr)
+    new_lengths = old_lengths.copy()
+    new_lengths[rows] = lengths
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(new_lengths, out=indptr[1:])
+    indices = np.empty(indptr[-1], dtype=np.int64)
+
+    def scatter(targets: np.ndarray, target_values: np.ndarray, target_lengths: np.ndarray) -> None:
+        starts = np.repeat(indptr[targets] - np.cumsum(target_lengths) + target_lengths, target_lengths)
+        indices[starts + np.arange(len(target_values))] = target_values
+
+    kept = np.ones(n_rows, dtype=bool)
+    kept[rows] = False
+    kept_rows = np.flatnonzero(kept[:len(base)])
+    kept_values, kept_lengths = base.gather(kept_rows)
+    scatter(kept_rows, kept_values, kept_lengths)
+    scatter(rows, values, lengths)
+    return CSRArray(indptr, indices)
+
+
+def build_bundle(
+    output: Path,
+    interactions_path: Path,
+    recos_path: Path,
+    version: str,
+    base: tp.Optional[str] = None,
+) -> tp.Dict[str, tp.Any]:
+    """
+    Build bundle ``version`` in ``output`` and publish it in CURRENT.
+
+    With ``base`` it is a delta build: ``interactions_path`` holds only
+    new interactions and ``recos_path`` recommendations of re-scored users;
+    id maps, seen items and recommendation rows of those users are
+    patched in a copy of the base version, other rows are kept.
+    """
+    seen_users, seen_items = read_pairs(interactions_path)
+    reco_users, reco_items = read_recos(recos_path)
+
+    empty = CSRArray(np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int64))
+    users: tp.Optional[IdMap] = None
+    items: tp.Optional[IdMap] = None
+    recos, seen = empty, empty
+    if base is not None:
+        base_path = output / base
+        verify_bundle(base_path)
+        users, items = IdMap.load(base_path / USER_IDS_DIR), IdMap.load(base_path / ITEM_IDS_DIR)
+        recos, seen = CSRArray.load(base_path), CSRArray.load(base_path / SEEN_DIR)
+    users = extend_map(users, np.concatenate([seen_users, reco_users]))
+    items = extend_map(items, np.concatenate([seen_items, reco_items]))
+
+    user_indices, _ = users.to_internal(reco_users)
+    # new users got appended indices, so re-sort keeping the rank order
+    order = np.argsort(user_indices, kind="stable")
+    user_indices, item_indices = user_indices[order], items.to_internal(reco_items[order])[0]
+    rows, lengths = np.unique(user_indices, return_counts=True)
+    recos = replace_rows(recos, rows, item_indices, lengths, len(users))
+    seen = merge_pairs(seen, users.to_internal(seen_users)[0], seen_items)
+
+    output.mkdir(parents=True, exist_ok=True)
+    tmp_path = Path(tempfile.mkdtemp(prefix=f".{version}.", dir=output))
+    recos.save(tmp_path)
+    SeenIndex(seen, users).save(tmp_path / SEEN_DIR)
+    users.save(tmp_path / USER_IDS_DIR)
+    items.save(tmp_path / ITEM_IDS_DIR)
+    manifest = write_manifest(
+        tmp_path,
+        version=version,
+        base=base,
+        created_at=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        n_users=len(users),
+        n_items=len(items),
+        rescored_users=len(rows),
+    )
+    tmp_path.rename(output / version)
+    (output / f"{VERSION_FILE}.tmp").write_text(version)
+    os.replace(output / f"{VERSION_FILE}.tmp", output / VERSION_FILE)
+    return manifest
+
+
+def changed_users(interactions_path: Path) -> np.ndarray:
+    """Users with new interactions, the ones to re-score for a delta build."""
+    return np.unique(read_pairs(interactions_path)[0])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build and verify artifact bundles of precomputed models")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="full build or, with --base, delta build of a bundle version")
+    build.add_argument("output", type=Path, help="bundle directory, the model path in the service config")
+    build.add_argument("--interactions", type=Path, required=True, help="interactions.csv, only new ones with --base")
+    build.add_argument("--recos", type=Path, required=True, help="CSV with user_id, item_id and optional rank")
+    build.add_argument("--version", default=time.strftime("%Y%m%d%H%M%S"))
+    build.add_argument("--base", help="version to patch, CURRENT if 'current'")
+    users = commands.add_parser("changed-users", help="print users with new interactions to re-score")
+    users.add_argument("interactions", type=Path)
+    verify = commands.add_parser("verify", help="check every byte of a bundle version against its manifest")
+    verify.add_argument("path", type=Path, help="bundle version directory")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        base = args.base
+        if base == "current":
+            base = (args.output / VERSION_FILE).read_text().strip()
+        manifest = build_bundle(args.output, args.interactions, args.recos, args.version, base)
+        print(
+            f"Version {manifest['version']}: {manifest['n_users']} users, {manifest['n_items']} items, "
+            f"{manifest['rescored_users']} users scored"
+        )
+    elif args.command == "changed-users":
+        print("\n".join(map(str, changed_users(args.interactions).tolist())))
+    else:
+        verify_bundle(args.path, full=True)
+        print(f"{args.path} is intact")
+
+
+if __name__ == "__main__":
+    main()
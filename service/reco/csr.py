@@ -0,0 +1,84 @@
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+
+INDPTR_FILE = "indptr.npy"
+INDICES_FILE = "indices.npy"
+
+
+def load_array(path: tp.Union[str, Path], mmap: bool = True) -> np.ndarray:
+    if not mmap:
+        return np.load(path)
+    # np.asarray drops the np.memmap subclass, so slicing returns plain
+    # ndarray views over the mapped pages instead of memmap objects
+    return np.asarray(np.load(path, mmap_mode="r"))
+
+
+class CSRArray:
+    """
+    Ragged integer array in CSR layout: row ``i`` is
+    ``indices[indptr[i]:indptr[i + 1]]``.
+    """
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray) -> None:
+        if indptr.ndim != 1 or indices.ndim != 1:
+            raise ValueError("CSR arrays must be one-dimensional")
+        if len(indptr) == 0 or indptr[-1] != len(indices):
+            raise ValueError("indptr does not match indices")
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def from_rows(
+        cls,
+        rows: tp.Sequence[tp.Union[tp.Sequence[int], np.ndarray]],
+        dtype: tp.Any = np.int64,
+    ) -> "CSRArray":
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(row) for row in rows], out=indptr[1:])
+        indices = np.fromiter(
+            (item for row in rows for item in row),
+            dtype=dtype,
+            count=int(indptr[-1]),
+        )
+        return cls(indptr, indices)
+
+    @classmethod
+    def load(cls, path: tp.Union[str, Path], mmap: bool = True) -> "CSRArray":
+        path = Path(path)
+        return cls(load_array(path / INDPTR_FILE, mmap), load_array(path / INDICES_FILE, mmap))
+
+    def save(self, path: tp.Union[str, Path]) -> None:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / INDPTR_FILE, self.indptr)
+        np.save(path / INDICES_FILE, self.indices)
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    def row(self, i: int) -> np.ndarray:
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return self.indices[start:end]
+
+    def gather(self, rows: np.ndarray, limit: tp.Optional[int] = None) -> tp.Tuple[np.ndarray, np.ndarray]:
+        """
+        Concatenate the first ``limit`` entries of many rows with one take.
+
+        Returns the concatenated values and the length taken from each row.
+        """
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        if limit is not None:
+            lengths = np.minimum(lengths, limit)
+        offsets = np.cumsum(lengths)
+        total = offsets[-1] if len(offsets) else 0
+        positions = np.arange(total) + np.repeat(starts - offsets + lengths, lengths)
+        return self.indices[positions], lengths
+
+    def rows(self, rows: np.ndarray, limit: tp.Optional[int] = None) -> tp.List[np.ndarray]:
+        if len(rows) == 0:
+            return []
+        values, lengths = self.gather(rows, limit)
+        return np.split(values, np.cumsum(lengths)[:-1])
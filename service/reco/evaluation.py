@@ -0,0 +1,299 @@
+import argparse
+import json
+import tempfile
+import time
+import typing as tp
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from service.settings import ModelConfig, get_config
+
+from .csr import CSRArray, load_array
+from .interactions import Interactions, read_interactions
+from .popular import PopularModel, PopularityCounter
+from .registry import ModelSource
+
+TRAIN_DIR = "train"
+TRUTH_DIR = "truth"
+USERS_FILE = "users.npy"
+FOLD_DIR = "fold_{}"
+
+
+class Fold(tp.NamedTuple):
+    train: Interactions
+    # sorted test users and their test items, row i is user users[i]
+    users: np.ndarray
+    truth: CSRArray
+
+
+class TrainStats(tp.NamedTuple):
+    n_users: int
+    n_catalog: int
+    # number of distinct users of every item
+    item_users: np.ndarray
+    # dense rank by number of interactions, 1 is the most popular, 0 cold
+    popularity_ranks: np.ndarray
+
+
+def concat_interactions(chunks: tp.Iterable[Interactions]) -> Interactions:
+    return Interactions(*(np.concatenate(columns) for columns in zip(*chunks)))
+
+
+def _pair_keys(user_ids: np.ndarray, item_ids: np.ndarray, n_items: int) -> np.ndarray:
+    return user_ids.astype(np.int64) * n_items + item_ids
+
+
+def time_range_folds(interactions: Interactions, n_splits: int, test_days: int) -> tp.Iterator[Fold]:
+    """
+    Like rectools ``TimeRangeSplitter``: fold ``i`` tests on the ``i``-th of
+    the last ``n_splits`` periods of ``test_days`` and trains on everything
+    before it. Cold users and items and items already seen in train are
+    dropped from test.
+    """
+    n_items = int(interactions.item_ids.max()) + 1
+    last_day = int(interactions.days.max())
+    for i in range(n_splits):
+        test_start = last_day + 1 - (n_splits - i) * test_days
+        in_train = interactions.days < test_start
+        in_test = ~in_train & (interactions.days < test_start + test_days)
+        train = Interactions(*(column[in_train] for column in interactions))
+
+        user_ids, item_ids = interactions.user_ids[in_test], interactions.item_ids[in_test]
+        warm = np.isin(user_ids, train.user_ids) & np.isin(item_ids, train.item_ids)
+        keys = np.unique(_pair_keys(user_ids[warm], item_ids[warm], n_items))
+        keys = keys[~np.isin(keys, _pair_keys(train.user_ids, train.item_ids, n_items))]
+
+        users, counts = np.unique(keys // n_items, return_counts=True)
+        indptr = np.zeros(len(users) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        yield Fold(train, users, CSRArray(indptr, keys % n_items))
+
+
+def save_fold(fold: Fold, path: Path) -> None:
+    (path / TRAIN_DIR).mkdir(parents=True, exist_ok=True)
+    for name, column in fold.train._asdict().items():
+        np.save(path / TRAIN_DIR / f"{name}.npy", column)
+    np.save(path / USERS_FILE, fold.users)
+    fold.truth.save(path / TRUTH_DIR)
+
+
+def load_fold(path: Path) -> Fold:
+    train = Interactions(*(load_array(path / TRAIN_DIR / f"{name}.npy") for name in Interactions._fields))
+    return Fold(train, load_array(path / USERS_FILE), CSRArray.load(path / TRUTH_DIR))
+
+
+def train_stats(train: Interactions) -> TrainStats:
+    n_items = int(train.item_ids.max()) + 1
+    pairs = np.unique(_pair_keys(train.user_ids, train.item_ids, n_items))
+    counts = np.bincount(train.item_ids, minlength=n_items)
+    distinct_counts = np.unique(counts[counts > 0])
+    ranks = len(distinct_counts) - np.searchsorted(distinct_counts, counts)
+    ranks[counts == 0] = 0
+    return TrainStats(
+        n_users=len(np.unique(train.user_ids)),
+        n_catalog=int(np.count_nonzero(counts)),
+        item_users=np.bincount(pairs % n_items, minlength=n_items),
+        popularity_ranks=ranks,
+    )
+
+
+def pad_rows(rows: tp.Sequence[np.ndarray], width: int) -> np.ndarray:
+    """Rows cut or padded with -1 to ``width`` columns."""
+    lengths = np.fromiter((min(len(row), width) for row in rows), dtype=np.int64, count=len(rows))
+    padded = np.full((len(rows), width), -1, dtype=np.int64)
+    if len(rows):
+        padded[np.arange(width) < lengths[:, None]] = np.concatenate([row[:width] for row in rows])
+    return padded
+
+
+def _hits(items: np.ndarray, valid: np.ndarray, truth: CSRArray) -> np.ndarray:
+    """Which of the padded recommendations are in the user's truth row."""
+    n_items = int(max(items.max(initial=0), truth.indices.max(initial=0))) + 1
+    truth_keys = _pair_keys(np.repeat(np.arange(len(truth)), np.diff(truth.indptr)), truth.indices, n_items)
+    if len(truth_keys) == 0:
+        return np.zeros_like(valid)
+    reco_keys = _pair_keys(np.arange(len(items))[:, None], items, n_items)
+    positions = np.minimum(np.searchsorted(truth_keys, reco_keys), len(truth_keys) - 1)
+    return valid & (truth_keys[positions] == reco_keys)
+
+
+def _novelty(
+    items: np.ndarray,
+    valid: np.ndarray,
+    hits: np.ndarray,
+    stats: TrainStats,
+) -> tp.Tuple[np.ndarray, np.ndarray]:
+    """Serendipity and inverse user frequency of every recommendation."""
+    known = valid & (items < len(stats.item_users))
+    known_items = np.where(known, items, 0)
+    # cold items are treated as consumed by one user, as in rectools
+    item_users = np.where(known, stats.item_users[known_items], 1).clip(min=1)
+    popularity_ranks = np.where(known, stats.popularity_ranks[known_items], 0)
+
+    n_catalog = stats.n_catalog
+    proba_user = (n_catalog + 1 - np.arange(1, items.shape[1] + 1)) / n_catalog
+    proba_any_user = np.where(popularity_ranks > 0, (n_catalog + 1 - popularity_ranks) / n_catalog, 0)
+    serendipity = np.maximum(proba_user - proba_any_user, 0) * hits
+    return serendipity, -np.log2(item_users / stats.n_users)
+
+
+def calc_metrics(
+    recos: tp.Sequence[np.ndarray],
+    truth: CSRArray,
+    stats: TrainStats,
+    ks: tp.Sequence[int],
+) -> tp.Dict[str, float]:
+    """
+    Precision, Recall, MAP, MRR, MeanInvUserFreq and Serendipity at every k
+    with rectools definitions. ``recos[i]`` are recommendations for the user
+    of ``truth`` row ``i``, empty for users the model does not know.
+
+    Accuracy metrics average over all test users, novelty metrics over
+    users with recommendations.
+    """
+    items = pad_rows(recos, max(ks))
+    valid = items >= 0
+    hits = _hits(items, valid, truth)
+    cum_hits = np.cumsum(hits, axis=1)
+    ranks = np.arange(1, items.shape[1] + 1)
+    n_relevant = np.diff(truth.indptr)
+    serendipity, novelty = _novelty(items, valid, hits, stats)
+
+    metrics = {}
+    for k in ks:
+        hits_k = hits[:, :k]
+        metrics[f"prec@{k}"] = float(np.mean(cum_hits[:, k - 1] / k))
+        metrics[f"recall@{k}"] = float(np.mean(cum_hits[:, k - 1] / n_relevant))
+        metrics[f"MAP@{k}"] = float(np.mean((hits_k * cum_hits[:, :k] / ranks[:k]).sum(axis=1) / n_relevant))
+        first_hit = np.argmax(hits_k, axis=1)
+        metrics[f"MRR@{k}"] = float(np.mean(np.where(hits_k.any(axis=1), 1 / (first_hit + 1), 0)))
+
+        n_valid = valid[:, :k].sum(axis=1)
+        with_recos = n_valid > 0
+        for name, values in (("Serendipity", serendipity), ("MeanInvUserFreq", novelty)):
+            per_user = (values[:, :k] * valid[:, :k]).sum(axis=1)[with_recos] / n_valid[with_recos]
+            metrics[f"{name}@{k}"] = float(per_user.mean()) if len(per_user) else float("nan")
+    return metrics
+
+
+def train_popular(train: Interactions, path: Path) -> None:
+    counter = PopularityCounter()
+    counter.update(train)
+    PopularModel(counter.ranking(1000)).save(path)
+
+
+# kinds that can be trained on a fold here, other kinds read fold
+# artifacts from ``<config.path>/fold_<i>``
+TRAINERS: tp.Dict[str, tp.Callable[[Interactions, Path], None]] = {
+    "random": lambda train, path: None,
+    "popular": train_popular,
+}
+
+
+def evaluate_model(
+    fold_path: Path,
+    fold: int,
+    name: str,
+    config: ModelConfig,
+    ks: tp.Sequence[int],
+) -> tp.Dict[str, tp.Any]:
+    """
+    Metrics of model ``name`` on a fold saved by ``save_fold``.
+
+    The model is loaded by the same ``ModelSource`` as in the service and
+    recommends through ``recommend_batch``, so the numbers are of exactly
+    what the service would serve.
+    """
+    started_at = time.perf_counter()
+    data = load_fold(fold_path)
+    if config.kind in TRAINERS:
+        path = fold_path / "models" / name
+        TRAINERS[config.kind](data.train, path)
+    elif config.path is not None:
+        path = Path(config.path) / FOLD_DIR.format(fold)
+    else:
+        raise ValueError(f"Model {name} of kind {config.kind} has neither a trainer nor a path")
+    model = ModelSource.from_config(config.model_copy(update={"path": str(path)})).load()
+
+    known = model.known_users(data.users)
+    recos = [np.empty(0, dtype=np.int64)] * len(data.users)
+    for position, items in zip(np.flatnonzero(known), model.recommend_batch(data.users[known], max(ks))):
+        recos[position] = items
+    return {
+        "fold": fold,
+        "model": name,
+        "time": time.perf_counter() - started_at,
+        **calc_metrics(recos, data.truth, train_stats(data.train), ks),
+    }
+
+
+def evaluate(
+    interactions: Interactions,
+    models: tp.Dict[str, ModelConfig],
+    ks: tp.Sequence[int],
+    n_splits: int,
+    test_days: int,
+    n_jobs: int,
+    work_dir: Path,
+) -> tp.List[tp.Dict[str, tp.Any]]:
+    """Evaluate every model on every fold, a process per (fold, model)."""
+    fold_paths = []
+    for i, fold in enumerate(time_range_folds(interactions, n_splits, test_days)):
+        fold_paths.append(work_dir / FOLD_DIR.format(i))
+        save_fold(fold, fold_paths[-1])
+
+    with ProcessPoolExecutor(n_jobs) as executor:
+        futures = [
+            executor.submit(evaluate_model, fold_path, i, name, config, ks)
+            for i, fold_path in enumerate(fold_paths)
+            for name, config in models.items()
+        ]
+        return [future.result() for future in futures]
+
+
+def summarize(results: tp.Sequence[tp.Dict[str, tp.Any]]) -> tp.Dict[str, tp.Dict[str, tp.Tuple[float, float]]]:
+    """Mean and std of every metric over folds by model."""
+    summary: tp.Dict[str, tp.Dict[str, tp.Tuple[float, float]]] = {}
+    for name in dict.fromkeys(result["model"] for result in results):
+        rows = [result for result in results if result["model"] == name]
+        summary[name] = {
+            metric: (float(np.mean([row[metric] for row in rows])), float(np.std([row[metric] for row in rows])))
+            for metric in rows[0]
+            if metric not in ("fold", "model")
+        }
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Evaluate service models on time range folds")
+    parser.add_argument("interactions", type=Path, help="interactions.csv")
+    parser.add_argument("--models", nargs="+", help="models of the service config to evaluate, all by default")
+    parser.add_argument("-k", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--splits", type=int, default=3)
+    parser.add_argument("--test-days", type=int, default=7)
+    parser.add_argument("--jobs", type=int, help="worker processes, CPU count by default")
+    parser.add_argument("--work-dir", type=Path, help="directory for fold data, temporary by default")
+    parser.add_argument("--output", type=Path, help="save metrics of every fold as JSON")
+    args = parser.parse_args()
+
+    models = get_config().models
+    if args.models:
+        models = {name: models[name] for name in args.models}
+    interactions = concat_interactions(read_interactions(args.interactions))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = args.work_dir or Path(tmp_dir)
+        results = evaluate(interactions, models, args.k, args.splits, args.test_days, args.jobs, work_dir)
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    for name, metrics in summarize(results).items():
+        print(name)
+        for metric, (mean, std) in metrics.items():
+            print(f"  {metric:>20} {mean:10.5f} ± {std:.5f}")
+
+
+if __name__ == "__main__":
+    main()
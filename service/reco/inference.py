@@ -0,0 +1,116 @@
+import asyncio
+import multiprocessing
+import typing as tp
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+import numpy as np
+
+from service.api.exceptions import ModelNotPublishedError
+from service.settings import ModelConfig
+
+from .models import RecoModel
+from .registry import ModelRegistry, ModelSource
+
+# Items of every user, None for users the model does not know
+Recos = tp.List[tp.Optional[np.ndarray]]
+Scorer = tp.Callable[[np.ndarray, int], tp.Awaitable[Recos]]
+BlockingScorer = tp.Callable[[np.ndarray, int], Recos]
+
+# models of an inference process, loaded on first use
+_sources: tp.Dict[str, ModelSource] = {}
+_models: tp.Dict[str, RecoModel] = {}
+
+
+def recommend_known(model: RecoModel, user_ids: np.ndarray, k: int) -> Recos:
+    known = model.known_users(user_ids)
+    recos = iter(model.recommend_batch(user_ids[known], k))
+    return [next(recos) if is_known else None for is_known in known.tolist()]
+
+
+def _init_process(configs: tp.Dict[str, ModelConfig]) -> None:
+    for name, config in configs.items():
+        _sources[name] = ModelSource.from_config(config)
+
+
+def _recommend(name: str, version: str, user_ids: np.ndarray, k: int) -> Recos:
+    model = _models.get(name)
+    if model is None or model.version != version:
+        model = _models[name] = _sources[name].load()
+    return recommend_known(model, user_ids, k)
+
+
+class InferencePool:
+    """
+    Worker processes scoring models with ``"process": true`` in the config.
+
+    Processes load models from the same artifacts as the service, which
+    are memory-mapped, so weights stay in the shared OS page cache instead
+    of being copied or pickled; only user ids and item lists cross the
+    process boundary. A process reloads a model when the service reports
+    another version, so models swapped in memory only (not from artifacts)
+    are not seen by the pool.
+
+    Processes are spawned, not forked: the service process already runs
+    threads. The pool is started lazily, so creating it before gunicorn
+    forks its workers is safe, but then every worker starts its own pool
+    of ``processes``. The service process never loads these models, it
+    only reads their versions from the artifacts.
+    """
+
+    def __init__(self, configs: tp.Dict[str, ModelConfig], processes: int) -> None:
+        self.configs = {name: config for name, config in configs.items() if config.process}
+        self.processes = processes
+        self._executor: tp.Optional[ProcessPoolExecutor] = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                self.processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process,
+                initargs=(self.configs,),
+            )
+        return self._executor
+
+    async def recommend(self, name: str, version: str, user_ids: np.ndarray, k: int) -> Recos:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, _recommend, name, version, user_ids, k)
+        except FileNotFoundError:
+            raise ModelNotPublishedError(error_message=f"Artifacts of model {name} are not published") from None
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+def make_scorer(
+    name: str,
+    models: ModelRegistry,
+    executor: tp.Optional[Executor],
+    pool: InferencePool,
+) -> Scorer:
+    """Score users with model ``name`` off the event loop."""
+    in_process = models.get_config(name).process
+
+    async def score(user_ids: np.ndarray, k: int) -> Recos:
+        if in_process:
+            return await pool.recommend(name, models.version(name), user_ids, k)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, recommend_known, models.get(name), user_ids, k)
+
+    return score
+
+
+def make_blocking_scorer(name: str, models: ModelRegistry, pool: InferencePool) -> BlockingScorer:
+    """Score users with model ``name`` in the calling thread or the pool."""
+    in_process = models.get_config(name).process
+
+    def score(user_ids: np.ndarray, k: int) -> Recos:
+        if in_process:
+            return pool.executor.submit(_recommend, name, models.version(name), user_ids, k).result()
+        return recommend_known(models.get(name), user_ids, k)
+
+    return score
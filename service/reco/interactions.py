@@ -0,0 +1,85 @@
+import csv
+import itertools
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+
+USER_COLUMN = "user_id"
+ITEM_COLUMN = "item_id"
+DATETIME_COLUMN = "last_watch_dt"
+
+
+class Interactions(tp.NamedTuple):
+    user_ids: np.ndarray
+    item_ids: np.ndarray
+    # days since epoch
+    days: np.ndarray
+
+
+def read_interactions(
+    path: tp.Union[str, Path],
+    chunk_size: int = 1_000_000,
+) -> tp.Iterator[Interactions]:
+    """
+    Read ``interactions.csv`` in chunks of at most ``chunk_size`` rows, so
+    the whole file never sits in memory.
+    """
+    with open(path, newline="", encoding="utf-8") as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None:
+            return
+        user_col, item_col, dt_col = (header.index(column) for column in (USER_COLUMN, ITEM_COLUMN, DATETIME_COLUMN))
+        while True:
+            rows = list(itertools.islice(reader, chunk_size))
+            if not rows:
+                return
+            columns = list(zip(*rows))
+            yield Interactions(
+                np.array(columns[user_col], dtype=np.int64),
+                np.array(columns[item_col], dtype=np.int64),
+                np.array(columns[dt_col], dtype="datetime64[D]").astype(np.int64),
+            )
+
+
+class InteractionsTail:
+    """
+    Follows a growing interactions file in the ``interactions.csv``
+    format, e.g. written by a stream consumer: every ``read`` returns the
+    complete rows appended since the previous one. A file which got
+    shorter is treated as rotated and read from the start.
+    """
+
+    def __init__(self, path: tp.Union[str, Path]) -> None:
+        self.path = Path(path)
+        self.offset = 0
+        self.columns: tp.Optional[tp.Tuple[int, int]] = None
+
+    def read(self) -> tp.Tuple[np.ndarray, np.ndarray]:
+        """User and item ids of new rows."""
+        empty = np.empty(0, dtype=np.int64)
+        try:
+            size = self.path.stat().st_size
+        except FileNotFoundError:
+            return empty, empty
+        if size < self.offset:
+            self.offset, self.columns = 0, None
+        with open(self.path, "rb") as file:
+            file.seek(self.offset)
+            data = file.read(size - self.offset)
+        # a partly written last row is left for the next read
+        end = data.rfind(b"\n") + 1
+        self.offset += end
+        rows = list(csv.reader(data[:end].decode("utf-8").splitlines()))
+        if self.columns is None and rows:
+            header = rows.pop(0)
+            self.columns = (header.index(USER_COLUMN), header.index(ITEM_COLUMN))
+        rows = [row for row in rows if row]
+        if not rows or self.columns is None:
+            return empty, empty
+        user_col, item_col = self.columns
+        return (
+            np.array([row[user_col] for row in rows], dtype=np.int64),
+            np.array([row[item_col] for row in rows], dtype=np.int64),
+        )
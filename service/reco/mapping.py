@@ -0,0 +1,147 @@
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+
+from service.api.exceptions import ItemNotFoundError, UserNotFoundError
+
+from .csr import load_array
+from .models import RecoModel
+
+IDS_FILE = "ids.npy"
+SORTED_IDS_FILE = "sorted_ids.npy"
+ORDER_FILE = "order.npy"
+
+USER_IDS_DIR = "user_ids"
+ITEM_IDS_DIR = "item_ids"
+
+
+class IdMap:
+    """
+    Maps external ids to dense internal indices and back.
+
+    ``ids[i]`` is the external id of index ``i``; lookups are binary
+    searches over ``sorted_ids == ids[order]``. That is 24 bytes per id in
+    three arrays which are memory-mapped from artifacts, so all workers
+    share them, against ~100 bytes per id per worker of a dict.
+    """
+
+    def __init__(self, ids: np.ndarray, sorted_ids: np.ndarray, order: np.ndarray) -> None:
+        self.ids = ids
+        self.sorted_ids = sorted_ids
+        self.order = order
+
+    @classmethod
+    def from_ids(cls, ids: tp.Union[tp.Sequence[int], np.ndarray]) -> "IdMap":
+        ids = np.asarray(ids, dtype=np.int64)
+        order = np.argsort(ids, kind="stable")
+        sorted_ids = ids[order]
+        if len(ids) > 1 and (sorted_ids[1:] == sorted_ids[:-1]).any():
+            raise ValueError("External ids are not unique")
+        return cls(ids, sorted_ids, order)
+
+    @classmethod
+    def load(cls, path: tp.Union[str, Path], mmap: bool = True) -> "IdMap":
+        path = Path(path)
+        return cls(
+            load_array(path / IDS_FILE, mmap),
+            load_array(path / SORTED_IDS_FILE, mmap),
+            load_array(path / ORDER_FILE, mmap),
+        )
+
+    def save(self, path: tp.Union[str, Path]) -> None:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / IDS_FILE, self.ids)
+        np.save(path / SORTED_IDS_FILE, self.sorted_ids)
+        np.save(path / ORDER_FILE, self.order)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def to_internal(self, external_ids: np.ndarray) -> tp.Tuple[np.ndarray, np.ndarray]:
+        """Internal indices and the mask of known ids, unknown get 0."""
+        if len(self.ids) == 0:
+            return np.zeros(len(external_ids), dtype=np.int64), np.zeros(len(external_ids), dtype=bool)
+        positions = np.searchsorted(self.sorted_ids, external_ids)
+        np.minimum(positions, len(self.ids) - 1, out=positions)
+        known = self.sorted_ids[positions] == external_ids
+        return np.where(known, self.order[positions], 0), known
+
+    def to_external(self, indices: np.ndarray) -> np.ndarray:
+        return self.ids[indices]
+
+    def index(self, external_id: int) -> tp.Optional[int]:
+        position = int(np.searchsorted(self.sorted_ids, external_id))
+        if position == len(self.ids) or self.sorted_ids[position] != external_id:
+            return None
+        return int(self.order[position])
+
+    def user_index(self, user_id: int) -> int:
+        index = self.index(user_id)
+        if index is None:
+            raise UserNotFoundError(error_message=f"User {user_id} not found")
+        return index
+
+    def item_index(self, item_id: int) -> int:
+        index = self.index(item_id)
+        if index is None:
+            raise ItemNotFoundError(error_message=f"Item {item_id} not found")
+        return index
+
+
+def extend_map(id_map: tp.Optional[IdMap], ids: np.ndarray) -> IdMap:
+    """``id_map`` with unknown ``ids`` appended, known indices don't move."""
+    if id_map is None:
+        return IdMap.from_ids(np.unique(ids))
+    _, known = id_map.to_internal(ids)
+    new_ids = np.unique(ids[~known])
+    return IdMap.from_ids(np.concatenate([np.asarray(id_map.ids), new_ids]))
+
+
+class MappedModel(RecoModel):
+    """
+    Model trained on internal indices serving external ids.
+
+    Either map may be missing, e.g. a popularity model has no users; ids
+    are then passed as is.
+    """
+
+    def __init__(self, model: RecoModel, users: tp.Optional[IdMap], items: tp.Optional[IdMap]) -> None:
+        self.model = model
+        self.users = users
+        self.items = items
+
+    @classmethod
+    def wrap(cls, model: RecoModel, path: tp.Optional[Path]) -> RecoModel:
+        """``model`` with the id maps found next to its artifacts."""
+        if path is None:
+            return model
+        users = IdMap.load(path / USER_IDS_DIR) if (path / USER_IDS_DIR).exists() else None
+        items = IdMap.load(path / ITEM_IDS_DIR) if (path / ITEM_IDS_DIR).exists() else None
+        if users is None and items is None:
+            return model
+        return cls(model, users, items)
+
+    def _items(self, indices: np.ndarray) -> np.ndarray:
+        return indices if self.items is None else self.items.to_external(indices)
+
+    def recommend(self, user_id: int, k: int) -> np.ndarray:
+        index = user_id if self.users is None else self.users.user_index(user_id)
+        return self._items(self.model.recommend(index, k))
+
+    def recommend_batch(self, user_ids: np.ndarray, k: int) -> tp.List[np.ndarray]:
+        if self.users is not None:
+            user_ids = self.users.to_internal(user_ids)[0]
+        return [self._items(items) for items in self.model.recommend_batch(user_ids, k)]
+
+    def similar_items(self, item_id: int, k: int) -> np.ndarray:
+        index = item_id if self.items is None else self.items.item_index(item_id)
+        return self._items(self.model.similar_items(index, k))
+
+    def known_users(self, user_ids: np.ndarray) -> np.ndarray:
+        if self.users is None:
+            return self.model.known_users(user_ids)
+        indices, known = self.users.to_internal(user_ids)
+        known[known] = self.model.known_users(indices[known])
+        return known
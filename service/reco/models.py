@@ -0,0 +1,40 @@
+import typing as tp
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import numpy as np
+
+
+class RecoModel(ABC):
+    version: str = ""
+
+    @abstractmethod
+    def recommend(self, user_id: int, k: int) -> np.ndarray:
+        """Return at most ``k`` item ids ranked by relevance."""
+
+    def recommend_batch(self, user_ids: np.ndarray, k: int) -> tp.List[np.ndarray]:
+        """Recommend for users which passed ``known_users``."""
+        return [self.recommend(user_id, k) for user_id in user_ids.tolist()]
+
+    def known_users(self, user_ids: np.ndarray) -> np.ndarray:
+        return np.ones(len(user_ids), dtype=bool)
+
+    def similar_items(self, item_id: int, k: int) -> np.ndarray:
+        """Return at most ``k`` items most similar to ``item_id``."""
+        raise NotImplementedError(f"{type(self).__name__} has no similar items")
+
+
+class RandomModel(RecoModel):
+    def __init__(self, min_item_id: int = 10, max_item_id: int = 1000) -> None:
+        self.min_item_id = min_item_id
+        self.max_item_id = max_item_id
+        self._rng = np.random.default_rng()
+
+    def recommend(self, user_id: int, k: int) -> np.ndarray:
+        return self._rng.integers(self.min_item_id, self.max_item_id, size=k, endpoint=True)
+
+    def recommend_batch(self, user_ids: np.ndarray, k: int) -> tp.List[np.ndarray]:
+        return list(self._rng.integers(self.min_item_id, self.max_item_id, size=(len(user_ids), k), endpoint=True))
+
+
+ModelLoader = tp.Callable[[tp.Optional[Path]], RecoModel]
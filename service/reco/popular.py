@@ -0,0 +1,157 @@
+import argparse
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+
+from .csr import load_array
+from .interactions import Interactions, read_interactions
+from .models import RecoModel
+
+POPULAR_ITEMS_FILE = "items.npy"
+
+
+class PopularityCounter:
+    """
+    Item popularity over the last ``window_days`` days (whole history if
+    None), optionally decayed by half every ``half_life_days`` days.
+
+    Ages are counted from the latest day seen. With a window, counts are
+    kept in a ring of one bucket per day, so old days drop out by clearing
+    their bucket. Without it a single decayed total is rescaled when the
+    clock moves. Either way a new batch is added without recounting
+    history.
+    """
+
+    def __init__(self, window_days: tp.Optional[int] = None, half_life_days: tp.Optional[float] = None) -> None:
+        self.window_days = window_days
+        self.half_life_days = half_life_days
+        self.last_day: tp.Optional[int] = None
+        self.counts = np.zeros((window_days or 1, 0), dtype=np.float64)
+
+    @property
+    def n_items(self) -> int:
+        return self.counts.shape[1]
+
+    def _decay(self, ages: np.ndarray) -> np.ndarray:
+        if self.half_life_days is None:
+            return np.ones(len(ages))
+        return 0.5 ** (ages / self.half_life_days)
+
+    def _grow(self, n_items: int) -> None:
+        if n_items > self.n_items:
+            counts = np.zeros((len(self.counts), n_items), dtype=np.float64)
+            counts[:, :self.n_items] = self.counts
+            self.counts = counts
+
+    def _advance(self, day: int) -> None:
+        if self.last_day is None:
+            self.last_day = day
+        if day <= self.last_day:
+            return
+        if self.window_days is None:
+            self.counts *= self._decay(np.array([day - self.last_day]))
+        else:
+            new_days = np.arange(self.last_day + 1, day + 1)[-self.window_days:]
+            self.counts[new_days % self.window_days] = 0
+        self.last_day = day
+
+    def update(self, interactions: Interactions) -> None:
+        if len(interactions.item_ids) == 0:
+            return
+        self._grow(int(interactions.item_ids.max()) + 1)
+        self._advance(int(interactions.days.max()))
+        ages = self.last_day - interactions.days
+        if self.window_days is None:
+            self.counts[0] += np.bincount(
+                interactions.item_ids, weights=self._decay(ages), minlength=self.n_items
+            )
+            return
+        fresh = ages < self.window_days
+        slots = interactions.days[fresh] % self.window_days
+        self.counts += np.bincount(
+            slots * self.n_items + interactions.item_ids[fresh],
+            minlength=self.counts.size,
+        ).reshape(self.counts.shape)
+
+    def scores(self) -> np.ndarray:
+        if self.window_days is None:
+            return self.counts[0]
+        ages = (self.last_day - np.arange(self.window_days)) % self.window_days
+        return self._decay(ages) @ self.counts
+
+    def ranking(self, n: tp.Optional[int] = None) -> np.ndarray:
+        scores = self.scores()
+        order = np.argsort(-scores, kind="stable")
+        return order[:np.count_nonzero(scores)][:n]
+
+    def save(self, path: Path) -> None:
+        with open(path, "wb") as file:
+            np.savez(
+                file,
+                counts=self.counts,
+                last_day=-1 if self.last_day is None else self.last_day,
+                window_days=self.window_days or 0,
+                half_life_days=np.nan if self.half_life_days is None else self.half_life_days,
+            )
+
+    @classmethod
+    def load(cls, path: Path) -> "PopularityCounter":
+        with np.load(path) as state:
+            half_life_days = float(state["half_life_days"])
+            counter = cls(
+                int(state["window_days"]) or None,
+                None if np.isnan(half_life_days) else half_life_days,
+            )
+            counter.counts = state["counts"]
+            counter.last_day = None if state["last_day"] < 0 else int(state["last_day"])
+        return counter
+
+
+class PopularModel(RecoModel):
+    """Serves the same precomputed ranking to everybody in O(1)."""
+
+    def __init__(self, items: np.ndarray) -> None:
+        self.items = items
+
+    @classmethod
+    def load(cls, path: tp.Optional[Path]) -> "PopularModel":
+        if path is None:
+            raise ValueError("Popular model requires a path")
+        return cls(load_array(path / POPULAR_ITEMS_FILE))
+
+    def save(self, path: Path) -> None:
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / POPULAR_ITEMS_FILE, self.items)
+
+    def recommend(self, user_id: int, k: int) -> np.ndarray:
+        return self.items[:k]
+
+    def recommend_batch(self, user_ids: np.ndarray, k: int) -> tp.List[np.ndarray]:
+        return [self.items[:k]] * len(user_ids)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Count item popularity and save the ranking for PopularModel")
+    parser.add_argument("interactions", type=Path, help="interactions.csv, whole history or a new batch")
+    parser.add_argument("output", type=Path, help="model directory to save the ranking to")
+    parser.add_argument("--state", type=Path, help="counter state .npz, updated in place if it exists")
+    parser.add_argument("--window-days", type=int)
+    parser.add_argument("--half-life-days", type=float)
+    parser.add_argument("--top", type=int, default=1000, help="length of the saved ranking")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    if args.state is not None and args.state.exists():
+        counter = PopularityCounter.load(args.state)
+    else:
+        counter = PopularityCounter(args.window_days, args.half_life_days)
+    for chunk in read_interactions(args.interactions, args.chunk_size):
+        counter.update(chunk)
+    if args.state is not None:
+        counter.save(args.state)
+    PopularModel(counter.ranking(args.top)).save(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import asyncio
+import threading
+import typing as tp
+from concurrent.futures import Executor
+from pathlib import Path
+
+from service.api.exceptions import ModelNotFoundError, ModelNotPublishedError
+from service.log import app_logger
+from service.settings import ModelConfig
+
+from .ann import ANNModel
+from .bundle import MANIFEST_FILE, VERSION_FILE, verify_bundle
+from .mapping import MappedModel
+from .models import ModelLoader, RandomModel, RecoModel
+from .popular import PopularModel
+from .scoring import FactorModel
+from .similar import SimilarItemsModel
+from .store import PrecomputedModel
+
+# Versioned artifacts live in ``<path>/<version>/`` and ``<path>/CURRENT``
+# names the active one. Publishing a new version is writing its directory
+# and then atomically replacing CURRENT (write a temp file + rename).
+# A version with a manifest is a bundle and is checked before loading.
+
+MODEL_LOADERS: tp.Dict[str, tp.Callable[[tp.Optional[Path], ModelConfig], RecoModel]] = {
+    "random": lambda path, config: RandomModel(),
+    "popular": lambda path, config: PopularModel.load(path),
+    "precomputed": lambda path, config: PrecomputedModel.load(path),
+    "factors": lambda path, config: FactorModel.load(path),
+    "ann": lambda path, config: ANNModel.load(path, config.ann.nprobe, config.ann.rerank),
+    "similar": lambda path, config: SimilarItemsModel.load(path),
+}
+
+
+def resolve_version(path: tp.Optional[Path]) -> tp.Tuple[str, tp.Optional[Path]]:
+    if path is None or not (path / VERSION_FILE).exists():
+        return "", path
+    version = (path / VERSION_FILE).read_text().strip()
+    return version, path / version
+
+
+class ModelSource:
+    def __init__(self, loader: ModelLoader, path: tp.Optional[Path] = None) -> None:
+        self.loader = loader
+        self.path = path
+
+    @classmethod
+    def from_config(cls, config: ModelConfig) -> "ModelSource":
+        try:
+            loader = MODEL_LOADERS[config.kind]
+        except KeyError:
+            raise ValueError(f"Unknown model kind: {config.kind}") from None
+
+        def load(path: tp.Optional[Path]) -> RecoModel:
+            if path is not None and (path / MANIFEST_FILE).exists():
+                verify_bundle(path)
+            return MappedModel.wrap(loader(path, config), path)
+
+        return cls(load, Path(config.path) if config.path else None)
+
+    def current_version(self) -> str:
+        return resolve_version(self.path)[0]
+
+    def load(self) -> RecoModel:
+        version, path = resolve_version(self.path)
+        model = self.loader(path)
+        model.version = version
+        return model
+
+
+class ModelRegistry:
+    """
+    Maps model names to loaded models.
+
+    Swapping a model only rebinds a dict entry, so requests which already
+    got the old model object keep using it until they finish.
+    """
+
+    def __init__(self) -> None:
+        self._models: tp.Dict[str, RecoModel] = {}
+        self._sources: tp.Dict[str, ModelSource] = {}
+        self._configs: tp.Dict[str, ModelConfig] = {}
+        self._swap_listeners: tp.List[tp.Callable[[str], tp.Any]] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, configs: tp.Dict[str, ModelConfig]) -> "ModelRegistry":
+        registry = cls()
+        for name, config in configs.items():
+            if config.fallback is not None and config.fallback not in configs:
+                raise ValueError(f"Unknown fallback model {config.fallback} of model {name}")
+            # models scored by the inference pool are loaded only there
+            lazy = config.lazy or config.process
+            registry.add(name, ModelSource.from_config(config), lazy=lazy, config=config)
+        return registry
+
+    @property
+    def model_names(self) -> tp.List[str]:
+        return list(self._sources)
+
+    def add(
+        self,
+        name: str,
+        source: ModelSource,
+        lazy: bool = False,
+        config: tp.Optional[ModelConfig] = None,
+    ) -> None:
+        self._sources[name] = source
+        self._configs[name] = config or ModelConfig(kind="custom", lazy=lazy)
+        if lazy:
+            return
+        try:
+            self._models[name] = source.load()
+        except FileNotFoundError:
+            # e.g. the stock config on a fresh checkout, serve the rest
+            app_logger.warning("Artifacts of model %s not found in %s, it is loaded once published", name, source.path)
+
+    def get(self, name: str) -> RecoModel:
+        try:
+            return self._models[name]
+        except KeyError:
+            pass
+        if name not in self._sources:
+            raise ModelNotFoundError(error_message=f"Model {name} not found")
+        with self._lock:
+            if name not in self._models:
+                try:
+                    self._models[name] = self._sources[name].load()
+                except FileNotFoundError:
+                    raise ModelNotPublishedError(error_message=f"Artifacts of model {name} are not published") from None
+        return self._models[name]
+
+    def version(self, name: str) -> str:
+        """
+        Version of the loaded model, or, if it is not loaded, the version
+        in the ``CURRENT`` file of its artifacts, without loading it.
+        """
+        model = self._models.get(name)
+        if model is not None:
+            return model.version
+        try:
+            source = self._sources[name]
+        except KeyError:
+            raise ModelNotFoundError(error_message=f"Model {name} not found") from None
+        return source.current_version()
+
+    def get_config(self, name: str) -> ModelConfig:
+        try:
+            return self._configs[name]
+        except KeyError:
+            raise ModelNotFoundError(error_message=f"Model {name} not found") from None
+
+    def on_swap(self, listener: tp.Callable[[str], tp.Any]) -> None:
+        """Call ``listener(name)`` after a model got a new version."""
+        self._swap_listeners.append(listener)
+
+    def swap(self, name: str, model: RecoModel) -> None:
+        if name not in self._sources:
+            raise ModelNotFoundError(error_message=f"Model {name} not found")
+        self._models[name] = model
+        for listener in self._swap_listeners:
+            listener(name)
+
+    def refresh(self) -> tp.List[str]:
+        """Reload models whose artifacts got a new version."""
+        swapped = []
+        for name, model in list(self._models.items()):
+            source = self._sources[name]
+            try:
+                if source.current_version() == model.version:
+                    continue
+                new_model = source.load()
+            except Exception:  # pylint: disable=broad-except
+                app_logger.exception("Failed to reload model %s, keep serving version %s", name, model.version)
+                continue
+            self.swap(name, new_model)
+            app_logger.info("Model %s swapped: %s -> %s", name, model.version, new_model.version)
+            swapped.append(name)
+        return swapped
+
+    async def watch(self, interval: float, executor: tp.Optional[Executor] = None) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await loop.run_in_executor(executor, self.refresh)
+            except Exception:  # pylint: disable=broad-except
+                app_logger.exception("Failed to refresh models")
@@ -0,0 +1,165 @@
+import argparse
+import csv
+import json
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+
+from service.settings import RerankConfig
+
+from .csr import load_array
+from .mapping import ITEM_IDS_DIR, IdMap
+
+GENRES_FILE = "genres.npy"
+GENRE_NAMES_FILE = "genre_names.json"
+ITEM_COLUMN = "item_id"
+GENRES_COLUMN = "genres"
+RERANK_METHODS = ("mmr", "genre_cap")
+
+
+class ItemFeatures:
+    """
+    Dense 0/1 genre matrix of items, row ``i`` is item ``items.ids[i]``.
+
+    Memory-mapped like model artifacts; items without a row have no
+    genres, so they are never similar to anything and never capped.
+    """
+
+    def __init__(self, genres: np.ndarray, items: IdMap, genre_names: tp.Sequence[str] = ()) -> None:
+        self.genres = genres
+        self.items = items
+        self.genre_names = list(genre_names)
+
+    @classmethod
+    def from_items_csv(cls, path: tp.Union[str, Path]) -> "ItemFeatures":
+        """Genres of ``items.csv``, a comma-separated list per item."""
+        with open(path, newline="", encoding="utf-8") as file:
+            rows = [(int(row[ITEM_COLUMN]), row[GENRES_COLUMN] or "") for row in csv.DictReader(file)]
+        item_genres = [[genre.strip() for genre in genres.split(",") if genre.strip()] for _, genres in rows]
+        names = sorted({genre for genres in item_genres for genre in genres})
+        columns = {name: column for column, name in enumerate(names)}
+        matrix = np.zeros((len(rows), len(names)), dtype=np.uint8)
+        for row, genres in enumerate(item_genres):
+            matrix[row, [columns[genre] for genre in genres]] = 1
+        return cls(matrix, IdMap.from_ids([item_id for item_id, _ in rows]), names)
+
+    @classmethod
+    def load(cls, path: tp.Union[str, Path], mmap: bool = True) -> "ItemFeatures":
+        path = Path(path)
+        names_path = path / GENRE_NAMES_FILE
+        names = json.loads(names_path.read_text(encoding="utf-8")) if names_path.exists() else []
+        return cls(load_array(path / GENRES_FILE, mmap), IdMap.load(path / ITEM_IDS_DIR, mmap), names)
+
+    def save(self, path: tp.Union[str, Path]) -> None:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / GENRES_FILE, self.genres)
+        self.items.save(path / ITEM_IDS_DIR)
+        (path / GENRE_NAMES_FILE).write_text(json.dumps(self.genre_names, ensure_ascii=False), encoding="utf-8")
+
+    def rows(self, item_ids: np.ndarray) -> np.ndarray:
+        """Genre rows of items, zeros for unknown ones."""
+        indices, known = self.items.to_internal(item_ids)
+        rows = self.genres[indices]
+        rows[~known] = 0
+        return rows
+
+
+def mmr(features: np.ndarray, k: int, diversity: float) -> np.ndarray:
+    """
+    Positions of ``k`` of the ranked candidates picked by maximal marginal
+    relevance: ``(1 - diversity) * relevance - diversity * similarity``
+    to the closest picked one. Relevance falls linearly with the rank,
+    similarity is the cosine of genre vectors; every step is one vector
+    operation over all candidates.
+    """
+    n = len(features)
+    k = min(k, n)
+    vectors = features.astype(np.float32)
+    norms = np.sqrt(np.einsum("ij,ij->i", vectors, vectors))
+    np.divide(vectors, norms[:, None], out=vectors, where=norms[:, None] > 0)
+    similarity = vectors @ vectors.T
+    similarity *= diversity
+    # picked candidates get -inf relevance, so they are never picked again
+    relevance = (1 - diversity) * (1 - np.arange(n, dtype=np.float32) / n)
+    closest = np.zeros(n, dtype=np.float32)
+    picked = np.empty(k, dtype=np.int64)
+    for step in range(k):
+        position = int(np.argmax(relevance - closest))
+        picked[step] = position
+        relevance[position] = -np.inf
+        np.maximum(closest, similarity[position], out=closest)
+    return picked
+
+
+def genre_cap(features: np.ndarray, k: int, max_per_genre: int) -> np.ndarray:
+    """
+    Positions of the first ``k`` ranked candidates such that no genre
+    occurs more than ``max_per_genre`` times; if too few pass, the best
+    of the rest fill up the list in rank order.
+    """
+    n = len(features)
+    k = min(k, n)
+    genres = features.astype(bool)
+    counts = np.zeros(genres.shape[1], dtype=np.int64)
+    eligible = np.ones(n, dtype=bool)
+    available = np.ones(n, dtype=bool)
+    picked = []
+    for _ in range(k):
+        position = int(np.argmax(eligible))
+        if not eligible[position]:
+            break
+        picked.append(position)
+        eligible[position] = available[position] = False
+        counts += genres[position]
+        full = genres[position] & (counts == max_per_genre)
+        if full.any():
+            eligible &= ~genres[:, full].any(axis=1)
+    rest = np.flatnonzero(available)[:k - len(picked)]
+    return np.concatenate([np.array(picked, dtype=np.int64), rest])
+
+
+class Reranker:
+    """Diversifies the top of over-fetched model output by item genres."""
+
+    def __init__(self, config: RerankConfig, features: ItemFeatures) -> None:
+        if config.method not in RERANK_METHODS:
+            raise ValueError(f"Unknown rerank method: {config.method}")
+        self.config = config
+        self.features = features
+
+    @classmethod
+    def from_config(cls, config: RerankConfig) -> "Reranker":
+        if config.features_path is None:
+            raise ValueError("Reranking requires features_path")
+        return cls(config, ItemFeatures.load(config.features_path))
+
+    def candidates(self, k: int) -> int:
+        """Number of items to ask the model for to rerank them to ``k``."""
+        return max(k, self.config.candidates)
+
+    def rerank(self, items: np.ndarray, k: int) -> np.ndarray:
+        if len(items) == 0:
+            return items
+        features = self.features.rows(items)
+        if self.config.method == "mmr":
+            positions = mmr(features, k, self.config.diversity)
+        else:
+            positions = genre_cap(features, k, self.config.max_per_genre)
+        return items[positions]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build dense item genre features for reranking")
+    parser.add_argument("items", type=Path, help="items.csv with item_id and genres columns")
+    parser.add_argument("output", type=Path, help="directory to save the features to, features_path in the config")
+    args = parser.parse_args()
+
+    features = ItemFeatures.from_items_csv(args.items)
+    features.save(args.output)
+    print(f"{len(features.items)} items, {len(features.genre_names)} genres saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
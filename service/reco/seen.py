@@ -0,0 +1,160 @@
+import asyncio
+import threading
+import typing as tp
+from concurrent.futures import Executor
+from pathlib import Path
+
+import numpy as np
+
+from service.log import app_logger
+
+from .csr import CSRArray
+from .interactions import InteractionsTail
+from .mapping import USER_IDS_DIR, IdMap, extend_map
+
+EMPTY = np.empty(0, dtype=np.int64)
+
+
+def merge_pairs(base: CSRArray, user_ids: np.ndarray, item_ids: np.ndarray) -> CSRArray:
+    """
+    ``base`` with ``(user, item)`` pairs appended to the rows of users.
+    Users are row numbers, the result has ``max(user_ids) + 1`` rows at
+    least, so external ids are mapped to dense indices first.
+
+    Base rows are copied as blocks in O(nnz) instead of sorting all pairs
+    again; only the new pairs are sorted and deduplicated, an item seen
+    again may repeat one of the base row, which filtering doesn't mind.
+    """
+    order = np.lexsort((item_ids, user_ids))
+    user_ids, item_ids = user_ids[order], item_ids[order]
+    if len(user_ids):
+        unique = np.ones(len(user_ids), dtype=bool)
+        unique[1:] = (user_ids[1:] != user_ids[:-1]) | (item_ids[1:] != item_ids[:-1])
+        user_ids, item_ids = user_ids[unique], item_ids[unique]
+
+    n_users = max(len(base), int(user_ids[-1]) + 1 if len(user_ids) else 0)
+    base_counts = np.zeros(n_users, dtype=np.int64)
+    base_counts[:len(base)] = np.diff(base.indptr)
+    new_counts = np.bincount(user_ids, minlength=n_users)
+    indptr = np.zeros(n_users + 1, dtype=np.int64)
+    np.cumsum(base_counts + new_counts, out=indptr[1:])
+
+    indices = np.empty(indptr[-1], dtype=np.int64)
+    # every base item moves by the number of new items of earlier users
+    shifts = indptr[:-1] - np.concatenate([[0], np.cumsum(base_counts)[:-1]])
+    indices[np.arange(len(base.indices)) + np.repeat(shifts, base_counts)] = base.indices
+    new_starts = np.concatenate([[0], np.cumsum(new_counts)[:-1]])
+    ranks = np.arange(len(user_ids)) - new_starts[user_ids]
+    indices[indptr[user_ids] + base_counts[user_ids] + ranks] = item_ids
+    return CSRArray(indptr, indices)
+
+
+class SeenIndex:
+    """
+    Items each user has already seen, to filter them out at serve time.
+
+    The base is a CSR array with the items of user ``users.ids[i]`` in row
+    ``i``, memory-mapped from artifacts; without a saved user map row
+    ``i`` is user ``i``. New interactions go to an append-only delta of
+    per-user lists, which ``compact`` merges into a new in-memory base
+    once it grows, appending new users to the map. Readers take the
+    ``(base, users, compacting, delta)`` layers in one attribute read, so
+    they never wait for a compaction and never see items drop out while
+    it runs.
+    """
+
+    def __init__(self, base: tp.Optional[CSRArray] = None, users: tp.Optional[IdMap] = None) -> None:
+        base = base if base is not None else CSRArray(np.zeros(1, dtype=np.int64), EMPTY)
+        users = users if users is not None else IdMap.from_ids(np.arange(len(base)))
+        self._layers: tp.Tuple[CSRArray, IdMap, tp.Dict[int, tp.List[int]], tp.Dict[int, tp.List[int]]] = (
+            base, users, {}, {},
+        )
+        self.delta_size = 0
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: tp.Optional[Path]) -> "SeenIndex":
+        if path is None:
+            return cls()
+        users = IdMap.load(path / USER_IDS_DIR) if (path / USER_IDS_DIR).exists() else None
+        return cls(CSRArray.load(path), users)
+
+    def save(self, path: tp.Union[str, Path]) -> None:
+        base, users, _, _ = self._layers
+        base.save(path)
+        users.save(Path(path) / USER_IDS_DIR)
+
+    @property
+    def base(self) -> CSRArray:
+        return self._layers[0]
+
+    @property
+    def users(self) -> IdMap:
+        return self._layers[1]
+
+    def items(self, user_id: int) -> np.ndarray:
+        base, users, compacting, delta = self._layers
+        row = users.index(user_id)
+        rows = [base.row(row)] if row is not None and row < len(base) else []
+        for layer in (compacting, delta):
+            if user_id in layer:
+                rows.append(np.array(layer[user_id], dtype=np.int64))
+        if not rows:
+            return EMPTY
+        return rows[0] if len(rows) == 1 else np.concatenate(rows)
+
+    def append(self, user_ids: np.ndarray, item_ids: np.ndarray) -> None:
+        with self._lock:
+            delta = self._layers[3]
+            for user_id, item_id in zip(user_ids.tolist(), item_ids.tolist()):
+                delta.setdefault(user_id, []).append(item_id)
+            self.delta_size += len(user_ids)
+
+    def compact(self) -> None:
+        """Merge the delta into a new base, appends keep going meanwhile."""
+        with self._compact_lock:
+            with self._lock:
+                base, users, _, delta = self._layers
+                self._layers = (base, users, delta, {})
+                self.delta_size = 0
+            n_pairs = sum(len(items) for items in delta.values())
+            user_ids = np.fromiter(
+                (user_id for user_id, items in delta.items() for _ in items), dtype=np.int64, count=n_pairs,
+            )
+            item_ids = np.fromiter(
+                (item_id for items in delta.values() for item_id in items), dtype=np.int64, count=n_pairs,
+            )
+            new_users = extend_map(users, user_ids)
+            new_base = merge_pairs(base, new_users.to_internal(user_ids)[0], item_ids)
+            with self._lock:
+                self._layers = (new_base, new_users, {}, self._layers[3])
+
+    def filter(self, user_id: int, items: np.ndarray) -> np.ndarray:
+        seen = self.items(user_id)
+        if len(seen) == 0:
+            return items
+        return items[~np.isin(items, seen)]
+
+    def ingest(self, tail: InteractionsTail, compact_size: int) -> int:
+        """Append new rows of ``tail``, compact a large delta."""
+        user_ids, item_ids = tail.read()
+        self.append(user_ids, item_ids)
+        if self.delta_size >= compact_size:
+            self.compact()
+        return len(user_ids)
+
+    async def watch(
+        self,
+        tail: InteractionsTail,
+        interval: float,
+        compact_size: int,
+        executor: tp.Optional[Executor] = None,
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(executor, self.ingest, tail, compact_size)
+            except Exception:  # pylint: disable=broad-except
+                app_logger.exception("Failed to ingest interactions from %s", tail.path)
+            await asyncio.sleep(interval)
@@ -0,0 +1,106 @@
+import argparse
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+
+from service.api.exceptions import ItemNotFoundError, UserNotFoundError
+
+from .csr import CSRArray
+from .interactions import read_interactions
+from .models import RecoModel
+from .scoring import top_k
+from .seen import merge_pairs
+
+MEASURES = ("cosine", "cooccurrence")
+
+
+class SimilarItemsModel(RecoModel):
+    """
+    Precomputed "more like this" lists: row ``i`` of the memory-mapped
+    ``CSRArray`` holds the neighbours of item ``i``, most similar first.
+    It knows no users, so ``/reco`` answers ``user_not_found`` for it.
+    """
+
+    def __init__(self, neighbours: CSRArray) -> None:
+        self.neighbours = neighbours
+
+    @classmethod
+    def load(cls, path: tp.Optional[Path]) -> "SimilarItemsModel":
+        if path is None:
+            raise ValueError("Similar items model requires a path")
+        return cls(CSRArray.load(path))
+
+    def recommend(self, user_id: int, k: int) -> np.ndarray:
+        raise UserNotFoundError(error_message=f"User {user_id} not found")
+
+    def known_users(self, user_ids: np.ndarray) -> np.ndarray:
+        return np.zeros(len(user_ids), dtype=bool)
+
+    def similar_items(self, item_id: int, k: int) -> np.ndarray:
+        if not 0 <= item_id < len(self.neighbours):
+            raise ItemNotFoundError(error_message=f"Item {item_id} not found")
+        return self.neighbours.row(item_id)[:k]
+
+
+def build_neighbours(
+    user_items: CSRArray,
+    item_users: CSRArray,
+    k: int,
+    measure: str = "cosine",
+    chunk_size: int = 256,
+) -> CSRArray:
+    """
+    Top ``k`` neighbours of every item by co-occurrence counts of the
+    binary user-item matrix ``X``, or by their cosine.
+
+    ``X.T @ X`` is computed ``chunk_size`` item rows at a time from the
+    two CSR views of ``X``, so memory is bounded by a dense
+    ``chunk_size x n_items`` block plus the user-item pairs of the chunk
+    instead of the full item-item matrix.
+    """
+    if measure not in MEASURES:
+        raise ValueError(f"Unknown similarity measure: {measure}")
+    n_items = len(item_users)
+    degrees = np.diff(item_users.indptr).astype(np.float64)
+    rows: tp.List[np.ndarray] = []
+    for start in range(0, n_items, chunk_size):
+        items = np.arange(start, min(start + chunk_size, n_items))
+        users, n_users = item_users.gather(items)
+        neighbours, n_neighbours = user_items.gather(users)
+        chunk_rows = np.repeat(np.repeat(np.arange(len(items)), n_users), n_neighbours)
+        scores = np.bincount(chunk_rows * n_items + neighbours, minlength=len(items) * n_items)
+        scores = scores.reshape(len(items), n_items).astype(np.float64)
+        scores[np.arange(len(items)), items] = 0
+        if measure == "cosine":
+            norms = np.sqrt(np.outer(degrees[items], degrees))
+            np.divide(scores, norms, out=scores, where=norms > 0)
+        top = top_k(scores, k)
+        valid = np.take_along_axis(scores, top, axis=-1) > 0
+        rows.extend(row[row_valid] for row, row_valid in zip(top, valid))
+    return CSRArray.from_rows(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build item neighbours for SimilarItemsModel")
+    parser.add_argument("interactions", type=Path, help="interactions.csv")
+    parser.add_argument("output", type=Path, help="model directory to save the neighbours to")
+    parser.add_argument("-k", type=int, default=20, help="neighbours per item")
+    parser.add_argument("--measure", choices=MEASURES, default="cosine")
+    parser.add_argument("--chunk-size", type=int, default=256, help="items per block of X.T @ X")
+    args = parser.parse_args()
+
+    chunks = list(read_interactions(args.interactions))
+    user_ids = np.concatenate([chunk.user_ids for chunk in chunks])
+    item_ids = np.concatenate([chunk.item_ids for chunk in chunks])
+    # merging into an empty base drops repeated views, X is binary
+    empty = CSRArray(np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int64))
+    user_items = merge_pairs(empty, user_ids, item_ids)
+    item_users = merge_pairs(empty, item_ids, user_ids)
+    neighbours = build_neighbours(user_items, item_users, args.k, args.measure, args.chunk_size)
+    neighbours.save(args.output)
+    print(f"{len(neighbours)} items, {len(neighbours.indices)} neighbours saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+
+from service.api.exceptions import UserNotFoundError
+
+from .csr import CSRArray
+from .models import RecoModel
+
+
+class PrecomputedModel(RecoModel):
+    """
+    Precomputed top-N recommendations.
+
+    Row ``i`` of the ``CSRArray`` is the ranked item list of user ``i``.
+    Arrays are memory-mapped read-only, so all gunicorn workers share the
+    same pages of the OS page cache instead of keeping private copies.
+    """
+
+    def __init__(self, recos: CSRArray) -> None:
+        self.recos = recos
+
+    @classmethod
+    def load(cls, path: tp.Optional[Path]) -> "PrecomputedModel":
+        if path is None:
+            raise ValueError("Precomputed model requires a path")
+        return cls(CSRArray.load(path))
+
+    def recommend(self, user_id: int, k: int) -> np.ndarray:
+        """Return a view of at most ``k`` items, nothing is copied."""
+        if not 0 <= user_id < len(self.recos):
+            raise UserNotFoundError(error_message=f"User {user_id} not found")
+        return self.recos.row(user_id)[:k]
+
+    def recommend_batch(self, user_ids: np.ndarray, k: int) -> tp.List[np.ndarray]:
+        return self.recos.rows(user_ids, k)
+
+    def known_users(self, user_ids: np.ndarray) -> np.ndarray:
+        return (user_ids >= 0) & (user_ids < len(self.recos))
@@ -1,37 +1,44 @@
-import json
 import typing as tp
 from http import HTTPStatus
 
+import numpy as np
 import orjson
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
 from service.models import Error
 
+JSON_MEDIA_TYPE = "application/json"
 
-class EnhancedJSONEncoder(json.JSONEncoder):
-    def default(self, o: tp.Any) -> tp.Any:
-        if isinstance(o, BaseModel):
-            return o.model_dump()
-        try:
-            orjson.dumps(o)
-        except TypeError:
-            return str(o)
-        return super().default(o)
+
+def _default(o: tp.Any) -> tp.Any:
+    if isinstance(o, BaseModel):
+        return o.model_dump()
+    # orjson handles only C-contiguous arrays of native types itself
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    return str(o)
+
+
+def render_json(content: tp.Any) -> bytes:
+    """
+    Compact UTF-8 JSON, same as ``json.dumps`` with ``(",", ":")``
+    separators, but numpy arrays are written without ``tolist`` and
+    pydantic models without re-validation.
+    """
+    return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def render_reco(user_id: int, items: np.ndarray) -> tp.Dict[str, tp.Any]:
+    """``RecoResponse`` as a dict, items are trusted model output."""
+    return {"user_id": user_id, "items": items}
 
 
 class DataclassJSONResponse(JSONResponse):
-    media_type = "application/json"
+    media_type = JSON_MEDIA_TYPE
 
     def render(self, content: tp.Any) -> bytes:
-        return json.dumps(
-            content,
-            ensure_ascii=False,
-            allow_nan=False,
-            indent=None,
-            separators=(",", ":"),
-            cls=EnhancedJSONEncoder,
-        ).encode("utf-8")
+        return render_json(content)
 
 
 def create_response(
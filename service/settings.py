@@ -1,3 +1,6 @@
+import typing as tp
+
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -9,16 +12,176 @@ class LogConfig(Config):
     model_config = SettingsConfigDict(case_sensitive=False, env_prefix="log_")
     level: str = "INFO"
     datetime_format: str = "%Y-%m-%d %H:%M:%S"
+    # write records from a background thread instead of the event loop
+    queue: bool = True
+    # share of successful fast requests written to the access log,
+    # errors and requests slower than slow_request_time are always logged
+    access_sample_rate: float = 1.0
+    slow_request_time: float = 0.5
+
+
+class CacheConfig(Config):
+    model_config = SettingsConfigDict(case_sensitive=False, env_prefix="cache_")
+    enabled: bool = True
+    max_bytes: int = 64 * 2**20
+    ttl: float = 300.0
+
+
+class MetricsConfig(Config):
+    model_config = SettingsConfigDict(case_sensitive=False, env_prefix="metrics_")
+    # directory for per-process metrics files, so that every gunicorn
+    # worker serves numbers of all workers; per-process if not set
+    dir: tp.Optional[str] = None
+
+
+class WarmupConfig(Config):
+    model_config = SettingsConfigDict(case_sensitive=False, env_prefix="warmup_")
+    # /ready answers 200 only after models are loaded, their mapped pages
+    # are read and warm-up requests for user_ids went through every model
+    # of models (all if not set)
+    enabled: bool = True
+    touch_pages: bool = True
+    user_ids: tp.List[int] = [0]
+    models: tp.Optional[tp.List[str]] = None
+
+
+class SeenConfig(Config):
+    model_config = SettingsConfigDict(case_sensitive=False, env_prefix="seen_")
+    # CSR index of seen items (row = user id) and a file in the format of
+    # interactions.csv which is followed for new interactions
+    path: tp.Optional[str] = None
+    interactions_path: tp.Optional[str] = None
+    ingest_interval: float = 5.0
+    # the delta of new interactions is merged into the base at this size
+    compact_size: int = 100_000
+    # models are asked for at most k_recs + max_overfetch items, and if
+    # too few are left after filtering, the rest comes from backfill model
+    max_overfetch: int = 100
+    backfill: tp.Optional[str] = None
+
+
+class TimingConfig(Config):
+    model_config = SettingsConfigDict(case_sensitive=False, env_prefix="timing_")
+    # Server-Timing header with durations of request stages
+    server_timing: bool = False
+    # cProfile of a profile_sample_rate share of requests and of requests
+    # with the X-Profile header equal to profile_token is written to
+    # profile_dir; no profiling without profile_dir
+    profile_dir: tp.Optional[str] = None
+    profile_sample_rate: float = 0.0
+    profile_token: tp.Optional[str] = None
+
+
+class AdmissionConfig(Config):
+    model_config = SettingsConfigDict(case_sensitive=False, env_prefix="admission_")
+    # adaptive limit of concurrent requests per worker, requests above it
+    # get 503 at once: the limit grows by one per limit requests answered
+    # within tolerance times the baseline latency (the minimum seen over
+    # the last baseline_window seconds, but at least target_latency) and
+    # is multiplied by backoff when they are slower; while the event loop
+    # lags by more than max_loop_lag, the share of admitted requests is
+    # multiplied by backoff every loop_lag_interval, then grows back by
+    # admit_step. Only paths starting with path_prefixes and not ending
+    # with bypass_suffixes (batches) are limited
+    enabled: bool = False
+    initial_limit: int = 64
+    min_limit: int = 4
+    max_limit: int = 1024
+    target_latency: float = 0.05
+    tolerance: float = 2.0
+    baseline_window: float = 10.0
+    backoff: float = 0.9
+    max_loop_lag: float = 0.05
+    loop_lag_interval: float = 0.05
+    min_admit_ratio: float = 0.05
+    admit_step: float = 0.02
+    path_prefixes: tp.List[str] = ["/reco/", "/similar/"]
+    bypass_suffixes: tp.List[str] = ["/batch"]
+
+
+class ANNConfig(BaseModel):
+    # more probed lists and reranked candidates - better recall, more latency
+    nprobe: int = 16
+    rerank: int = 200
+
+
+class BatchConfig(BaseModel):
+    # concurrent single user requests arriving within window seconds are
+    # scored as one batch of at most max_size users; 0 disables batching
+    window: float = 0.0
+    max_size: int = 64
+
+
+class RerankConfig(BaseModel):
+    # "mmr" or "genre_cap" reranking of the top candidates of the model to
+    # k_recs items by genres from features_path; diversity is the weight of
+    # dissimilarity in MMR, max_per_genre the cap of genre_cap
+    method: tp.Optional[str] = None
+    features_path: tp.Optional[str] = None
+    candidates: int = 50
+    diversity: float = 0.3
+    max_per_genre: int = 3
+
+
+class ShadowConfig(BaseModel):
+    # a sample_rate share of requests answered by the model is replayed
+    # against the candidate model after the response; at most queue_size
+    # of them wait for concurrency workers, the rest is dropped
+    model: tp.Optional[str] = None
+    sample_rate: float = 1.0
+    queue_size: int = 1000
+    concurrency: int = 1
+
+
+class ModelConfig(BaseModel):
+    kind: str
+    path: tp.Optional[str] = None
+    lazy: bool = False
+    cache: bool = True
+    # latency budget in seconds, the model is then run in the executor and
+    # the fallback model answers if it misses the budget
+    timeout: tp.Optional[float] = None
+    fallback: tp.Optional[str] = None
+    # score in the inference process pool instead of the service process
+    process: bool = False
+    # drop items seen by the user according to the seen index, responses
+    # are then not cached
+    filter_seen: bool = False
+    batch: BatchConfig = BatchConfig()
+    ann: ANNConfig = ANNConfig()
+    shadow: ShadowConfig = ShadowConfig()
+    rerank: RerankConfig = RerankConfig()
 
 
 class ServiceConfig(Config):
     service_name: str = "reco_service"
     k_recs: int = 10
+    max_batch_size: int = 1000
+    models: tp.Dict[str, ModelConfig] = {
+        "top": ModelConfig(kind="popular", path="artifacts/top"),
+        "random": ModelConfig(kind="random", cache=False),
+    }
+    # processes of the pool scoring models with "process": true, every
+    # gunicorn worker starts its own pool
+    inference_processes: int = 2
+    models_refresh_interval: float = 60.0
 
     log_config: LogConfig
+    cache_config: CacheConfig
+    metrics_config: MetricsConfig
+    warmup_config: WarmupConfig
+    seen_config: SeenConfig
+    timing_config: TimingConfig
+    admission_config: AdmissionConfig
 
 
 def get_config() -> ServiceConfig:
     return ServiceConfig(
         log_config=LogConfig(),
+        cache_config=CacheConfig(),
+        metrics_config=MetricsConfig(),
+        warmup_config=WarmupConfig(),
+        seen_config=SeenConfig(),
+        timing_config=TimingConfig(),
+        admission_config=AdmissionConfig(),
     )
@@ -0,0 +1,108 @@
+import asyncio
+import random
+import typing as tp
+
+from starlette.responses import PlainTextResponse
+from starlette.types import Message, Receive, Scope, Send
+
+from service.api.admission import AdaptiveLimit
+from service.api.metrics import Metrics
+from service.api.middlewares import AdmissionMiddleware
+from service.settings import AdmissionConfig
+
+
+def test_limit_grows_when_used_and_backs_off_when_slow() -> None:
+    limiter = AdaptiveLimit(AdmissionConfig(initial_limit=4, min_limit=2, target_latency=0.1, backoff=0.5))
+    assert all(limiter.acquire() for _ in range(4))
+    assert not limiter.acquire()
+    for _ in range(3):
+        limiter.release(0.01)
+    assert 4 < limiter.limit < 5
+    # an idle worker does not inflate the limit
+    limiter.release(0.01)
+    limit = limiter.limit
+    assert limiter.acquire()
+    limiter.release(0.01)
+    assert limiter.limit == limit
+
+    assert limiter.acquire()
+    limiter.release(1.0)
+    assert limiter.limit == limit / 2
+    # one decrease per target latency
+    assert limiter.acquire()
+    limiter.release(1.0)
+    assert limiter.limit == limit / 2
+    assert limiter.rejected == 1
+
+
+def test_limit_backs_off_relative_to_baseline_latency() -> None:
+    config = AdmissionConfig(initial_limit=4, min_limit=1, target_latency=0.05, tolerance=2.0, backoff=0.5)
+    limiter = AdaptiveLimit(config)
+    # a model which always answers in 300 ms is not overloaded
+    for _ in range(20):
+        assert limiter.acquire()
+        limiter.release(0.3)
+    assert limiter.limit == 4
+    assert limiter.baseline == 0.3
+
+    assert limiter.acquire()
+    limiter.release(0.7)
+    assert limiter.limit == 2
+
+
+def test_loop_lag_sheds_a_share_of_requests() -> None:
+    config = AdmissionConfig(backoff=0.5, max_loop_lag=0.05, min_admit_ratio=0.1, admit_step=0.25)
+    limiter = AdaptiveLimit(config)
+    for _ in range(10):
+        limiter.observe_loop_lag(0.2)
+    assert limiter.admit_ratio == 0.1
+
+    random.seed(0)
+    admitted = 0
+    for _ in range(1000):
+        if limiter.acquire():
+            admitted += 1
+            limiter.release(0.0)
+    assert 50 < admitted < 150
+
+    for _ in range(4):
+        limiter.observe_loop_lag(0.01)
+    assert limiter.admit_ratio == 1.0
+
+
+def test_excess_requests_are_shed() -> None:
+    release = asyncio.Event()
+
+    async def inner(scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["path"] == "/reco/slow/1":
+            await release.wait()
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    metrics = Metrics([], [])
+    limiter = AdaptiveLimit(AdmissionConfig(initial_limit=1, min_limit=1))
+    app = AdmissionMiddleware(inner, limiter, metrics)
+
+    async def get(path: str) -> tp.Tuple[int, bytes]:
+        messages: tp.List[Message] = []
+
+        async def receive() -> Message:
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message: Message) -> None:
+            messages.append(message)
+
+        await app({"type": "http", "path": path, "method": "GET", "headers": []}, receive, send)
+        return messages[0]["status"], messages[1]["body"]
+
+    async def run() -> tp.List[tp.Tuple[int, bytes]]:
+        slow = asyncio.create_task(get("/reco/slow/1"))
+        await asyncio.sleep(0)
+        results = [await get("/reco/top/1"), await get("/health"), await get("/reco/top/batch")]
+        release.set()
+        return [await slow, *results]
+
+    (slow_status, _), (shed_status, shed_body), (health_status, _), (batch_status, _) = asyncio.run(run())
+    assert (slow_status, shed_status, health_status, batch_status) == (200, 503, 200, 200)
+    assert b'"error_key":"overloaded"' in shed_body
+    assert "http_requests_rejected_total 1" in metrics.render()
+    assert limiter.in_flight == 0
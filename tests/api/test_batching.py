@@ -0,0 +1,108 @@
+# pylint: disable=redefined-outer-name
+import asyncio
+import typing as tp
+
+import numpy as np
+import pytest
+from starlette.testclient import TestClient
+
+from service.api.app import create_app
+from service.api.batching import MicroBatcher
+from service.api.exceptions import UserNotFoundError
+from service.api.metrics import MODEL_REQUESTS, Metrics
+from service.reco.csr import CSRArray
+from service.reco.inference import Recos, Scorer, recommend_known
+from service.reco.store import PrecomputedModel
+from service.settings import BatchConfig, ModelConfig, ServiceConfig
+
+
+class CountingModel(PrecomputedModel):
+    def __init__(self, recos: CSRArray) -> None:
+        super().__init__(recos)
+        self.batch_sizes: tp.List[int] = []
+
+    def recommend_batch(self, user_ids: np.ndarray, k: int) -> tp.List[np.ndarray]:
+        self.batch_sizes.append(len(user_ids))
+        return super().recommend_batch(user_ids, k)
+
+
+def inline_scorer(model: PrecomputedModel) -> Scorer:
+    async def score(user_ids: np.ndarray, k: int) -> Recos:
+        return recommend_known(model, user_ids, k)
+
+    return score
+
+
+@pytest.fixture
+def model() -> CountingModel:
+    return CountingModel(CSRArray.from_rows([list(range(user_id, user_id + 5)) for user_id in range(10)]))
+
+
+def test_concurrent_requests_are_batched(model: CountingModel) -> None:
+    metrics = Metrics([], ["m"])
+    batcher = MicroBatcher("m", inline_scorer(model), window=0.01, max_size=100, metrics=metrics)
+
+    async def run() -> tp.List[np.ndarray]:
+        return await asyncio.gather(*(batcher.recommend(user_id, 3) for user_id in range(5)))
+
+    recos = asyncio.run(run())
+    assert model.batch_sizes == [5]
+    assert [reco.tolist() for reco in recos] == [[user_id, user_id + 1, user_id + 2] for user_id in range(5)]
+    counters, _ = metrics.collect()
+    offset = metrics.models["m"]
+    assert counters[offset + MODEL_REQUESTS] == 1
+    assert 'reco_batch_size_count{model="m"} 1' in metrics.render()
+    assert 'reco_batch_queue_seconds_count{model="m"} 5' in metrics.render()
+
+
+def test_full_batch_is_scored_without_waiting(model: CountingModel) -> None:
+    batcher = MicroBatcher("m", inline_scorer(model), window=60, max_size=2, metrics=Metrics([], ["m"]))
+
+    async def run() -> tp.List[np.ndarray]:
+        return await asyncio.wait_for(asyncio.gather(*(batcher.recommend(user_id, 3) for user_id in range(4))), 5)
+
+    asyncio.run(run())
+    assert model.batch_sizes == [2, 2]
+
+
+def test_unknown_user_fails_alone(model: CountingModel) -> None:
+    batcher = MicroBatcher("m", inline_scorer(model), window=0.01, max_size=100, metrics=Metrics([], ["m"]))
+
+    async def run() -> tp.Sequence[tp.Any]:
+        return await asyncio.gather(batcher.recommend(1, 3), batcher.recommend(100, 3), return_exceptions=True)
+
+    known, unknown = asyncio.run(run())
+    assert known.tolist() == [1, 2, 3]
+    assert isinstance(unknown, UserNotFoundError)
+
+
+def test_failed_batch_fails_every_request(model: CountingModel) -> None:
+    batcher = MicroBatcher("m", inline_scorer(model), window=0.01, max_size=100, metrics=Metrics([], ["m"]))
+
+    async def run() -> tp.Sequence[tp.Any]:
+        # the huge id does not fit the int64 batch array
+        requests = (batcher.recommend(1, 3), batcher.recommend(2**70, 3))
+        return await asyncio.wait_for(asyncio.gather(*requests, return_exceptions=True), 5)
+
+    assert all(isinstance(result, OverflowError) for result in asyncio.run(run()))
+
+
+def test_get_reco_batched(service_config: ServiceConfig) -> None:
+    config = service_config.models["precomputed"].model_copy(update={"batch": BatchConfig(window=0.001)})
+    models: tp.Dict[str, ModelConfig] = {**service_config.models, "precomputed": config}
+    app = create_app(service_config.model_copy(update={"models": models}))
+    with TestClient(app=app) as client:
+        response = client.get("/reco/precomputed/1")
+    assert response.status_code == 200
+    assert response.json()["items"] == list(range(1, 11))
+    assert 'reco_batch_size_count{model="precomputed"} 1' in app.state.metrics.render()
+
+
+@pytest.mark.parametrize("user_id", [-1, -(2**70), 2**70])
+def test_get_reco_out_of_range_user(service_config: ServiceConfig, user_id: int) -> None:
+    config = service_config.models["precomputed"].model_copy(update={"batch": BatchConfig(window=0.001)})
+    app = create_app(service_config.model_copy(update={"models": {**service_config.models, "precomputed": config}}))
+    with TestClient(app=app) as client:
+        response = client.get(f"/reco/precomputed/{user_id}")
+    assert response.status_code == 404
+    assert response.json()["errors"][0]["error_key"] == "user_not_found"
@@ -0,0 +1,49 @@
+from service.api.cache import ENTRY_OVERHEAD, ResponseCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_hit_and_miss() -> None:
+    cache = ResponseCache(max_bytes=10_000, ttl=10)
+    assert cache.get(("top", "v1", 1, 10)) is None
+    cache.put(("top", "v1", 1, 10), b"body")
+    assert cache.get(("top", "v1", 1, 10)) == b"body"
+    assert cache.get(("top", "v2", 1, 10)) is None
+    assert cache.stats() == {"hits": 1, "misses": 2, "evictions": 0, "entries": 1, "bytes": 4 + ENTRY_OVERHEAD}
+
+
+def test_ttl_expiration() -> None:
+    clock = FakeClock()
+    cache = ResponseCache(max_bytes=10_000, ttl=10, clock=clock)
+    cache.put(("top", "", 1, 10), b"body")
+    clock.now = 11
+    assert cache.get(("top", "", 1, 10)) is None
+    assert cache.evictions == 1
+    assert len(cache) == 0
+
+
+def test_lru_eviction_by_size() -> None:
+    cache = ResponseCache(max_bytes=2 * (ENTRY_OVERHEAD + 4), ttl=10)
+    cache.put(("top", "", 1, 10), b"one.")
+    cache.put(("top", "", 2, 10), b"two.")
+    assert cache.get(("top", "", 1, 10)) == b"one."
+    cache.put(("top", "", 3, 10), b"thr.")
+    assert cache.get(("top", "", 2, 10)) is None
+    assert cache.get(("top", "", 1, 10)) == b"one."
+    assert cache.evictions == 1
+    assert cache.size <= cache.max_bytes
+
+
+def test_invalidate_model() -> None:
+    cache = ResponseCache(max_bytes=10_000, ttl=10)
+    cache.put(("top", "v1", 1, 10), b"body")
+    cache.put(("other", "v1", 1, 10), b"body")
+    assert cache.invalidate("top") == 1
+    assert cache.get(("top", "v1", 1, 10)) is None
+    assert cache.get(("other", "v1", 1, 10)) == b"body"
@@ -0,0 +1,104 @@
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from service.api.metrics import (
+    ARCHIVE_FILE,
+    COUNTERS_PREFIX,
+    FILE_SUFFIX,
+    GAUGES_PREFIX,
+    IN_FLIGHT,
+    OTHER_ROUTE,
+    ROUTE_ERRORS,
+    ROUTE_LATENCY,
+    ROUTE_REQUESTS,
+    Metrics,
+    archive_counters,
+    clear_dir,
+    remove_gauges,
+)
+
+
+def test_request_histogram() -> None:
+    metrics = Metrics(["/a"], ["top"], buckets=(0.1, 1.0))
+    metrics.request_started()
+    metrics.request_finished("/a", 200, 0.05)
+    metrics.request_started()
+    metrics.request_finished("/a", 500, 2.0)
+    metrics.request_started()
+    metrics.request_finished("/unknown", 404, 0.5)
+
+    counters, gauges = metrics.collect()
+    offset = metrics.routes["/a"]
+    assert counters[offset + ROUTE_REQUESTS] == 2
+    assert counters[offset + ROUTE_ERRORS] == 1
+    assert counters[offset + ROUTE_LATENCY:][:5].tolist() == [1, 0, 1, 2.05, 2]
+    assert counters[metrics.routes[OTHER_ROUTE] + ROUTE_REQUESTS] == 1
+    assert gauges[IN_FLIGHT] == 0
+
+
+def test_aggregate_worker_files(tmp_path: Path) -> None:
+    metrics = Metrics(["/a"], ["top"], tmp_path)
+    metrics.request_started()
+    metrics.request_finished("/a", 200, 0.01)
+    metrics.observe_cache("top", hit=True)
+    metrics.request_started()
+    # files of another worker
+    for prefix in (COUNTERS_PREFIX, GAUGES_PREFIX):
+        shutil.copy(next(tmp_path.glob(f"{prefix}*")), tmp_path / f"{prefix}1{FILE_SUFFIX}")
+
+    counters, gauges = metrics.collect()
+    assert counters[metrics.routes["/a"] + ROUTE_REQUESTS] == 2
+    assert gauges[IN_FLIGHT] == 2
+    assert 'reco_cache_hits_total{model="top"} 2' in metrics.render()
+
+    remove_gauges(tmp_path, 1)
+    assert metrics.collect()[1][IN_FLIGHT] == 1
+    # two exited workers leave one archive file with their sum
+    shutil.copy(tmp_path / f"{COUNTERS_PREFIX}1{FILE_SUFFIX}", tmp_path / f"{COUNTERS_PREFIX}2{FILE_SUFFIX}")
+    archive_counters(tmp_path, 1)
+    archive_counters(tmp_path, 2)
+    assert {file.name for file in tmp_path.glob(f"{COUNTERS_PREFIX}*")} == {
+        ARCHIVE_FILE,
+        f"{COUNTERS_PREFIX}{os.getpid()}{FILE_SUFFIX}",
+    }
+    assert metrics.collect()[0][metrics.routes["/a"] + ROUTE_REQUESTS] == 3
+    clear_dir(tmp_path)
+    assert not list(tmp_path.iterdir())
+
+
+def test_metrics_endpoint(
+    client: TestClient,
+    app: FastAPI,
+) -> None:
+    with client:
+        client.get("/reco/top/1")
+        client.get("/reco/top/1")
+        response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'http_requests_total{route="/reco/{model_name}/{user_id}"} 2' in text
+    assert 'reco_model_requests_total{model="top"} 1' in text
+    assert 'reco_cache_hit_ratio{model="top"} 0.5' in text
+    # the scrape itself is in flight
+    assert "http_requests_in_flight 1" in text
+    assert app.state.metrics.collect()[1][IN_FLIGHT] == 0
+
+
+def test_fork_reopens_live_instances(tmp_path: Path) -> None:
+    metrics = Metrics(["/a"], ["top"], tmp_path)
+    metrics.request_started()
+    pid = os.fork()
+    if pid == 0:
+        metrics.request_started()
+        os._exit(0)  # pylint: disable=protected-access
+    os.waitpid(pid, 0)
+    # the child wrote to its own file, the parent's one is intact
+    assert metrics.gauges[IN_FLIGHT] == 1
+    assert np.fromfile(tmp_path / f"{GAUGES_PREFIX}{pid}{FILE_SUFFIX}")[IN_FLIGHT] == 1
+    assert metrics.collect()[1][IN_FLIGHT] == 2
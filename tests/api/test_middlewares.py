@@ -0,0 +1,64 @@
+from http import HTTPStatus
+from pathlib import Path
+
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from service.api.app import create_app
+from service.log import access_logger
+from service.settings import ServiceConfig, TimingConfig
+from tests.utils import RecordsHandler
+
+
+def test_unhandled_exception_is_server_error(
+    client: TestClient,
+    app: FastAPI,
+) -> None:
+    async def fail() -> None:
+        raise RuntimeError("boom")
+
+    app.add_api_route("/fail", fail)
+    with client:
+        response = client.get("/fail")
+    assert response.status_code == HTTPStatus.INTERNAL_SERVER_ERROR
+    assert response.json() == {
+        "errors": [{"error_key": "server_error", "error_message": "Internal Server Error", "error_loc": None}]
+    }
+
+
+def test_access_log(
+    client: TestClient,
+) -> None:
+    handler = RecordsHandler()
+    access_logger.addHandler(handler)
+    try:
+        with client:
+            client.get("/reco/top/1")
+            client.get("/reco/top/10000000000")
+    finally:
+        access_logger.removeHandler(handler)
+    assert [record.status_code for record in handler.records] == [200, 404]  # type: ignore[attr-defined]
+    record = handler.records[0]
+    assert record.method == "GET"  # type: ignore[attr-defined]
+    assert str(record.requested_url) == "http://testserver/reco/top/1"  # type: ignore[attr-defined]
+    assert record.request_time >= 0  # type: ignore[attr-defined]
+
+
+def test_server_timing_is_off_by_default(client: TestClient) -> None:
+    with client:
+        assert "server-timing" not in client.get("/reco/top/1").headers
+
+
+def test_server_timing_and_profiling(service_config: ServiceConfig, tmp_path: Path) -> None:
+    profile_dir = tmp_path / "profiles"
+    timing_config = TimingConfig(server_timing=True, profile_dir=str(profile_dir), profile_token="secret")
+    app = create_app(service_config.model_copy(update={"timing_config": timing_config}))
+    with TestClient(app=app) as client:
+        response = client.get("/reco/precomputed/1")
+        client.get("/reco/precomputed/1", headers={"X-Profile": "wrong"})
+        assert not profile_dir.exists()
+        client.get("/reco/precomputed/1", headers={"X-Profile": "secret"})
+
+    stages = [stage.split(";dur=")[0] for stage in response.headers["server-timing"].split(", ")]
+    assert stages == ["middleware", "lookup", "cache", "score", "serialize", "total"]
+    assert [path.suffix for path in profile_dir.iterdir()] == [".prof"]
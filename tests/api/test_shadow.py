@@ -0,0 +1,91 @@
+import threading
+import time
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+from starlette.testclient import TestClient
+
+from service.api.app import create_app
+from service.api.metrics import Metrics
+from service.api.shadow import ShadowEvaluator, top_k_overlap
+from service.reco.csr import CSRArray
+from service.reco.inference import Recos
+from service.settings import SeenConfig, ServiceConfig, ShadowConfig
+
+
+def test_top_k_overlap() -> None:
+    assert top_k_overlap(np.array([1, 2, 3, 4]), np.array([4, 5, 1])) == 0.5
+    assert top_k_overlap(np.array([], dtype=np.int64), np.array([], dtype=np.int64)) == 1.0
+
+
+def wait_for(condition: tp.Callable[[], bool]) -> None:
+    for _ in range(200):
+        if condition():
+            return
+        time.sleep(0.01)
+
+
+def test_full_queue_drops_requests() -> None:
+    metrics = Metrics([], ["primary"])
+    busy, release = threading.Event(), threading.Event()
+
+    def score(user_ids: np.ndarray, k: int) -> Recos:
+        busy.set()
+        release.wait()
+        return [np.arange(k) if user_id else None for user_id in user_ids.tolist()]
+
+    evaluator = ShadowEvaluator("primary", score, ShadowConfig(model="candidate", queue_size=1), metrics)
+    # not started yet
+    evaluator.submit(1, np.array([0, 5]))
+    evaluator.start()
+    evaluator.submit(1, np.array([0, 5]))
+    busy.wait(1)
+    # one is being scored, one waits, two are dropped
+    for user_id in (0, 1, 1):
+        evaluator.submit(user_id, np.array([0, 5]))
+    release.set()
+    wait_for(lambda: 'reco_shadow_duration_seconds_count{model="primary"} 2' in metrics.render())
+    evaluator.stop()
+
+    text = metrics.render()
+    assert 'reco_shadow_dropped_total{model="primary"} 2' in text
+    assert 'reco_shadow_duration_seconds_count{model="primary"} 2' in text
+    # the unknown user has latency but no overlap
+    assert 'reco_shadow_overlap_count{model="primary"} 1' in text
+    assert 'reco_shadow_overlap_bucket{model="primary",le="0.5"} 1' in text
+
+
+def test_shadow_replays_reco_requests(service_config: ServiceConfig) -> None:
+    models = {
+        **service_config.models,
+        "precomputed": service_config.models["precomputed"].model_copy(update={"shadow": ShadowConfig(model="top")}),
+    }
+    app = create_app(service_config.model_copy(update={"models": models}))
+    with TestClient(app=app) as client:
+        response = client.get("/reco/precomputed/1")
+        assert response.json() == {"user_id": 1, "items": list(range(1, 11))}
+        client.get("/reco/top/1")
+        text = ""
+        for _ in range(100):
+            text = app.state.metrics.render()
+            if 'reco_shadow_overlap_count{model="precomputed"} 1' in text:
+                break
+            time.sleep(0.01)
+    # top recommends items 100..91, none of which the user got
+    assert 'reco_shadow_overlap_bucket{model="precomputed",le="0.0"} 1' in text
+    assert 'reco_shadow_duration_seconds_count{model="top"} 0' in text
+
+
+def test_shadow_compares_items_before_post_processing(service_config: ServiceConfig, tmp_path: Path) -> None:
+    CSRArray.from_rows([[], [1, 2, 3]]).save(tmp_path)
+    update = {"filter_seen": True, "shadow": ShadowConfig(model="precomputed")}
+    models = {**service_config.models, "precomputed": service_config.models["precomputed"].model_copy(update=update)}
+    seen_config = SeenConfig(path=str(tmp_path), max_overfetch=3)
+    app = create_app(service_config.model_copy(update={"models": models, "seen_config": seen_config}))
+    with TestClient(app=app) as client:
+        response = client.get("/reco/precomputed/1")
+        wait_for(lambda: 'reco_shadow_overlap_count{model="precomputed"} 1' in app.state.metrics.render())
+    assert response.json()["items"] == list(range(4, 14))
+    # the same model agrees with itself although seen items were dropped
+    assert 'reco_shadow_overlap_bucket{model="precomputed",le="0.9"} 0' in app.state.metrics.render()
@@ -1,10 +1,21 @@
+import time
+import typing as tp
 from http import HTTPStatus
+from pathlib import Path
 
+import numpy as np
+from fastapi import FastAPI
 from starlette.testclient import TestClient
 
-from service.settings import ServiceConfig
+from service.api.app import create_app
+from service.reco.csr import CSRArray
+from service.reco.models import RecoModel
+from service.reco.popular import PopularModel
+from service.reco.rerank import ItemFeatures
+from service.settings import ModelConfig, RerankConfig, SeenConfig, ServiceConfig
 
 GET_RECO_PATH = "/reco/{model_name}/{user_id}"
+GET_RECO_BATCH_PATH = "/reco/{model_name}/batch"
 
 
 def test_health(
@@ -50,3 +61,259 @@ def test_get_reco_for_unknown_model(
         response = client.get(path)
     assert response.status_code == HTTPStatus.NOT_FOUND
     assert response.json()["errors"][0]["error_key"] == "model_not_found"
+
+
+def test_get_reco_from_store(
+    client: TestClient,
+    service_config: ServiceConfig,
+) -> None:
+    path = GET_RECO_PATH.format(model_name="precomputed", user_id=5)
+    with client:
+        response = client.get(path)
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()["items"] == list(range(5, 5 + service_config.k_recs))
+
+
+def test_get_reco_from_store_for_unknown_user(
+    client: TestClient,
+) -> None:
+    path = GET_RECO_PATH.format(model_name="precomputed", user_id=100)
+    with client:
+        response = client.get(path)
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json()["errors"][0]["error_key"] == "user_not_found"
+
+
+def test_get_reco_batch(
+    client: TestClient,
+    service_config: ServiceConfig,
+) -> None:
+    path = GET_RECO_BATCH_PATH.format(model_name="precomputed")
+    with client:
+        response = client.post(path, json={"user_ids": [5, 100, 7]})
+    assert response.status_code == HTTPStatus.OK
+    response_json = response.json()
+    assert response_json["recos"] == [
+        {"user_id": 5, "items": list(range(5, 5 + service_config.k_recs))},
+        {"user_id": 7, "items": list(range(7, 7 + service_config.k_recs))},
+    ]
+    assert len(response_json["errors"]) == 1
+    assert response_json["errors"][0]["error_key"] == "user_not_found"
+    assert response_json["errors"][0]["error_loc"] == ["body", "user_ids", 1]
+
+
+def test_get_reco_batch_too_large(
+    client: TestClient,
+    service_config: ServiceConfig,
+) -> None:
+    path = GET_RECO_BATCH_PATH.format(model_name="top")
+    user_ids = list(range(service_config.max_batch_size + 1))
+    with client:
+        response = client.post(path, json={"user_ids": user_ids})
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert response.json()["errors"][0]["error_key"] == "batch_too_large"
+
+
+def test_get_reco_batch_for_unknown_model(
+    client: TestClient,
+    unknown_model: str,
+) -> None:
+    path = GET_RECO_BATCH_PATH.format(model_name=unknown_model)
+    with client:
+        response = client.post(path, json={"user_ids": [1]})
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json()["errors"][0]["error_key"] == "model_not_found"
+
+
+def test_get_reco_is_cached(
+    client: TestClient,
+    app: FastAPI,
+) -> None:
+    path = GET_RECO_PATH.format(model_name="top", user_id=1)
+    with client:
+        first = client.get(path)
+        second = client.get(path)
+    assert first.content == second.content
+    assert app.state.response_cache.hits == 1
+
+
+def test_get_reco_cache_disabled_for_model(
+    client: TestClient,
+    app: FastAPI,
+) -> None:
+    path = GET_RECO_PATH.format(model_name="random", user_id=1)
+    with client:
+        client.get(path)
+        client.get(path)
+    assert app.state.response_cache.stats()["entries"] == 0
+
+
+def test_model_swap_invalidates_cache(
+    client: TestClient,
+    app: FastAPI,
+) -> None:
+    path = GET_RECO_PATH.format(model_name="top", user_id=1)
+    with client:
+        client.get(path)
+        app.state.models.swap("top", PopularModel(np.arange(5)))
+        response = client.get(path)
+    assert response.json()["items"] == [0, 1, 2, 3, 4]
+
+
+class SlowModel(RecoModel):
+    def recommend(self, user_id: int, k: int) -> np.ndarray:
+        time.sleep(0.5)
+        return np.arange(k)
+
+
+def create_slow_app(service_config: ServiceConfig, fallback: tp.Optional[str]) -> FastAPI:
+    models = {
+        **service_config.models,
+        "slow": ModelConfig(kind="random", cache=False, timeout=0.05, fallback=fallback),
+    }
+    app = create_app(service_config.model_copy(update={"models": models}))
+    app.state.models.swap("slow", SlowModel())
+    return app
+
+
+def test_get_reco_falls_back_on_timeout(
+    service_config: ServiceConfig,
+) -> None:
+    app = create_slow_app(service_config, fallback="top")
+    path = GET_RECO_PATH.format(model_name="slow", user_id=1)
+    with TestClient(app=app) as client:
+        response = client.get(path)
+        top_response = client.get(GET_RECO_PATH.format(model_name="top", user_id=1))
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers["X-Reco-Model"] == "top"
+    assert response.json()["items"] == top_response.json()["items"]
+    assert 'reco_model_timeouts_total{model="slow"} 1' in app.state.metrics.render()
+
+
+def test_get_reco_batch_falls_back_on_timeout(
+    service_config: ServiceConfig,
+) -> None:
+    app = create_slow_app(service_config, fallback="top")
+    with TestClient(app=app) as client:
+        response = client.post(GET_RECO_BATCH_PATH.format(model_name="slow"), json={"user_ids": [1, 2]})
+    assert response.headers["X-Reco-Model"] == "top"
+    assert [reco["items"] for reco in response.json()["recos"]] == [list(range(100, 90, -1))] * 2
+
+
+def test_get_reco_timeout_without_fallback(
+    service_config: ServiceConfig,
+) -> None:
+    app = create_slow_app(service_config, fallback=None)
+    path = GET_RECO_PATH.format(model_name="slow", user_id=1)
+    with TestClient(app=app) as client:
+        response = client.get(path)
+    assert response.status_code == HTTPStatus.GATEWAY_TIMEOUT
+    assert response.json()["errors"][0]["error_key"] == "model_timeout"
+
+
+def test_get_reco_within_budget(
+    client: TestClient,
+) -> None:
+    path = GET_RECO_PATH.format(model_name="top", user_id=1)
+    with client:
+        response = client.get(path)
+    assert response.headers["X-Reco-Model"] == "top"
+
+
+def create_seen_app(service_config: ServiceConfig, seen_path: Path, **seen: tp.Any) -> FastAPI:
+    CSRArray.from_rows([[], [1, 2, 3]]).save(seen_path)
+    models = {
+        **service_config.models,
+        "precomputed": service_config.models["precomputed"].model_copy(update={"filter_seen": True}),
+    }
+    seen_config = SeenConfig(path=str(seen_path), **seen)
+    return create_app(service_config.model_copy(update={"models": models, "seen_config": seen_config}))
+
+
+def test_get_reco_filters_seen_items(service_config: ServiceConfig, tmp_path: Path) -> None:
+    app = create_seen_app(service_config, tmp_path / "seen")
+    path = GET_RECO_PATH.format(model_name="precomputed", user_id=1)
+    with TestClient(app=app) as client:
+        first = client.get(path)
+        app.state.seen_index.append(np.array([1]), np.array([4]))
+        second = client.get(path)
+    assert first.json()["items"] == list(range(4, 14))
+    assert second.json()["items"] == list(range(5, 15))
+
+
+def test_get_reco_backfills_seen_items(service_config: ServiceConfig, tmp_path: Path) -> None:
+    app = create_seen_app(service_config, tmp_path / "seen", max_overfetch=1, backfill="top")
+    path = GET_RECO_PATH.format(model_name="precomputed", user_id=1)
+    with TestClient(app=app) as client:
+        response = client.get(path)
+    assert response.json()["items"] == [*range(4, 12), 100, 99]
+
+
+def test_get_reco_batch_filters_seen_items(service_config: ServiceConfig, tmp_path: Path) -> None:
+    app = create_seen_app(service_config, tmp_path / "seen", max_overfetch=1, backfill="top")
+    with TestClient(app=app) as client:
+        single = client.get(GET_RECO_PATH.format(model_name="precomputed", user_id=1))
+        response = client.post(GET_RECO_BATCH_PATH.format(model_name="precomputed"), json={"user_ids": [0, 1]})
+    assert response.json()["recos"] == [
+        {"user_id": 0, "items": list(range(10))},
+        {"user_id": 1, "items": single.json()["items"]},
+    ]
+
+
+def test_get_similar(service_config: ServiceConfig, tmp_path: Path) -> None:
+    CSRArray.from_rows([[3, 2, 1], [0]]).save(tmp_path / "similar")
+    models = {**service_config.models, "similar": ModelConfig(kind="similar", path=str(tmp_path / "similar"))}
+    app = create_app(service_config.model_copy(update={"models": models}))
+    with TestClient(app=app) as client:
+        response = client.get("/similar/similar/0")
+        unknown_item = client.get("/similar/similar/5")
+        negative_item = client.get("/similar/similar/-1")
+        no_similar = client.get("/similar/top/0")
+        unknown_model = client.get("/similar/unknown/0")
+    assert response.json() == {"item_id": 0, "items": [3, 2, 1]}
+    assert unknown_item.json()["errors"][0]["error_key"] == "item_not_found"
+    assert negative_item.json()["errors"][0]["error_key"] == "item_not_found"
+    assert no_similar.json()["errors"][0]["error_key"] == "model_not_found"
+    assert unknown_model.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_get_reco_reranks_candidates(service_config: ServiceConfig, tmp_path: Path) -> None:
+    # items 1-10 are dramas, 11-20 comedies, user 1 gets items 1-20
+    rows = "".join(f"{item_id},{'драмы' if item_id <= 10 else 'комедии'}\n" for item_id in range(1, 21))
+    (tmp_path / "items.csv").write_text("item_id,genres\n" + rows)
+    ItemFeatures.from_items_csv(tmp_path / "items.csv").save(tmp_path / "features")
+    rerank = RerankConfig(method="genre_cap", features_path=str(tmp_path / "features"), candidates=20, max_per_genre=3)
+    models = {
+        **service_config.models,
+        "precomputed": service_config.models["precomputed"].model_copy(update={"rerank": rerank}),
+    }
+    app = create_app(service_config.model_copy(update={"models": models}))
+    with TestClient(app=app) as client:
+        response = client.get(GET_RECO_PATH.format(model_name="precomputed", user_id=1))
+        batch = client.post(GET_RECO_BATCH_PATH.format(model_name="precomputed"), json={"user_ids": [1]})
+    assert response.json()["items"] == [1, 2, 3, 11, 12, 13, 4, 5, 6, 7]
+    assert batch.json()["recos"][0]["items"] == response.json()["items"]
+
+
+def test_get_reco_batch_out_of_range_users(client: TestClient) -> None:
+    path = GET_RECO_BATCH_PATH.format(model_name="precomputed")
+    with client:
+        response = client.post(path, json={"user_ids": [-1, 2**70, 5]})
+    assert response.status_code == HTTPStatus.OK
+    assert [reco["user_id"] for reco in response.json()["recos"]] == [5]
+    assert [error["error_loc"][-1] for error in response.json()["errors"]] == [0, 1]
+
+
+def test_get_reco_batch_in_process_skips_dropped_users(service_config: ServiceConfig) -> None:
+    app = create_app(service_config)
+    with TestClient(app=app) as client:
+
+        async def score(user_ids: np.ndarray, k: int) -> tp.List[tp.Optional[np.ndarray]]:
+            # e.g. a version of the model which lost user 5
+            return [None if user_id == 5 else np.arange(user_id, user_id + k) for user_id in user_ids.tolist()]
+
+        app.state.models.get_config("precomputed").process = True
+        app.state.scorers["precomputed"] = score
+        response = client.post(GET_RECO_BATCH_PATH.format(model_name="precomputed"), json={"user_ids": [5, 7]})
+    assert response.json()["recos"] == [{"user_id": 7, "items": list(range(7, 7 + service_config.k_recs))}]
+    assert response.json()["errors"][0]["error_loc"] == ["body", "user_ids", 0]
@@ -0,0 +1,79 @@
+import mmap
+import time
+from http import HTTPStatus
+from pathlib import Path
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from service.api.app import create_app
+from service.api.warmup import iter_arrays, touch_pages
+from service.reco.csr import CSRArray
+from service.reco.store import PrecomputedModel
+from service.settings import ModelConfig, ServiceConfig, WarmupConfig, get_config
+
+
+def wait_ready(client: TestClient, timeout: float = 10) -> int:
+    deadline = time.monotonic() + timeout
+    while True:
+        response = client.get("/ready")
+        if response.status_code == HTTPStatus.OK or time.monotonic() > deadline:
+            return response.status_code
+        time.sleep(0.05)
+
+
+def create_warm_app(service_config: ServiceConfig, **models: ModelConfig) -> FastAPI:
+    warmup_config = WarmupConfig(user_ids=[1], models=["precomputed"])
+    update = {"models": {**service_config.models, **models}, "warmup_config": warmup_config}
+    return create_app(service_config.model_copy(update=update))
+
+
+def test_not_ready_before_startup(app: FastAPI) -> None:
+    response = TestClient(app=app).get("/ready")
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert response.json()["errors"][0]["error_key"] == "not_ready"
+
+
+def test_warm_up_makes_app_ready(service_config: ServiceConfig) -> None:
+    app = create_warm_app(service_config)
+    with TestClient(app=app) as client:
+        assert wait_ready(client) == HTTPStatus.OK
+        response = client.get("/ready")
+    assert response.json()["startup_seconds"] > 0
+    # the warm-up request went through get_reco
+    assert app.state.response_cache.stats()["entries"] == 1
+
+
+def test_failed_model_load_keeps_app_not_ready(service_config: ServiceConfig, tmp_path: Path) -> None:
+    (tmp_path / "broken").mkdir()
+    (tmp_path / "broken" / "indptr.npy").write_text("not an array")
+    broken = ModelConfig(kind="precomputed", path=str(tmp_path / "broken"), lazy=True)
+    app = create_warm_app(service_config, broken=broken)
+    with TestClient(app=app) as client:
+        assert wait_ready(client, timeout=1) == HTTPStatus.SERVICE_UNAVAILABLE
+        assert client.get("/health").status_code == HTTPStatus.OK
+
+
+def test_stock_config_without_artifacts_gets_ready(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    # a fresh checkout: the default top model has no artifacts/top yet
+    monkeypatch.chdir(tmp_path)
+    with TestClient(app=create_app(get_config())) as client:
+        assert wait_ready(client) == HTTPStatus.OK
+        assert client.get("/reco/random/1").status_code == HTTPStatus.OK
+        response = client.get("/reco/top/1")
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert response.json()["errors"][0]["error_key"] == "model_not_published"
+
+
+def test_touch_mapped_pages(tmp_path: Path) -> None:
+    CSRArray.from_rows([[1, 2, 3], [4]]).save(tmp_path)
+    model = PrecomputedModel(CSRArray.load(tmp_path))
+    arrays = list(iter_arrays(model))
+    assert len(arrays) == 2
+    # both arrays fit a page
+    assert [touch_pages(array) for array in arrays] == [1, 1]
+    np.save(tmp_path / "large.npy", np.ones(mmap.PAGESIZE * 3 + 1, dtype=np.uint8))
+    assert touch_pages(np.load(tmp_path / "large.npy", mmap_mode="r")) == 4
+    assert touch_pages(np.zeros((0, 3))) == 0
@@ -1,18 +1,44 @@
 # pylint: disable=redefined-outer-name
 import random
 import string
+from pathlib import Path
 
+import numpy as np
 import pytest
 from fastapi import FastAPI
 from starlette.testclient import TestClient
 
 from service.api.app import create_app
-from service.settings import ServiceConfig, get_config
+from service.reco.csr import CSRArray
+from service.reco.popular import PopularModel
+from service.settings import ModelConfig, ServiceConfig, WarmupConfig, get_config
 
 
 @pytest.fixture
-def service_config() -> ServiceConfig:
-    return get_config()
+def precomputed_path(tmp_path: Path) -> Path:
+    path = tmp_path / "precomputed"
+    rows = [list(range(user_id, user_id + 20)) for user_id in range(100)]
+    CSRArray.from_rows(rows).save(path)
+    return path
+
+
+@pytest.fixture
+def popular_path(tmp_path: Path) -> Path:
+    path = tmp_path / "top"
+    PopularModel(np.arange(100, 0, -1)).save(path)
+    return path
+
+
+@pytest.fixture
+def service_config(precomputed_path: Path, popular_path: Path) -> ServiceConfig:
+    config = get_config()
+    models = {
+        **config.models,
+        "top": ModelConfig(kind="popular", path=str(popular_path)),
+        "precomputed": ModelConfig(kind="precomputed", path=str(precomputed_path)),
+    }
+    # warm-up requests would show up in cache and metrics counters
+    return config.model_copy(update={"models": models, "warmup_config": WarmupConfig(enabled=False)})
 
 
 @pytest.fixture
@@ -0,0 +1,48 @@
+from pathlib import Path
+
+import numpy as np
+
+from service.reco.ann import ANN_DIR, ANNModel, IVFPQIndex, evaluate
+from service.reco.csr import CSRArray
+from service.reco.registry import ModelSource
+from service.reco.scoring import FactorModel
+from service.settings import ANNConfig, ModelConfig
+
+
+def make_factors(n_users: int = 50, n_items: int = 2000, dim: int = 16) -> FactorModel:
+    rng = np.random.default_rng(0)
+    return FactorModel(
+        rng.standard_normal((n_users, dim), dtype=np.float32),
+        rng.standard_normal((n_items, dim), dtype=np.float32),
+        item_biases=rng.standard_normal(n_items, dtype=np.float32),
+        seen=CSRArray.from_rows([rng.integers(0, n_items, size=30).tolist() for _ in range(n_users)]),
+    )
+
+
+def test_ann_probing_all_lists_is_exact() -> None:
+    factors = make_factors()
+    index = IVFPQIndex.build(ANNModel.index_vectors(factors), n_lists=16, n_subspaces=4, n_iter=5)
+    model = ANNModel(factors, index, nprobe=16, rerank=len(factors.item_factors))
+    for user_id in range(len(factors.user_factors)):
+        assert model.recommend(user_id, 10).tolist() == factors.recommend(user_id, 10).tolist()
+
+
+def test_ann_recall_grows_with_nprobe() -> None:
+    factors = make_factors()
+    index = IVFPQIndex.build(ANNModel.index_vectors(factors), n_lists=32, n_subspaces=4, n_iter=5)
+    report = evaluate(ANNModel(factors, index, rerank=50), np.arange(50), 10, [1, 32])
+    assert report[0]["recall"] < report[1]["recall"]
+    assert report[1]["recall"] > 0.95
+
+
+def test_ann_model_loads_from_config(tmp_path: Path) -> None:
+    factors = make_factors()
+    factors.save(tmp_path)
+    IVFPQIndex.build(ANNModel.index_vectors(factors), n_lists=8, n_subspaces=4, n_iter=2).save(tmp_path / ANN_DIR)
+    config = ModelConfig(kind="ann", path=str(tmp_path), ann=ANNConfig(nprobe=3, rerank=20))
+    model = ModelSource.from_config(config).load()
+    assert isinstance(model, ANNModel)
+    assert (model.nprobe, model.rerank) == (3, 20)
+    reco = model.recommend(0, 10)
+    assert len(reco) == 10
+    assert not np.isin(reco, factors.seen.row(0)).any()
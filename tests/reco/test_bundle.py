@@ -0,0 +1,72 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from service.reco.bundle import SEEN_DIR, BundleError, build_bundle, changed_users, verify_bundle
+from service.reco.csr import CSRArray
+from service.reco.registry import ModelSource
+from service.reco.seen import SeenIndex
+from service.settings import ModelConfig
+
+HEADER = "user_id,item_id,last_watch_dt\n"
+
+
+def write_csv(path: Path, text: str) -> Path:
+    path.write_text(text)
+    return path
+
+
+def test_delta_build_patches_rescored_users(tmp_path: Path) -> None:
+    bundle = tmp_path / "bundle"
+    build_bundle(
+        bundle,
+        write_csv(tmp_path / "interactions.csv", f"{HEADER}10,100,2021-08-01\n20,200,2021-08-01\n"),
+        write_csv(tmp_path / "recos.csv", "user_id,item_id,rank\n10,300,2\n10,200,1\n20,100,1\n"),
+        "v1",
+    )
+    source = ModelSource.from_config(ModelConfig(kind="precomputed", path=str(bundle)))
+    model = source.load()
+    assert model.version == "v1"
+    assert model.recommend(10, 10).tolist() == [200, 300]
+
+    new_interactions = write_csv(tmp_path / "new.csv", f"{HEADER}20,300,2021-08-02\n30,100,2021-08-02\n")
+    assert changed_users(new_interactions).tolist() == [20, 30]
+    manifest = build_bundle(
+        bundle,
+        new_interactions,
+        write_csv(tmp_path / "new_recos.csv", "user_id,item_id\n30,400\n30,200\n20,400\n"),
+        "v2",
+        base="v1",
+    )
+    assert (manifest["n_users"], manifest["rescored_users"]) == (3, 2)
+
+    model = source.load()
+    assert model.version == "v2"
+    assert model.recommend(10, 10).tolist() == [200, 300]
+    assert model.recommend(20, 10).tolist() == [400]
+    assert model.recommend(30, 10).tolist() == [400, 200]
+    # seen rows are the internal indices of recommendations
+    assert len(CSRArray.load(bundle / "v2" / SEEN_DIR)) == 3
+    seen = SeenIndex.load(bundle / "v2" / SEEN_DIR)
+    assert [seen.items(user_id).tolist() for user_id in (10, 20, 30)] == [[100], [200, 300], [100]]
+
+
+def test_damaged_bundle_is_rejected(tmp_path: Path) -> None:
+    build_bundle(
+        tmp_path,
+        write_csv(tmp_path / "interactions.csv", f"{HEADER}1,2,2021-08-01\n"),
+        write_csv(tmp_path / "recos.csv", "user_id,item_id\n1,3\n"),
+        "v1",
+    )
+    indices = tmp_path / "v1" / "indices.npy"
+    data = bytearray(indices.read_bytes())
+    data[-1] ^= 1
+    indices.write_bytes(bytes(data))
+    with pytest.raises(BundleError):
+        verify_bundle(tmp_path / "v1")
+
+    indices.write_bytes(bytes(data[:-1]))
+    with pytest.raises(BundleError):
+        ModelSource.from_config(ModelConfig(kind="precomputed", path=str(tmp_path))).load()
+    assert np.load(tmp_path / "v1" / "indptr.npy").tolist() == [0, 1]
@@ -0,0 +1,79 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from service.reco.csr import CSRArray
+from service.reco.evaluation import (
+    calc_metrics,
+    evaluate,
+    load_fold,
+    save_fold,
+    summarize,
+    time_range_folds,
+    train_stats,
+)
+from service.reco.interactions import Interactions
+from service.settings import ModelConfig
+
+
+def make_interactions(pairs: list, days: list) -> Interactions:
+    users, items = zip(*pairs)
+    return Interactions(np.array(users), np.array(items), np.array(days))
+
+
+def test_accuracy_metrics() -> None:
+    recos = [np.array([1, 2, 3]), np.array([4, 5, 6]), np.array([], dtype=np.int64)]
+    truth = CSRArray.from_rows([[2, 3], [4, 7, 8, 9], [1]])
+    stats = train_stats(make_interactions([(0, 1), (1, 2)], [0, 0]))
+    metrics = calc_metrics(recos, truth, stats, [1, 3])
+    assert metrics["prec@1"] == pytest.approx(1 / 3)
+    assert metrics["prec@3"] == pytest.approx((2 / 3 + 1 / 3) / 3)
+    assert metrics["recall@3"] == pytest.approx((1 + 1 / 4) / 3)
+    assert metrics["MRR@3"] == pytest.approx((1 / 2 + 1) / 3)
+    assert metrics["MAP@3"] == pytest.approx(((1 / 2 + 2 / 3) / 2 + 1 / 4) / 3)
+
+
+def test_novelty_metrics_as_rectools() -> None:
+    # example from rectools docs, users and items u<i>, i<i> are numbered
+    recos = [np.array([1, 2]), np.array([2, 3]), np.array([3]), np.array([2, 3])]
+    truth = CSRArray.from_rows([[1, 2], [2, 3], [2], [2]])
+    stats = train_stats(make_interactions([(1, 1), (1, 2), (2, 1), (2, 2), (3, 1)], [0] * 5))
+    stats = stats._replace(n_catalog=4)
+    metrics = calc_metrics(recos, truth, stats, [1, 2])
+    assert metrics["Serendipity@1"] == pytest.approx(np.mean([0, 0.25, 0, 0.25]))
+    assert metrics["Serendipity@2"] == pytest.approx(np.mean([0, 0.5, 0, 0.125]))
+    novelty = {1: -np.log2(3 / 3), 2: -np.log2(2 / 3), 3: -np.log2(1 / 3)}
+    expected = np.mean([np.mean([novelty[i] for i in reco]) for reco in recos])
+    assert metrics["MeanInvUserFreq@2"] == pytest.approx(expected)
+
+
+def test_time_range_folds(tmp_path: Path) -> None:
+    pairs = [(1, 10), (2, 20), (1, 20), (1, 10), (3, 10), (2, 30), (2, 10)]
+    days = [0, 0, 7, 7, 7, 8, 14]
+    folds = list(time_range_folds(make_interactions(pairs, days), n_splits=2, test_days=7))
+    assert len(folds) == 2
+    # seen (1, 10), cold user 3 and cold item 30 are dropped
+    assert folds[0].users.tolist() == [1]
+    assert folds[0].truth.rows(np.arange(1)) == [[20]]
+    assert len(folds[1].train.user_ids) == 5
+    assert folds[1].users.tolist() == [2]
+
+    save_fold(folds[1], tmp_path)
+    fold = load_fold(tmp_path)
+    assert fold.users.tolist() == [2]
+    assert fold.truth.indices.tolist() == [10]
+
+
+def test_evaluate(tmp_path: Path) -> None:
+    rng = np.random.default_rng(0)
+    n = 2000
+    items = rng.zipf(1.5, n) % 50
+    interactions = Interactions(rng.integers(0, 100, n), items, rng.integers(0, 28, n))
+    models = {"top": ModelConfig(kind="popular"), "random": ModelConfig(kind="random")}
+    results = evaluate(interactions, models, [1, 10], n_splits=2, test_days=7, n_jobs=1, work_dir=tmp_path)
+    assert [(result["fold"], result["model"]) for result in results] == [
+        (0, "top"), (0, "random"), (1, "top"), (1, "random")
+    ]
+    summary = summarize(results)
+    assert summary["top"]["recall@10"][0] > summary["random"]["recall@10"][0]
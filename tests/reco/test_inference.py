@@ -0,0 +1,42 @@
+import asyncio
+from pathlib import Path
+
+import numpy as np
+from starlette.testclient import TestClient
+
+from service.api.app import create_app
+from service.reco.csr import CSRArray
+from service.reco.inference import InferencePool, Recos
+from service.settings import ModelConfig, ServiceConfig
+
+
+def test_pool_scores_in_other_process(tmp_path: Path) -> None:
+    CSRArray.from_rows([[1, 2, 3], [4, 5]]).save(tmp_path)
+    configs = {
+        "store": ModelConfig(kind="precomputed", path=str(tmp_path), process=True),
+        "random": ModelConfig(kind="random"),
+    }
+    pool = InferencePool(configs, processes=1)
+    assert list(pool.configs) == ["store"]
+
+    async def run() -> Recos:
+        return await pool.recommend("store", "", np.array([1, 0, 7]), 2)
+
+    try:
+        recos = asyncio.run(run())
+    finally:
+        pool.shutdown()
+    assert [reco.tolist() if reco is not None else None for reco in recos] == [[4, 5], [1, 2], None]
+
+
+def test_get_reco_in_process(service_config: ServiceConfig) -> None:
+    config = service_config.models["precomputed"].model_copy(update={"process": True})
+    models = {**service_config.models, "precomputed": config}
+    app = create_app(service_config.model_copy(update={"models": models, "inference_processes": 1}))
+    with TestClient(app=app) as client:
+        response = client.get("/reco/precomputed/1")
+        unknown = client.get("/reco/precomputed/1000")
+        batch = client.post("/reco/precomputed/batch", json={"user_ids": [2, 1000]})
+    assert response.json()["items"] == list(range(1, 11))
+    assert unknown.json()["errors"][0]["error_key"] == "user_not_found"
+    assert batch.json()["recos"][0]["items"] == list(range(2, 12))
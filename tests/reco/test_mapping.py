@@ -0,0 +1,54 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from service.api.exceptions import UserNotFoundError
+from service.reco.csr import CSRArray
+from service.reco.mapping import ITEM_IDS_DIR, USER_IDS_DIR, IdMap, MappedModel
+from service.reco.registry import ModelSource
+from service.reco.store import PrecomputedModel
+from service.settings import ModelConfig
+
+
+def test_id_map_lookups(tmp_path: Path) -> None:
+    IdMap.from_ids([500, 7, 42]).save(tmp_path)
+    id_map = IdMap.load(tmp_path)
+
+    indices, known = id_map.to_internal(np.array([42, 1, 500, 10**6]))
+    assert known.tolist() == [True, False, True, False]
+    assert indices[known].tolist() == [2, 0]
+    assert id_map.to_external(np.array([1, 2, 0])).tolist() == [7, 42, 500]
+    assert id_map.user_index(7) == 1
+    with pytest.raises(UserNotFoundError):
+        id_map.user_index(8)
+    with pytest.raises(UserNotFoundError):
+        id_map.user_index(501)
+
+
+def test_id_map_rejects_duplicates() -> None:
+    with pytest.raises(ValueError):
+        IdMap.from_ids([1, 2, 1])
+
+
+def test_mapped_model_loaded_from_artifacts(tmp_path: Path) -> None:
+    # internal user 0 is external 1000 and so on, items 0..3 are 10..13
+    CSRArray.from_rows([[0, 1], [2, 3]]).save(tmp_path)
+    IdMap.from_ids([1000, 2000]).save(tmp_path / USER_IDS_DIR)
+    IdMap.from_ids([10, 11, 12, 13]).save(tmp_path / ITEM_IDS_DIR)
+
+    model = ModelSource.from_config(ModelConfig(kind="precomputed", path=str(tmp_path))).load()
+    assert isinstance(model, MappedModel)
+    assert model.recommend(2000, 10).tolist() == [12, 13]
+    with pytest.raises(UserNotFoundError):
+        model.recommend(0, 10)
+    user_ids = np.array([1, 1000, 2000])
+    known = model.known_users(user_ids)
+    assert known.tolist() == [False, True, True]
+    assert [reco.tolist() for reco in model.recommend_batch(user_ids[known], 1)] == [[10], [12]]
+
+
+def test_model_without_maps_is_not_wrapped(tmp_path: Path) -> None:
+    model = PrecomputedModel(CSRArray.from_rows([[1]]))
+    assert MappedModel.wrap(model, tmp_path) is model
+    assert MappedModel.wrap(model, None) is model
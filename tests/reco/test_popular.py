@@ -0,0 +1,75 @@
+from pathlib import Path
+
+import numpy as np
+
+from service.reco.interactions import Interactions, read_interactions
+from service.reco.popular import PopularModel, PopularityCounter
+
+DAY = int(np.datetime64("2021-08-01", "D").astype(np.int64))
+
+
+def interactions(items: list, days: list) -> Interactions:
+    return Interactions(np.zeros(len(items), dtype=np.int64), np.array(items), DAY + np.array(days))
+
+
+def test_read_interactions_in_chunks(tmp_path: Path) -> None:
+    path = tmp_path / "interactions.csv"
+    path.write_text(
+        "user_id,item_id,last_watch_dt,total_dur,watched_pct\n"
+        "1,10,2021-08-01,100,10.0\n"
+        "2,20,2021-08-02,200,20.0\n"
+        "3,30,2021-08-03,300,30.0\n"
+    )
+    chunks = list(read_interactions(path, chunk_size=2))
+    assert [len(chunk.user_ids) for chunk in chunks] == [2, 1]
+    assert chunks[0].item_ids.tolist() == [10, 20]
+    assert chunks[1].days.tolist() == [DAY + 2]
+
+
+def test_counter_whole_history() -> None:
+    counter = PopularityCounter()
+    counter.update(interactions([1, 2, 2, 3, 3, 3], [0, 0, 1, 1, 2, 2]))
+    assert counter.ranking().tolist() == [3, 2, 1]
+    assert counter.ranking(2).tolist() == [3, 2]
+
+
+def test_counter_window_drops_old_days() -> None:
+    counter = PopularityCounter(window_days=7)
+    counter.update(interactions([1, 1, 1, 2], [0, 1, 2, 5]))
+    assert counter.ranking().tolist() == [1, 2]
+    counter.update(interactions([2], [9]))
+    # day 9 leaves days 0-2 out of the 7 days window
+    assert counter.ranking().tolist() == [2]
+    assert counter.scores()[2] == 2
+
+
+def test_counter_decay_prefers_recent_items() -> None:
+    counter = PopularityCounter(half_life_days=1)
+    counter.update(interactions([1, 1, 1], [0, 0, 0]))
+    counter.update(interactions([2], [3]))
+    assert counter.ranking().tolist() == [2, 1]
+    assert np.allclose(counter.scores()[1:], [3 / 8, 1])
+
+
+def test_incremental_updates_match_single_pass(tmp_path: Path) -> None:
+    rng = np.random.default_rng(0)
+    items, days = rng.integers(0, 50, 1000), rng.integers(0, 30, 1000)
+    order = np.argsort(days, kind="stable")
+    items, days = items[order], days[order]
+
+    single = PopularityCounter(window_days=14, half_life_days=7)
+    single.update(interactions(items.tolist(), days.tolist()))
+
+    incremental = PopularityCounter(window_days=14, half_life_days=7)
+    for batch in np.array_split(np.arange(1000), 5):
+        incremental.save(tmp_path / "state.npz")
+        incremental = PopularityCounter.load(tmp_path / "state.npz")
+        incremental.update(interactions(items[batch].tolist(), days[batch].tolist()))
+    assert np.allclose(incremental.scores(), single.scores())
+
+
+def test_popular_model(tmp_path: Path) -> None:
+    PopularModel(np.array([5, 3, 1])).save(tmp_path)
+    model = PopularModel.load(tmp_path)
+    assert model.recommend(42, 2).tolist() == [5, 3]
+    assert [reco.tolist() for reco in model.recommend_batch(np.array([1, 2]), 5)] == [[5, 3, 1]] * 2
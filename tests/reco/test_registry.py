@@ -0,0 +1,118 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from service.api.exceptions import ModelNotFoundError, ModelNotPublishedError
+from service.reco.csr import CSRArray
+from service.reco.models import RandomModel
+from service.reco.registry import VERSION_FILE, ModelRegistry, ModelSource
+from service.reco.store import PrecomputedModel
+from service.settings import ModelConfig
+
+
+def publish(path: Path, version: str, rows: list) -> None:
+    CSRArray.from_rows(rows).save(path / version)
+    (path / "CURRENT.tmp").write_text(version)
+    (path / "CURRENT.tmp").rename(path / VERSION_FILE)
+
+
+def test_get_unknown_model() -> None:
+    registry = ModelRegistry()
+    with pytest.raises(ModelNotFoundError):
+        registry.get("unknown")
+
+
+def test_lazy_model_is_loaded_on_first_get() -> None:
+    calls = []
+
+    def loader(path: object) -> RandomModel:
+        calls.append(path)
+        return RandomModel()
+
+    registry = ModelRegistry()
+    registry.add("random", ModelSource(loader), lazy=True)
+    assert not calls
+    model = registry.get("random")
+    assert registry.get("random") is model
+    assert len(calls) == 1
+
+
+def test_missing_artifacts_are_loaded_once_published(tmp_path: Path) -> None:
+    registry = ModelRegistry.from_config({"store": ModelConfig(kind="precomputed", path=str(tmp_path))})
+    with pytest.raises(ModelNotPublishedError):
+        registry.get("store")
+    publish(tmp_path, "v1", [[1, 2]])
+    assert registry.get("store").version == "v1"
+
+
+def test_process_model_version_is_read_without_loading(tmp_path: Path) -> None:
+    publish(tmp_path, "v1", [[1, 2]])
+    config = ModelConfig(kind="precomputed", path=str(tmp_path), process=True)
+    registry = ModelRegistry.from_config({"store": config})
+    assert registry.version("store") == "v1"
+    publish(tmp_path, "v2", [[3, 4]])
+    assert registry.version("store") == "v2"
+    assert registry.refresh() == []
+    with pytest.raises(ModelNotFoundError):
+        registry.version("unknown")
+
+
+def test_refresh_swaps_new_version(tmp_path: Path) -> None:
+    publish(tmp_path, "v1", [[1, 2]])
+    registry = ModelRegistry()
+    registry.add("model", ModelSource(PrecomputedModel.load, tmp_path))
+    old_model = registry.get("model")
+    assert old_model.version == "v1"
+    assert registry.refresh() == []
+
+    publish(tmp_path, "v2", [[3, 4]])
+    assert registry.refresh() == ["model"]
+    new_model = registry.get("model")
+    assert new_model.version == "v2"
+    assert new_model.recommend(0, 10).tolist() == [3, 4]
+    # requests holding the old model keep being served from it
+    assert old_model.recommend(0, 10).tolist() == [1, 2]
+
+
+def test_failed_reload_keeps_old_version(tmp_path: Path) -> None:
+    publish(tmp_path, "v1", [[1, 2]])
+    registry = ModelRegistry()
+    registry.add("model", ModelSource(PrecomputedModel.load, tmp_path))
+    (tmp_path / VERSION_FILE).write_text("missing")
+    assert registry.refresh() == []
+    assert registry.get("model").version == "v1"
+
+
+def test_watch_refreshes_models(tmp_path: Path) -> None:
+    publish(tmp_path, "v1", [[1, 2]])
+    registry = ModelRegistry()
+    registry.add("model", ModelSource(PrecomputedModel.load, tmp_path))
+    publish(tmp_path, "v2", [[3, 4]])
+
+    async def run() -> None:
+        task = asyncio.create_task(registry.watch(0.01))
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.run(run())
+    assert registry.get("model").version == "v2"
+
+
+def test_refresh_survives_broken_version_file(tmp_path: Path) -> None:
+    publish(tmp_path / "bad", "v1", [[1, 2]])
+    publish(tmp_path / "good", "v1", [[1, 2]])
+    registry = ModelRegistry()
+    registry.add("bad", ModelSource(PrecomputedModel.load, tmp_path / "bad"))
+    registry.add("good", ModelSource(PrecomputedModel.load, tmp_path / "good"))
+    (tmp_path / "bad" / VERSION_FILE).unlink()
+    (tmp_path / "bad" / VERSION_FILE).mkdir()
+    publish(tmp_path / "good", "v2", [[3, 4]])
+    assert registry.refresh() == ["good"]
+    assert registry.get("bad").version == "v1"
+
+
+def test_unknown_fallback_model() -> None:
+    configs = {"random": ModelConfig(kind="random", fallback="missing")}
+    with pytest.raises(ValueError, match="missing"):
+        ModelRegistry.from_config(configs)
@@ -0,0 +1,41 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from service.reco.mapping import IdMap
+from service.reco.rerank import ItemFeatures, Reranker, genre_cap, mmr
+from service.settings import RerankConfig
+
+# genres of candidates in rank order: a, a, b, a+b, c
+FEATURES = np.array([[1, 0, 0], [1, 0, 0], [0, 1, 0], [1, 1, 0], [0, 0, 1]], dtype=np.uint8)
+
+
+def test_features_from_items_csv(tmp_path: Path) -> None:
+    (tmp_path / "items.csv").write_text('item_id,title,genres\n10,x,"драмы, комедии"\n7,y,комедии\n3,z,\n')
+    ItemFeatures.from_items_csv(tmp_path / "items.csv").save(tmp_path / "features")
+    features = ItemFeatures.load(tmp_path / "features")
+    assert features.genre_names == ["драмы", "комедии"]
+    assert features.rows(np.array([7, 10, 5, 3])).tolist() == [[0, 1], [1, 1], [0, 0], [0, 0]]
+
+
+def test_mmr_trades_relevance_for_diversity() -> None:
+    assert mmr(FEATURES, 3, diversity=0.0).tolist() == [0, 1, 2]
+    assert mmr(FEATURES, 3, diversity=0.5).tolist() == [0, 2, 4]
+    assert mmr(FEATURES, 10, diversity=0.5).tolist() == [0, 2, 4, 1, 3]
+
+
+def test_genre_cap_fills_up_in_rank_order() -> None:
+    assert genre_cap(FEATURES, 3, max_per_genre=1).tolist() == [0, 2, 4]
+    assert genre_cap(FEATURES, 5, max_per_genre=2).tolist() == [0, 1, 2, 4, 3]
+    assert genre_cap(np.zeros((0, 3), dtype=np.uint8), 3, max_per_genre=1).tolist() == []
+
+
+def test_reranker_maps_item_ids() -> None:
+    features = ItemFeatures(FEATURES, IdMap.from_ids([10, 11, 12, 13, 14]))
+    reranker = Reranker(RerankConfig(method="genre_cap", candidates=20, max_per_genre=1), features)
+    assert reranker.candidates(10) == 20
+    # item 99 has no features, so it is never capped
+    assert reranker.rerank(np.array([10, 11, 99, 13, 14]), 3).tolist() == [10, 99, 14]
+    with pytest.raises(ValueError):
+        Reranker(RerankConfig(method="shuffle"), features)
@@ -0,0 +1,43 @@
+# pylint: disable=redefined-outer-name
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from service.api.exceptions import UserNotFoundError
+from service.reco.csr import CSRArray
+from service.reco.scoring import FactorModel, partition_top_k, top_k
+
+
+@pytest.mark.parametrize("n_cols", (5, 1000, 15000, 15001))
+@pytest.mark.parametrize("k", (1, 10, 100))
+def test_top_k_matches_full_sort(n_cols: int, k: int) -> None:
+    scores = np.random.default_rng(0).standard_normal((8, n_cols))
+    expected = np.argsort(-scores, axis=1)[:, :k]
+    assert np.array_equal(top_k(scores, k), expected)
+    assert np.array_equal(partition_top_k(scores, k), expected)
+    assert np.array_equal(top_k(scores[0], k), expected[0])
+
+
+@pytest.fixture
+def model() -> FactorModel:
+    user_factors = np.array([[1.0, 0.0], [0.0, 1.0]], dtype=np.float32)
+    item_factors = np.array([[3.0, 0.0], [2.0, 1.0], [1.0, 2.0], [0.0, 3.0]], dtype=np.float32)
+    seen = CSRArray.from_rows([[0], [2, 3]])
+    return FactorModel(user_factors, item_factors, seen=seen)
+
+
+def test_factor_model_filters_seen(model: FactorModel) -> None:
+    assert model.recommend(0, 2).tolist() == [1, 2]
+    assert model.recommend(1, 10).tolist() == [1, 0]
+    with pytest.raises(UserNotFoundError):
+        model.recommend(2, 10)
+
+
+def test_factor_model_batch_matches_single(model: FactorModel, tmp_path: Path) -> None:
+    model.save(tmp_path)
+    loaded = FactorModel.load(tmp_path)
+    user_ids = np.array([1, 0, 1])
+    assert loaded.known_users(np.array([1, 2])).tolist() == [True, False]
+    recos = loaded.recommend_batch(user_ids, 3)
+    assert [reco.tolist() for reco in recos] == [model.recommend(user_id, 3).tolist() for user_id in user_ids]
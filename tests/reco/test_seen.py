@@ -0,0 +1,66 @@
+from pathlib import Path
+
+import numpy as np
+
+from service.reco.csr import CSRArray
+from service.reco.interactions import InteractionsTail
+from service.reco.mapping import IdMap
+from service.reco.seen import SeenIndex, merge_pairs
+from tests.utils import rows
+
+
+def test_merge_pairs_appends_to_rows() -> None:
+    base = CSRArray.from_rows([[3, 1], [2]])
+    merged = merge_pairs(base, np.array([0, 3, 1, 0, 0]), np.array([4, 5, 7, 2, 4]))
+    assert rows(merged) == [[3, 1, 2, 4], [2, 7], [], [5]]
+
+
+def test_appended_items_survive_compaction() -> None:
+    index = SeenIndex(CSRArray.from_rows([[1, 2]]))
+    index.append(np.array([0, 2]), np.array([3, 4]))
+    assert sorted(index.items(0).tolist()) == [1, 2, 3]
+    assert index.items(2).tolist() == [4]
+    assert index.items(5).tolist() == []
+
+    index.compact()
+    index.append(np.array([0]), np.array([9]))
+    # user 2 is appended to the user map, not placed in row 2
+    assert rows(index.base) == [[1, 2, 3], [4]]
+    assert index.users.ids.tolist() == [0, 2]
+    assert index.items(0).tolist() == [1, 2, 3, 9]
+    assert index.delta_size == 1
+    assert index.filter(0, np.array([9, 8, 1, 7])).tolist() == [8, 7]
+
+
+def test_ingest_follows_file(tmp_path: Path) -> None:
+    path = tmp_path / "interactions.csv"
+    path.write_text("user_id,item_id,last_watch_dt\n1,10,2021-08-01\n1,11,2021-")
+    tail = InteractionsTail(path)
+    index = SeenIndex()
+
+    assert index.ingest(tail, compact_size=100) == 1
+    with open(path, "a", encoding="utf-8") as file:
+        file.write("08-01\n2,12,2021-08-02\n")
+    assert index.ingest(tail, compact_size=2) == 2
+    assert index.delta_size == 0
+    assert rows(index.base) == [[10, 11], [12]]
+    assert [index.items(user_id).tolist() for user_id in (0, 1, 2)] == [[], [10, 11], [12]]
+
+    # rotated file is read from the start
+    path.write_text("item_id,user_id\n13,0\n")
+    assert index.ingest(tail, compact_size=100) == 1
+    assert index.items(0).tolist() == [13]
+
+
+def test_compaction_rows_follow_user_map(tmp_path: Path) -> None:
+    index = SeenIndex(CSRArray.from_rows([[1], [2]]), IdMap.from_ids([10**9, 7]))
+    index.append(np.array([10**9 - 1, 7]), np.array([3, 4]))
+    index.compact()
+    # one row per user, not per user id
+    assert len(index.base) == 3
+    assert index.items(7).tolist() == [2, 4]
+    assert index.items(10**9 - 1).tolist() == [3]
+
+    index.save(tmp_path)
+    loaded = SeenIndex.load(tmp_path)
+    assert [loaded.items(user_id).tolist() for user_id in (10**9, 7, 10**9 - 1, 5)] == [[1], [2, 4], [3], []]
@@ -0,0 +1,34 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from service.api.exceptions import ItemNotFoundError
+from service.reco.csr import CSRArray
+from service.reco.similar import SimilarItemsModel, build_neighbours
+from tests.utils import rows
+
+USER_ITEMS = CSRArray.from_rows([[0, 1, 2], [0, 1], [0, 3]])
+ITEM_USERS = CSRArray.from_rows([[0, 1, 2], [0, 1], [0], [2]])
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 256])
+def test_cooccurrence_neighbours(chunk_size: int) -> None:
+    neighbours = build_neighbours(USER_ITEMS, ITEM_USERS, k=1, measure="cooccurrence", chunk_size=chunk_size)
+    assert [rows(neighbours)[item_id] for item_id in (0, 1, 3)] == [[1], [0], [0]]
+
+
+def test_cosine_neighbours() -> None:
+    neighbours = build_neighbours(USER_ITEMS, ITEM_USERS, k=3, measure="cosine")
+    # item 2 co-occurs once with both, but item 0 is watched more widely
+    assert rows(neighbours)[2] == [1, 0]
+    assert len(rows(neighbours)[3]) == 1
+
+
+def test_similar_items_model(tmp_path: Path) -> None:
+    CSRArray.from_rows([[1, 2], [0]]).save(tmp_path)
+    model = SimilarItemsModel.load(tmp_path)
+    assert model.similar_items(0, 1).tolist() == [1]
+    assert not model.known_users(np.array([0])).any()
+    with pytest.raises(ItemNotFoundError):
+        model.similar_items(2, 1)
@@ -0,0 +1,37 @@
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from service.api.exceptions import UserNotFoundError
+from service.reco.csr import CSRArray
+from service.reco.store import PrecomputedModel
+
+
+def test_csr_array_roundtrip(tmp_path: Path) -> None:
+    rows: tp.List[tp.List[int]] = [[3, 1, 2], [], [7]]
+    CSRArray.from_rows(rows).save(tmp_path)
+    loaded = CSRArray.load(tmp_path)
+    assert len(loaded) == 3
+    assert [loaded.row(i).tolist() for i in range(3)] == rows
+    assert not isinstance(loaded.indices, np.memmap)
+
+
+def test_precomputed_model_recommend(tmp_path: Path) -> None:
+    CSRArray.from_rows([[1, 2, 3], [4, 5]]).save(tmp_path)
+    model = PrecomputedModel.load(tmp_path)
+    assert model.recommend(0, 2).tolist() == [1, 2]
+    assert model.recommend(1, 10).tolist() == [4, 5]
+    with pytest.raises(UserNotFoundError):
+        model.recommend(2, 10)
+
+
+def test_precomputed_model_recommend_batch(tmp_path: Path) -> None:
+    CSRArray.from_rows([[1, 2, 3], [], [4, 5, 6, 7]]).save(tmp_path)
+    model = PrecomputedModel.load(tmp_path)
+    user_ids = np.array([2, 0, 1, 3, -1])
+    assert model.known_users(user_ids).tolist() == [True, True, True, False, False]
+    recos = model.recommend_batch(np.array([2, 0, 1, 2]), 2)
+    assert [reco.tolist() for reco in recos] == [[4, 5], [1, 2], [], [4, 5]]
+    assert model.recommend_batch(np.array([], dtype=np.int64), 2) == []
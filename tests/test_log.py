@@ -0,0 +1,46 @@
+import logging
+import logging.handlers
+import threading
+
+from service.log import AccessSampleFilter, QueueLogging
+from tests.utils import RecordsHandler
+
+
+def make_record(status_code: int, request_time: float) -> logging.LogRecord:
+    record = logging.LogRecord("access", logging.INFO, __file__, 0, "", None, None)
+    record.status_code = status_code
+    record.request_time = request_time
+    return record
+
+
+def test_access_sample_filter() -> None:
+    log_filter = AccessSampleFilter(sample_rate=0, slow_request_time=0.5)
+    assert not log_filter.filter(make_record(200, 0.01))
+    assert log_filter.filter(make_record(404, 0.01))
+    assert log_filter.filter(make_record(500, 0.01))
+    assert log_filter.filter(make_record(200, 0.6))
+    assert AccessSampleFilter(sample_rate=1).filter(make_record(200, 0.01))
+
+
+def test_access_sample_rate() -> None:
+    log_filter = AccessSampleFilter(sample_rate=0.1)
+    passed = sum(log_filter.filter(make_record(200, 0.01)) for _ in range(10_000))
+    assert 700 < passed < 1300
+
+
+def test_queue_logging() -> None:
+    logger = logging.getLogger("test_queue_logging")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    handler = RecordsHandler()
+    logger.addHandler(handler)
+    queue_logging = QueueLogging()
+    try:
+        queue_logging.install([logger])
+        assert isinstance(logger.handlers[0], logging.handlers.QueueHandler)
+        logger.info("message %s", 1)
+    finally:
+        queue_logging.stop()
+        logger.handlers.clear()
+    assert [record.getMessage() for record in handler.records] == ["message 1"]
+    assert threading.current_thread().name not in handler.threads
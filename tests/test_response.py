@@ -0,0 +1,23 @@
+import json
+
+import numpy as np
+
+from service.models import Error
+from service.response import render_json, render_reco
+
+
+def test_render_reco_matches_pydantic_json() -> None:
+    items = np.arange(10, dtype=np.int64)
+    expected = {"user_id": 1, "items": list(range(10))}
+    assert render_json(render_reco(1, items)) == json.dumps(expected, separators=(",", ":")).encode()
+
+
+def test_render_non_contiguous_array() -> None:
+    items = np.arange(20)[::2]
+    assert json.loads(render_json(render_reco(1, items)))["items"] == list(range(0, 20, 2))
+
+
+def test_render_errors() -> None:
+    errors = [Error(error_key="key", error_message="сообщение", error_loc=("body", "user_ids", 0))]
+    expected = '{"errors":[{"error_key":"key","error_message":"сообщение","error_loc":["body","user_ids",0]}]}'
+    assert render_json({"errors": errors}) == expected.encode()
@@ -0,0 +1,22 @@
+import logging
+import threading
+import typing as tp
+
+from service.reco.csr import CSRArray
+
+
+class RecordsHandler(logging.Handler):
+    """Keeps emitted records and names of the threads which emitted them."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.records: tp.List[logging.LogRecord] = []
+        self.threads: tp.Set[str] = set()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records.append(record)
+        self.threads.add(threading.current_thread().name)
+
+
+def rows(csr: CSRArray) -> list:
+    return [csr.row(row).tolist() for row in range(len(csr))]